@@ -11,28 +11,38 @@ import logging
 import json
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock, Semaphore
+from threading import Lock
+
+import fmp_client
+import profile_cache
+import stage_io
+import stock_filters
+from key_pool import configured_key_values
+from quote_batcher import QuoteBatcher
 
 # Load environment variables
 load_dotenv()
 
 # FMP API Configuration
-API_KEY = os.getenv('FMP_API_KEY')
-if API_KEY:
-    API_KEY = API_KEY.strip()
+API_KEYS = configured_key_values()  # FMP_API_KEYS, or the single FMP_API_KEY (see key_pool.py)
+API_KEY = API_KEYS[0] if API_KEYS else None  # Placeholder apikey; fmp_client sends the key the pool picks
 BASE_URL = 'https://financialmodelingprep.com/api/v3'
 
-# Rate limiting configuration
+# Rate limiting configuration (calls/minute is set by FMP_CALLS_PER_MINUTE, see fmp_client)
 MAX_RETRIES = 1
-INITIAL_DELAY = 0.2
-RATE_LIMIT_DELAY = 1.0
 
 # Multi-threading configuration
-MAX_WORKERS = 20
-API_SEMAPHORE = Semaphore(MAX_WORKERS)
+MAX_WORKERS = fmp_client.CONCURRENCY_MAX  # Requests in flight follow fmp_client.concurrency (AIMD)
+fmp_client.configure(pool_size=MAX_WORKERS)
+
+# Quote batching configuration
+QUOTE_BATCH_SIZE = int(os.getenv('FMP_QUOTE_BATCH_SIZE', '100'))  # Symbols per /quote request
+
+# Market cap sources, in the order they are tried (see resolve_market_caps and get_market_cap)
+MARKET_CAP_SOURCES = ['cached profile', 'batched quote', 'key-metrics', 'profile', 'quote']
 
-# File paths
-INPUT_EXCEL_FILE = 'undervalued_stocks_usd_filtered.xlsx'
+# File paths (the input is a stage file; stage_io adds the extension)
+INPUT_FILE = 'undervalued_stocks_usd_filtered'
 OUTPUT_FOLDER = 'undervalued_stocks_by_sector'
 
 # Setup logging
@@ -60,45 +70,116 @@ def setup_logging():
     
     return logging.getLogger(__name__)
 
-logger = setup_logging()
+# Handlers are attached by setup_logging when run as a script (or by run_pipeline.py)
+logger = logging.getLogger(__name__)
 
 def make_api_request(url, params=None):
     """
-    Make an API request with rate limiting and error handling.
+    Make an API request with error handling.
+    Pacing and 429 retries are handled by the shared rate limiter in fmp_client.
     """
     if params is None:
         params = {}
     params['apikey'] = API_KEY
     
-    with API_SEMAPHORE:
-        try:
-            time.sleep(INITIAL_DELAY)
-            response = requests.get(url, params=params, timeout=30)
-            
-            if response.status_code == 200:
-                return response
-            elif response.status_code == 429:
-                logger.warning(f"Rate limit hit for {url}. Waiting {RATE_LIMIT_DELAY}s...")
-                time.sleep(RATE_LIMIT_DELAY)
-                return None
-            elif response.status_code in [401, 403]:
-                logger.error(f"API authentication error for {url}. Status: {response.status_code}")
-                return None
-            else:
-                logger.warning(f"API request failed for {url}. Status: {response.status_code}")
-                return None
-        except requests.exceptions.Timeout:
-            logger.warning(f"Request timeout for {url}")
+    try:
+        response = fmp_client.get(url, params=params, timeout=30)
+        
+        if response.status_code == 200:
+            return response
+        elif response.status_code == 429:
+            logger.warning(f"Rate limit hit for {url} (retries exhausted)")
             return None
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Request error: {e} for URL: {url}")
+        elif response.status_code in [401, 403]:
+            logger.error(f"API authentication error for {url} with API key {response.api_key.label}. Status: {response.status_code}")
             return None
+        else:
+            logger.warning(f"API request failed for {url}. Status: {response.status_code}")
+            return None
+    except requests.exceptions.Timeout:
+        logger.warning(f"Request timeout for {url}")
+        return None
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Request error: {e} for URL: {url}")
+        return None
+
+
+def fetch_quote_chunk(symbols):
+    """
+    Fetch quotes for several symbols with one comma-separated /quote request.
+    Returns dict mapping symbol to quote data, or None if the request failed.
+    """
+    url = f"{BASE_URL}/quote/{','.join(symbols)}"
+    response = make_api_request(url)
+    if not response:
+        return None
+    try:
+        data = response.json()
+    except ValueError as e:
+        logger.debug(f"Error parsing batched quote response: {e}")
+        return None
+    if not isinstance(data, list):
+        return None
+    return {item['symbol']: item for item in data if isinstance(item, dict) and item.get('symbol')}
+
+# Shared by all workers so concurrent quote fallbacks coalesce into one request
+quote_batcher = QuoteBatcher(fetch_quote_chunk, batch_size=QUOTE_BATCH_SIZE)
+
+
+def quote_market_cap(symbol, quote):
+    """Market cap from a quote (price * shares outstanding), or None."""
+    if quote:
+        try:
+            price = quote.get('price', None)
+            shares_outstanding = quote.get('sharesOutstanding', None)
+            if price and shares_outstanding:
+                market_cap = price * shares_outstanding
+                if market_cap > 0:
+                    return float(market_cap)
+        except (ValueError, TypeError) as e:
+            logger.debug(f"Error parsing quote for {symbol}: {e}")
+    return None
 
+def resolve_market_caps(symbols):
+    """
+    Resolve market caps without per-stock calls, before the thread pool starts:
+    first the mktCap of the profiles fetch_undervalued_stocks.py cached
+    (profile-bulk or /profile) within the profile TTL, then batched /quote
+    requests (QUOTE_BATCH_SIZE symbols each) for the rest, including stocks
+    whose cached profile is older.
+    Returns ({symbol: (market_cap, source)}, symbols whose quote came back);
+    the others go through get_market_cap.
+    """
+    resolved = {}
+    for symbol, profile in profile_cache.load_cached_profiles(symbols, max_age=profile_cache.PROFILE_TTL).items():
+        try:
+            market_cap = profile.get('mktCap')
+            if market_cap and float(market_cap) > 0:
+                resolved[symbol] = (float(market_cap), 'cached profile')
+        except (ValueError, TypeError) as e:
+            logger.debug(f"Invalid cached mktCap for {symbol}: {e}")
+    
+    # Submit every remaining symbol first so the batcher sends full chunks
+    futures = {symbol: quote_batcher.submit(symbol) for symbol in symbols if symbol not in resolved}
+    quoted = set()
+    for symbol, future in futures.items():
+        quote = future.result()
+        if quote is not None:
+            quoted.add(symbol)
+        market_cap = quote_market_cap(symbol, quote)
+        if market_cap is not None:
+            resolved[symbol] = (market_cap, 'batched quote')
+    
+    logger.info(f"Resolved {len(resolved)}/{len(symbols)} market caps before per-stock calls "
+                f"({len(futures)} symbols quoted in batches)")
+    return resolved, quoted
 
-def get_market_cap(symbol):
+def get_market_cap(symbol, quoted=False):
     """
-    Fetch market capitalization for a stock.
-    Tries multiple endpoints: key metrics, profile, or quote.
+    Fetch market capitalization for a stock that resolve_market_caps could not resolve.
+    Tries multiple endpoints: key metrics, profile, or quote (skipped when the
+    batched quote already came back without a usable market cap).
+    Returns (market_cap, source) or (None, None).
     """
     # Try key metrics first (most reliable for market cap)
     url = f"{BASE_URL}/key-metrics/{symbol}"
@@ -111,7 +192,7 @@ def get_market_cap(symbol):
                 latest = data[0]
                 market_cap = latest.get('marketCap', None)
                 if market_cap and market_cap > 0:
-                    return float(market_cap)
+                    return float(market_cap), 'key-metrics'
         except (ValueError, IndexError, TypeError) as e:
             logger.debug(f"Error parsing key metrics for {symbol}: {e}")
     
@@ -124,31 +205,31 @@ def get_market_cap(symbol):
             if data and len(data) > 0:
                 market_cap = data[0].get('mktCap', None)
                 if market_cap and market_cap > 0:
-                    return float(market_cap)
+                    return float(market_cap), 'profile'
         except (ValueError, IndexError, TypeError) as e:
             logger.debug(f"Error parsing profile for {symbol}: {e}")
     
-    # Try quote endpoint (shares outstanding * price)
-    url = f"{BASE_URL}/quote/{symbol}"
-    response = make_api_request(url)
-    if response:
-        try:
-            data = response.json()
-            if data and len(data) > 0:
-                price = data[0].get('price', None)
-                shares_outstanding = data[0].get('sharesOutstanding', None)
-                if price and shares_outstanding:
-                    market_cap = price * shares_outstanding
-                    if market_cap > 0:
-                        return float(market_cap)
-        except (ValueError, IndexError, TypeError) as e:
-            logger.debug(f"Error parsing quote for {symbol}: {e}")
+    # Try quote endpoint (shares outstanding * price), batched with other pending symbols
+    if not quoted:
+        market_cap = quote_market_cap(symbol, quote_batcher.get(symbol))
+        if market_cap is not None:
+            return market_cap, 'quote'
     
-    return None
+    return None, None
+
+def market_cap_source_lines(counter, total_stocks):
+    """Hit-rate lines per market cap source for the log and the summary file."""
+    lines = []
+    for source in MARKET_CAP_SOURCES + ['none']:
+        count = counter.get(source, 0)
+        rate = count / total_stocks * 100 if total_stocks else 0
+        lines.append(f"  {source:<15} {count:6d} ({rate:5.1f}%)")
+    return lines
 
-def process_stock(row, stats_lock, processed_counter, total_stocks):
+def process_stock(row, resolved, quoted, stats_lock, processed_counter, total_stocks):
     """
     Process a single stock: fetch market cap and prepare data for sector organization.
+    Market caps already in resolved (see resolve_market_caps) need no API call.
     """
     symbol = row.get('Symbol', '')
     
@@ -156,8 +237,10 @@ def process_stock(row, stats_lock, processed_counter, total_stocks):
         logger.warning("Row missing Symbol, skipping")
         return None
     
-    # Fetch market cap
-    market_cap = get_market_cap(symbol)
+    if symbol in resolved:
+        market_cap, source = resolved[symbol]
+    else:
+        market_cap, source = get_market_cap(symbol, quoted=symbol in quoted)
     
     # Create result row
     result_row = row.copy()
@@ -172,6 +255,7 @@ def process_stock(row, stats_lock, processed_counter, total_stocks):
     # Update statistics
     with stats_lock:
         processed_counter['total'] += 1
+        processed_counter[source or 'none'] = processed_counter.get(source or 'none', 0) + 1
         if processed_counter['total'] % 50 == 0:
             print(f"Processed {processed_counter['total']}/{total_stocks} stocks...")
     
@@ -179,33 +263,13 @@ def process_stock(row, stats_lock, processed_counter, total_stocks):
     
     return result_row
 
-def main():
-    """Main function to add market cap and organize stocks by sector."""
-    print("=" * 80)
-    print("Adding Market Cap and Organizing Stocks by Sector")
-    print("=" * 80)
-    
-    # Check API key
-    if not API_KEY:
-        logger.error("FMP_API_KEY not found in .env file")
-        print("Error: FMP_API_KEY not found in .env file")
-        return
-    
-    # Read input Excel file
-    print(f"\nReading input file: {INPUT_EXCEL_FILE}")
-    if not os.path.exists(INPUT_EXCEL_FILE):
-        logger.error(f"Input file not found: {INPUT_EXCEL_FILE}")
-        print(f"Error: Input file not found: {INPUT_EXCEL_FILE}")
-        return
-    
-    try:
-        df = pd.read_excel(INPUT_EXCEL_FILE, engine='openpyxl')
-        print(f"Loaded {len(df)} stocks from input file")
-    except Exception as e:
-        logger.error(f"Error reading Excel file: {e}")
-        print(f"Error reading Excel file: {e}")
-        return
-    
+def add_market_caps(df):
+    """
+    Fetch the market cap of every stock in df, order the columns and keep the
+    valid rows with market cap >= 1 billion (see stock_filters.py).
+    Returns (DataFrame, stats for the summary file), or (None, None) if no
+    stock is left.
+    """
     # Check required columns
     required_columns = ['Symbol']
     missing_columns = [col for col in required_columns if col not in df.columns]
@@ -213,7 +277,7 @@ def main():
         logger.error(f"Missing required columns: {missing_columns}")
         print(f"Error: Missing required columns: {missing_columns}")
         print(f"Available columns: {list(df.columns)}")
-        return
+        return None, None
     
     # Filter out rows with missing symbols
     initial_count = len(df)
@@ -222,7 +286,7 @@ def main():
     
     if len(df) == 0:
         print("No valid stocks to process")
-        return
+        return None, None
     
     # Process stocks with multi-threading
     print("\n" + "=" * 80)
@@ -237,9 +301,12 @@ def main():
     
     start_time = time.time()
     
+    resolved, quoted = resolve_market_caps(list(dict.fromkeys(df['Symbol'])))
+    
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         futures = {
-            executor.submit(process_stock, row.to_dict(), stats_lock, processed_counter, total_stocks): idx
+            executor.submit(process_stock, row.to_dict(), resolved, quoted, stats_lock, processed_counter,
+                            total_stocks): idx
             for idx, row in df.iterrows()
         }
         
@@ -256,11 +323,21 @@ def main():
     processing_time = time.time() - start_time
     
     print(f"\nProcessing completed in {processing_time:.2f} seconds")
+    print(fmp_client.rate_limiter.summary())
+    logger.info(fmp_client.rate_limiter.summary())
+    logger.info(fmp_client.concurrency.summary())
+    logger.info(quote_batcher.summary())
+    source_lines = market_cap_source_lines(processed_counter, total_stocks)
+    logger.info("Market cap sources:")
+    print("Market cap sources:")
+    for line in source_lines:
+        logger.info(line)
+        print(line)
     print(f"Processed {len(processed_stocks)} stocks")
     
     if len(processed_stocks) == 0:
         print("No stocks processed successfully")
-        return
+        return None, None
     
     # Convert to DataFrame
     df_processed = pd.DataFrame(processed_stocks)
@@ -323,9 +400,9 @@ def main():
         # Convert Market Cap to numeric, handling any string values
         df_processed['Market Cap'] = pd.to_numeric(df_processed['Market Cap'], errors='coerce')
         
-        # Filter for market cap >= 1 billion
+        # Filter for market cap >= 1 billion (shared with the pre-filter in fetch_undervalued_stocks.py)
         before_mcap_filter = len(df_processed)
-        df_processed = df_processed[df_processed['Market Cap'] >= 1_000_000_000]
+        df_processed = df_processed[stock_filters.market_cap_mask(df_processed['Market Cap'])]
         after_mcap_filter = len(df_processed)
         
         print(f"Removed {initial_count - before_mcap_filter} rows with missing/invalid Symbol")
@@ -338,7 +415,7 @@ def main():
     
     if len(df_processed) == 0:
         print("No valid stocks remaining after filtering. Exiting.")
-        return
+        return None, None
     
     # Ensure Sector column exists
     if 'Sector' not in df_processed.columns:
@@ -347,14 +424,23 @@ def main():
     # Fill missing sectors
     df_processed['Sector'] = df_processed['Sector'].fillna('Unknown')
     
+    stats = {'total_stocks': total_stocks, 'with_market_cap': len(processed_stocks), 'processing_time': processing_time,
+             'market_cap_sources': source_lines}
+    return df_processed, stats
+
+def save_by_sector(df_processed, output_folder=OUTPUT_FOLDER):
+    """
+    Save one stage file per sector to output_folder, sorted by discount.
+    Returns the sector names.
+    """
     # Create output folder
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
-        print(f"\nCreated output folder: {OUTPUT_FOLDER}")
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+        print(f"\nCreated output folder: {output_folder}")
     
-    # Group by sector and save to separate Excel files
+    # Group by sector and save to separate stage files
     print("\n" + "=" * 80)
-    print("Organizing stocks by sector and saving to Excel files...")
+    print("Organizing stocks by sector and saving to stage files...")
     print("=" * 80)
     
     sectors = df_processed['Sector'].unique()
@@ -373,29 +459,39 @@ def main():
         if not safe_sector_name:
             safe_sector_name = 'Unknown'
         
-        output_file = os.path.join(OUTPUT_FOLDER, f"{safe_sector_name}.xlsx")
+        output_file = stage_io.stage_path(os.path.join(output_folder, safe_sector_name))
         
         try:
-            sector_df.to_excel(output_file, index=False, engine='openpyxl')
+            stage_io.write_stage(sector_df, os.path.join(output_folder, safe_sector_name))
             print(f"  {sector}: {len(sector_df)} stocks -> {output_file}")
             logger.info(f"Saved {len(sector_df)} stocks for sector '{sector}' to {output_file}")
         except Exception as e:
             logger.error(f"Error saving sector '{sector}': {e}")
             print(f"  Error saving {sector}: {e}")
     
+    return sorted(sectors)
+
+def write_summary(df_processed, sectors, stats, output_folder=OUTPUT_FOLDER):
+    """Write _summary.txt for the sector files."""
     # Create summary file
-    summary_file = os.path.join(OUTPUT_FOLDER, '_summary.txt')
+    summary_file = os.path.join(output_folder, '_summary.txt')
     with open(summary_file, 'w') as f:
         f.write("Stock Organization by Sector Summary\n")
         f.write("=" * 80 + "\n\n")
         f.write(f"Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Total Stocks Processed: {total_stocks}\n")
-        f.write(f"Stocks with Market Cap Added: {len(processed_stocks)}\n")
+        f.write(f"Total Stocks Processed: {stats['total_stocks']}\n")
+        f.write(f"Stocks with Market Cap Added: {stats['with_market_cap']}\n")
         f.write(f"Stocks after filtering (Market Cap >= 1B, valid rows): {len(df_processed)}\n")
-        f.write(f"Processing Time: {processing_time:.2f} seconds\n\n")
+        f.write(f"Processing Time: {stats['processing_time']:.2f} seconds\n\n")
         f.write("Filtering Criteria:\n")
         f.write("  - Removed rows with missing/invalid Symbol\n")
         f.write("  - Market Cap >= 1 billion USD\n\n")
+        if stats.get('market_cap_sources'):
+            f.write("Market Cap Sources:\n")
+            f.write("-" * 80 + "\n")
+            for line in stats['market_cap_sources']:
+                f.write(line + "\n")
+            f.write("\n")
         f.write("Sector Breakdown:\n")
         f.write("-" * 80 + "\n")
         for sector in sorted(sectors):
@@ -403,11 +499,48 @@ def main():
             f.write(f"  {sector}: {count} stocks\n")
     
     print(f"\nSummary saved to: {summary_file}")
+
+def main():
+    """Main function to add market cap and organize stocks by sector."""
+    print("=" * 80)
+    print("Adding Market Cap and Organizing Stocks by Sector")
+    print("=" * 80)
+    
+    # Check API key
+    if not API_KEYS:
+        logger.error("FMP_API_KEY (or FMP_API_KEYS) not found in .env file")
+        print("Error: FMP_API_KEY (or FMP_API_KEYS) not found in .env file")
+        return
+    
+    # Read input stage file
+    input_file = stage_io.find_stage(INPUT_FILE)
+    if input_file is None:
+        logger.error(f"Input file not found: {stage_io.stage_path(INPUT_FILE)}")
+        print(f"Error: Input file not found: {stage_io.stage_path(INPUT_FILE)}")
+        return
+    print(f"\nReading input file: {input_file}")
+    
+    try:
+        df = stage_io.read_stage(input_file)
+        print(f"Loaded {len(df)} stocks from input file")
+    except Exception as e:
+        logger.error(f"Error reading input file: {e}")
+        print(f"Error reading input file: {e}")
+        return
+    
+    df_processed, stats = add_market_caps(df)
+    if df_processed is None:
+        return
+    
+    sectors = save_by_sector(df_processed)
+    write_summary(df_processed, sectors, stats)
+    
     print("\n" + "=" * 80)
     print("Analysis complete!")
     print(f"Results saved in folder: {OUTPUT_FOLDER}")
     print("=" * 80)
 
 if __name__ == '__main__':
+    setup_logging()
     main()
 
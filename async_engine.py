@@ -0,0 +1,215 @@
+"""
+Asyncio engine for the per-symbol DCF/quote/profile fan-out in
+fetch_undervalued_stocks.py (selected with --engine async).
+Keeps up to hundreds of requests in flight (an adaptive AIMD limit, see
+concurrency_limiter.py) under the shared token-bucket rate limit from
+fmp_client, and reuses the same parsing, classification and
+cache functions as the threaded engine so stock_valuations.csv and the
+caches come out the same.
+"""
+
+import asyncio
+import time
+
+import aiohttp
+
+import fetch_undervalued_stocks as fus
+import concurrency_limiter
+import fmp_client
+from concurrency_limiter import AsyncAdaptiveConcurrency
+from fetch_undervalued_stocks import logger
+from rate_limiter import parse_retry_after
+
+# Async engine configuration
+ASYNC_MAX_IN_FLIGHT = 200  # Maximum concurrent HTTP requests
+ASYNC_START_IN_FLIGHT = 50  # Initial in-flight limit, adapted between 1 and ASYNC_MAX_IN_FLIGHT
+ASYNC_WORKERS = 1000  # Symbols processed concurrently (most are waiting on a request or a /quote chunk)
+REQUEST_TIMEOUT = 30  # Seconds
+
+
+class AsyncFetchContext:
+    """HTTP session and in-flight limit shared by the whole run."""
+
+    def __init__(self, session):
+        self.session = session
+        self.limiter = fmp_client.rate_limiter
+        self.in_flight = AsyncAdaptiveConcurrency('async', ASYNC_START_IN_FLIGHT, maximum=ASYNC_MAX_IN_FLIGHT,
+                                                  adaptive=fmp_client.ADAPTIVE_CONCURRENCY)
+
+
+async def make_api_request_async(ctx, url, params=None):
+    """
+    Async counterpart of make_api_request.
+    Returns the decoded JSON payload or None if the request failed.
+    """
+    if params is None:
+        params = {}
+    params['apikey'] = fus.API_KEY
+
+    failed_key = None  # Key the previous attempt was told to switch away from
+    for attempt in range(fmp_client.RATE_LIMIT_RETRIES + 1):
+        # Take the in-flight slot first so at most limit callers hold token reservations
+        slot = await ctx.in_flight.acquire()
+        outcome, start, network_time = concurrency_limiter.ERROR, None, 0.0
+        try:
+            key = await ctx.limiter.acquire_async(exclude=failed_key)
+            if key.value:
+                params['apikey'] = key.value
+            start = time.monotonic()
+            async with ctx.session.get(url, params=params) as response:
+                outcome = fmp_client.response_outcome(response.status)
+                if response.status == 429:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    ctx.limiter.on_response(key, 429, retry_after)
+                    if attempt < fmp_client.RATE_LIMIT_RETRIES:
+                        failed_key = None
+                        continue
+                    logger.warning(f"Rate limit hit for URL: {url} (retries exhausted)")
+                    return None
+                switch_key = ctx.limiter.on_response(key, response.status)
+                if switch_key and attempt < fmp_client.RATE_LIMIT_RETRIES:
+                    failed_key = key
+                    continue
+                if response.status in (401, 403):
+                    logger.error(f"Authentication failed with API key {key.label}. Status: {response.status}")
+                    return None
+                if response.status >= 400:
+                    text = await response.text()
+                    logger.warning(f"HTTP error {response.status} for URL: {url}. Response text: {text[:200]}")
+                    return None
+                return await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            outcome = concurrency_limiter.TIMEOUT
+            logger.warning(f"Request timeout for URL: {url}")
+        except (aiohttp.ClientError, ValueError) as e:
+            logger.warning(f"Request error: {e} for URL: {url}")
+        finally:
+            if start is not None:
+                network_time = time.monotonic() - start
+                ctx.limiter.record_network_time(key, network_time)
+            # Also when taking a token fails or is cancelled, or the slot would be lost for the rest of the run
+            await ctx.in_flight.release(slot, outcome, network_time)
+        return None
+    return None
+
+
+async def get_dcf_value_async(ctx, symbol):
+    """Async version of get_dcf_value (cache first, then API)."""
+    cached_dcf = fus.get_cached_field(symbol, 'dcf')
+    if cached_dcf is not None:
+        return cached_dcf, fus.fresh_field(fus.get_cached_stock(symbol), 'price')
+
+    data = await make_api_request_async(ctx, f"{fus.BASE_URL}/discounted-cash-flow/{symbol}")
+    if data is None:
+        fus.mark_lookup_failed()
+        return None, None
+    return fus.parse_dcf_response(symbol, data)
+
+
+async def get_stock_price_async(ctx, symbol):
+    """Async version of get_stock_price (cache first, then API)."""
+    cached_price = fus.get_cached_field(symbol, 'price')
+    if cached_price is not None:
+        return cached_price
+
+    # Batched with other pending symbols into one /quote call
+    quote = await asyncio.wrap_future(fus.quote_batcher.submit(symbol))
+    price = quote.get('price') if quote else None
+    return price if price and price > 0 else None
+
+
+async def get_company_profile_async(ctx, symbol):
+    """Async version of get_company_profile (cache first, then API)."""
+    cached_profile = fus.get_cached_field(symbol, 'profile')
+    if cached_profile is not None:
+        return cached_profile
+
+    data = await make_api_request_async(ctx, f"{fus.BASE_URL}/profile/{symbol}")
+    if data is None:
+        return None
+    return fus.parse_profile_response(symbol, data)
+
+
+async def process_stock_async(ctx, stock, use_bulk, dcf_bulk, profiles_bulk, OVERVALUED_BUFFER, stats_lock,
+                              undervalued_stocks, fair_stocks, undervalued_stocks_cache, processed_counter):
+    """
+    Async version of process_stock. Same lookup order and classification,
+    with pacing done by the shared rate limiter.
+    """
+    symbol = stock.get('symbol', '')
+    if not symbol:
+        return None
+
+    company_name = fus.get_display_name(symbol, use_bulk, profiles_bulk)
+
+    fus.begin_symbol_lookups()
+    negative_reason = fus.get_negative_reason(symbol, dcf_bulk if use_bulk else None)
+    if negative_reason:
+        return fus.negative_cached_detail(symbol, company_name, negative_reason, dcf_bulk if use_bulk else None)
+
+    stock_price_from_dcf = None
+    dcf_value = dcf_bulk.get(symbol) if use_bulk and dcf_bulk else None
+    if dcf_value is None:
+        dcf_value, stock_price_from_dcf = await get_dcf_value_async(ctx, symbol)
+
+    if stock_price_from_dcf and stock_price_from_dcf > 0:
+        current_price = stock_price_from_dcf
+    else:
+        current_price = await get_stock_price_async(ctx, symbol)
+
+    stock_detail = fus.classify_stock(symbol, company_name, dcf_value, current_price, OVERVALUED_BUFFER)
+    fus.update_negative_cache(stock_detail)
+    if not stock_detail['has_data']:
+        return stock_detail
+
+    profile = None
+    if use_bulk and profiles_bulk:
+        profile = profiles_bulk.get(symbol)
+    if profile is None:
+        profile = await get_company_profile_async(ctx, symbol)
+
+    fus.record_valuation(stock_detail, profile, OVERVALUED_BUFFER, stats_lock,
+                         undervalued_stocks, fair_stocks, undervalued_stocks_cache)
+    return stock_detail
+
+
+async def _process_queue(work_queue, results, process_args):
+    connector = aiohttp.TCPConnector(limit=ASYNC_MAX_IN_FLIGHT, limit_per_host=ASYNC_MAX_IN_FLIGHT)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, auto_decompress=True) as session:
+        ctx = AsyncFetchContext(session)
+        loop = asyncio.get_running_loop()
+        stocks = asyncio.Queue(maxsize=ASYNC_WORKERS)
+
+        async def feed():
+            # work_queue is a blocking queue.Queue filled by another thread
+            while True:
+                stock = await loop.run_in_executor(None, work_queue.get)
+                if stock is None:
+                    break
+                await stocks.put(stock)
+            for _ in range(ASYNC_WORKERS):
+                await stocks.put(None)
+
+        async def worker():
+            while True:
+                stock = await stocks.get()
+                if stock is None:
+                    return
+                try:
+                    results.put((stock, await process_stock_async(ctx, stock, *process_args), None))
+                except Exception as e:
+                    results.put((stock, None, e))
+
+        await asyncio.gather(feed(), *(worker() for _ in range(ASYNC_WORKERS)))
+        logger.info(ctx.in_flight.summary())
+
+
+def process_queue(work_queue, results, process_args):
+    """
+    Process stocks from work_queue (a queue.Queue ended by None) on the asyncio
+    engine until it is drained, putting (stock, stock_detail, error) tuples on
+    results. process_args are the same trailing arguments process_stock takes.
+    Meant to run on its own thread for the whole run.
+    """
+    asyncio.run(_process_queue(work_queue, results, process_args))
@@ -0,0 +1,97 @@
+"""
+Benchmark: peak memory of parsing bulk endpoints with response.json()
+versus the streaming parser in bulk_stream.py, measured with tracemalloc.
+Builds the same derived data fetch_undervalued_stocks keeps (the stock list
+and the symbol -> DCF dict) from a mock FMP server running in a separate
+process, so the server's own allocations are not counted.
+
+Usage:
+    python benchmark_bulk_parse.py --sizes 10000 50000 100000
+"""
+
+import argparse
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import fmp_client
+from bulk_stream import iter_bulk_records
+
+STOCK_LIST_FIELDS = ['symbol', 'name', 'exchange', 'exchangeShortName', 'type']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(symbols):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, 'mock_fmp_server.py', '--port', str(port), '--symbols', str(symbols)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return process, f"http://127.0.0.1:{port}/api/v3"
+
+
+def parse_json(base_url):
+    stocks = fmp_client.get(f"{base_url}/stock/list", params={'apikey': 'benchmark'}).json()
+    data = fmp_client.get(f"{base_url}/dcf-bulk", params={'apikey': 'benchmark'}).json()
+    dcf = {item['symbol']: item['dcf'] for item in data if item.get('dcf')}
+    return stocks, dcf
+
+
+def parse_streaming(base_url):
+    response = fmp_client.get(f"{base_url}/stock/list", params={'apikey': 'benchmark'}, stream=True)
+    stocks = list(iter_bulk_records(response, STOCK_LIST_FIELDS))
+    response = fmp_client.get(f"{base_url}/dcf-bulk", params={'apikey': 'benchmark'}, stream=True)
+    dcf = {item['symbol']: item['dcf'] for item in iter_bulk_records(response, ['symbol', 'dcf']) if item.get('dcf')}
+    return stocks, dcf
+
+
+def measure(func, base_url):
+    """Return (peak MB, retained MB, seconds) for one parse."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(base_url)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak / 1e6, retained / 1e6, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk payload parsing memory.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 100000])
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Bulk parse memory benchmark (stock/list + dcf-bulk)")
+    print("=" * 80)
+
+    for n in args.sizes:
+        process, base_url = start_server(n)
+        try:
+            # Warm up the connection pool so it is not counted
+            fmp_client.get(f"{base_url}/quote/S00000", params={'apikey': 'benchmark'}).json()
+            print(f"{n} symbols:")
+            for label, func in [('response.json()', parse_json), ('streaming', parse_streaming)]:
+                peak, retained, elapsed = measure(func, base_url)
+                print(f"  {label:<16} peak {peak:8.1f} MB  retained {retained:8.1f} MB  "
+                      f"parse overhead {peak - retained:8.1f} MB  ({elapsed:.2f}s)")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: per-call requests.get versus the pooled fmp_client session.
+Runs both against a local mock FMP server with the same thread count the
+fetch scripts use and prints requests/sec for each.
+The pooled side calls the per-thread sessions directly, not fmp_client.get:
+that would add the rate limiter and key pool, measuring the configured
+calls-per-minute instead of the connection pool, and would draw down the
+shared budget of the real API key.
+
+Usage:
+    python benchmark_http_client.py --requests 4000 --workers 20
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import fmp_client
+from mock_fmp_server import start_mock_server, make_symbols
+
+
+def run_benchmark(label, get_func, base_url, symbols, workers):
+    """Fetch one quote per symbol using get_func and return requests/sec."""
+    def fetch(symbol):
+        response = get_func(f"{base_url}/quote/{symbol}", params={'apikey': 'benchmark'}, timeout=30)
+        response.json()
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        statuses = list(executor.map(fetch, symbols))
+    elapsed = time.perf_counter() - start
+
+    failures = sum(1 for s in statuses if s != 200)
+    rate = len(symbols) / elapsed if elapsed > 0 else 0
+    print(f"  {label:<28} {len(symbols)} requests in {elapsed:6.2f}s -> {rate:8.1f} req/s ({failures} failed)")
+    return rate
+
+
+def pooled_get(url, **kwargs):
+    """GET through the calling thread's pooled fmp_client session."""
+    return fmp_client.get_session().get(url, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pooled vs unpooled FMP HTTP calls.')
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--workers', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock server latency per request (seconds)')
+    args = parser.parse_args()
+
+    server = start_mock_server(symbol_count=args.requests, latency=args.latency)
+    symbols = make_symbols(args.requests)
+    fmp_client.configure(pool_size=args.workers)
+
+    print("=" * 80)
+    print(f"HTTP client benchmark against mock FMP server ({server.base_url})")
+    print(f"Workers: {args.workers}, requests: {args.requests}, server latency: {args.latency}s")
+    print("=" * 80)
+
+    try:
+        before = run_benchmark('requests.get (no pool)', requests.get, server.base_url, symbols, args.workers)
+        after = run_benchmark('fmp_client session (pooled)', pooled_get, server.base_url, symbols, args.workers)
+    finally:
+        server.shutdown()
+
+    print("-" * 80)
+    print(f"Speedup: {after / before:.2f}x" if before > 0 else "Speedup: n/a")
+
+
+if __name__ == '__main__':
+    main()
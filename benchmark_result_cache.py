@@ -0,0 +1,70 @@
+"""
+Benchmark: inserting undervalued/fair results into the result caches.
+Compares the old pattern (linear scan of a list for an existing Symbol,
+then replace or append) with the symbol-keyed dict the fetch script now
+uses, and the cost of turning the dict back into the on-disk list.
+
+Usage:
+    python benchmark_result_cache.py --sizes 10000 50000
+"""
+
+import argparse
+import time
+
+
+def make_rows(n):
+    return [{'Symbol': f"S{i:06d}", 'Current Price': 10.0, 'DCF Price': 12.0} for i in range(n)]
+
+
+def insert_list_scan(rows):
+    """Old pattern: next(i for i, s in enumerate(cache) if ...) per insert."""
+    cache = []
+    for row in rows:
+        symbol = row['Symbol']
+        existing_idx = next((i for i, s in enumerate(cache) if s.get('Symbol') == symbol), None)
+        if existing_idx is not None:
+            cache[existing_idx] = row
+        else:
+            cache.append(row)
+    return cache
+
+
+def insert_dict(rows):
+    """New pattern: symbol-keyed dict, insertion order kept for saving."""
+    cache = {}
+    for row in rows:
+        cache[row['Symbol']] = row
+    return cache
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark result cache insertion.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Result cache insertion benchmark")
+    print("=" * 80)
+
+    for n in args.sizes:
+        rows = make_rows(n)
+        list_time, as_list = timed(insert_list_scan, rows)
+        dict_time, as_dict = timed(insert_dict, rows)
+        save_time, saved = timed(lambda d: list(d.values()), as_dict)
+        assert saved == as_list
+
+        print(f"{n} entries:")
+        print(f"  list scan (old)       {list_time:8.3f}s  ({list_time / n * 1e6:8.2f} us/insert)")
+        print(f"  symbol dict (new)     {dict_time:8.3f}s  ({dict_time / n * 1e6:8.2f} us/insert)")
+        print(f"  dict -> list for save {save_time:8.3f}s")
+        print(f"  Speedup: {list_time / dict_time:.0f}x" if dict_time > 0 else "  Speedup: n/a")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark: write/read latency and file size of a stage file in each format
+stage_io supports (xlsx via openpyxl, Parquet, Arrow IPC read back
+memory-mapped), with CSV for reference. The rows look like the regions
+stage output (stock_valuations columns plus the region columns), or come
+from an existing stock_valuations.csv with --input. Runs in a temporary
+directory.
+
+Usage:
+    python benchmark_stage_formats.py --rows 10000
+    python benchmark_stage_formats.py --input stock_valuations.csv
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+
+def make_frame(n):
+    rng = random.Random(42)
+    sectors = ['Technology', 'Healthcare', 'Financial Services', 'Industrials', 'Energy', 'Utilities']
+    rows = []
+    for i in range(n):
+        dcf = round(rng.uniform(5, 500), 2)
+        price = round(dcf * rng.uniform(0.5, 1.2), 2)
+        undervalued = price < dcf
+        rows.append({
+            'Symbol': f"S{i:06d}",
+            'Company Name': f"Company {i} Holdings Inc.",
+            'Current Price': price,
+            'DCF Price': dcf,
+            'Discount %': round((dcf - price) / dcf * 100, 2) if undervalued else 0.0,
+            'Premium %': 0.0 if undervalued else round((price - dcf) / dcf * 100, 2),
+            'Valuation Status': 'UNDERVALUED' if undervalued else 'FAIR',
+            'Sector': rng.choice(sectors),
+            'Industry': f"Industry {rng.randrange(60)}",
+            'Country': rng.choice(['US', 'US', 'US', 'CA', 'GB']),
+            'City': f"City {rng.randrange(500)}",
+            'State': rng.choice(['CA', 'NY', 'TX', 'WA', 'N/A']),
+            'Exchange': rng.choice(['NASDAQ', 'NYSE', 'AMEX']),
+            'Currency': 'USD',
+            'Address': f"{rng.randrange(1, 9999)} Main Street",
+            'Phone': f"+1 555 {rng.randrange(1000000):07d}",
+            'Website': f"https://www.company{i}.com",
+            'Region_Fetched': True,
+            'Timestamp': '2026-01-01T00:00:00',
+            'Region_Fetch_Timestamp': '2026-01-01T00:05:00',
+        })
+    return pd.DataFrame(rows)
+
+
+def write_csv(df, base):
+    path = base + '.csv'
+    df.to_csv(path, index=False)
+    return path
+
+
+def best_of(repeat, func, *args):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark stage file formats (xlsx, Parquet, Arrow IPC).')
+    parser.add_argument('--rows', type=int, default=10000, help='Synthetic rows (ignored with --input)')
+    parser.add_argument('--input', help='Use an existing CSV (e.g. stock_valuations.csv) instead of synthetic rows')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the best is reported')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import stage_io
+
+    if args.input:
+        df = pd.read_csv(args.input, keep_default_na=False, na_values=[''])
+    else:
+        df = make_frame(args.rows)
+    os.chdir(tempfile.mkdtemp())
+    stage_io.EXCEL_EXPORT = False
+
+    print("=" * 80)
+    print(f"Stage file formats: {len(df)} rows x {len(df.columns)} columns")
+    print("=" * 80)
+    print(f"  {'format':<10} {'write':>10} {'read':>10} {'size':>12}")
+
+    results = {}
+    for fmt in ['xlsx', 'parquet', 'arrow', 'csv']:
+        base = f"stage_{fmt}"
+        if fmt == 'csv':
+            write_time, path = best_of(args.repeat, write_csv, df, base)
+            read_time, loaded = best_of(args.repeat, pd.read_csv, path)
+        else:
+            write_time, path = best_of(args.repeat, stage_io.write_stage, df, base, fmt)
+            read_time, loaded = best_of(args.repeat, stage_io.read_stage, path)
+        assert len(loaded) == len(df) and list(loaded.columns) == list(df.columns), fmt
+        size = os.path.getsize(path)
+        results[fmt] = (write_time, read_time, size)
+        print(f"  {fmt:<10} {write_time * 1000:8.1f}ms {read_time * 1000:8.1f}ms {size / 1024:9.1f} KiB")
+
+    xlsx_write, xlsx_read, xlsx_size = results['xlsx']
+    for fmt in ['parquet', 'arrow']:
+        write_time, read_time, size = results[fmt]
+        print(f"  {fmt} vs xlsx: write {xlsx_write / write_time:.0f}x faster, "
+              f"read {xlsx_read / read_time:.0f}x faster, {size / xlsx_size:.2f}x the file size")
+
+
+if __name__ == '__main__':
+    main()
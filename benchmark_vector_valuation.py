@@ -0,0 +1,83 @@
+"""
+Benchmark: classifying stocks whose DCF, price and profile are already known
+(the bulk-covered part of the universe), one process_stock-style call per
+symbol (classify_stock + record_valuation) versus the columnar path in
+vector_valuation.py. No network calls; runs in a temporary directory so the
+fetch script's caches and logs are not touched.
+
+Usage:
+    python benchmark_vector_valuation.py --sizes 10000 50000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from threading import Lock
+
+import vector_valuation
+
+
+def make_universe(n):
+    rng = random.Random(42)
+    symbols = [f"S{i:06d}" for i in range(n)]
+    dcf = [round(rng.uniform(5, 500), 4) for _ in symbols]
+    prices = [round(value * rng.uniform(0.5, 1.6), 2) for value in dcf]
+    profiles = [{'companyName': f"Company {s}", 'sector': 'Technology', 'industry': 'Software'} for s in symbols]
+    return symbols, dcf, prices, profiles
+
+
+def per_symbol(fus, symbols, dcf, prices, profiles):
+    undervalued, fair, cache = [], [], {}
+    lock = Lock()
+    for symbol, dcf_value, price, profile in zip(symbols, dcf, prices, profiles):
+        detail = fus.classify_stock(symbol, profile['companyName'], dcf_value, price, 0.20)
+        fus.record_valuation(detail, profile, 0.20, lock, undervalued, fair, cache)
+    return len(undervalued), len(fair)
+
+
+def vectorized(symbols, dcf, prices, profiles):
+    frame = vector_valuation.build_frame(symbols, dcf, prices, profiles)
+    classified = vector_valuation.classify_frame(frame, 0.20)
+    rows = vector_valuation.result_rows(classified, '2026-01-01T00:00:00')
+    status = rows['Valuation Status']
+    return int((status == 'UNDERVALUED').sum()), int((status == 'FAIR').sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-symbol vs vectorized classification.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(tempfile.mkdtemp())
+    import fetch_undervalued_stocks as fus
+
+    print("=" * 80)
+    print("Valuation classification benchmark (per-symbol vs vectorized)")
+    print("=" * 80)
+
+    for n in args.sizes:
+        universe = make_universe(n)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            loop_counts = per_symbol(fus, *universe)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vector_counts = vectorized(*universe)
+        vector_time = time.perf_counter() - start
+        assert loop_counts == vector_counts, (loop_counts, vector_counts)
+
+        print(f"{n} stocks ({vector_counts[0]} undervalued, {vector_counts[1]} fair):")
+        print(f"  per-symbol  {loop_time:8.3f}s  ({loop_time / n * 1e6:8.2f} us/stock)")
+        print(f"  vectorized  {vector_time:8.3f}s  ({vector_time / n * 1e6:8.2f} us/stock)")
+        print(f"  Speedup: {loop_time / vector_time:.0f}x" if vector_time > 0 else "  Speedup: n/a")
+
+
+if __name__ == '__main__':
+    main()
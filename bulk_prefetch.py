@@ -0,0 +1,128 @@
+"""
+Background download of the bulk data fetch_undervalued_stocks needs before
+classifying (stock list, dcf-bulk, profile-bulk), so per-symbol processing
+can start while profile-bulk parts are still arriving.
+A symbol is ready once the stock list and dcf-bulk are in and either its
+profile has arrived or the profile download has finished (symbols still
+missing then take the per-symbol path).
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BulkPrefetcher:
+    """
+    Runs fetch_stocks(), fetch_dcf() and fetch_profiles(on_part) concurrently.
+    fetch_profiles must call on_part(profiles) with a dict of symbol -> profile
+    for every part as it arrives. The merged profiles are available in
+    self.profiles while the download is still running.
+    """
+
+    def __init__(self, fetch_stocks, fetch_dcf, fetch_profiles):
+        self.fetch_stocks = fetch_stocks
+        self.fetch_dcf = fetch_dcf
+        self.fetch_profiles = fetch_profiles
+
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.profiles = {}  # Grows as profile-bulk parts arrive
+        self.profiles_done = False
+        self.stopped = False  # Set by stop(): hand out no more stocks
+        self.waiting = None  # symbol -> stock, waiting for its profile
+        self.ready = deque()  # Stocks ready to process, in arrival order
+
+        self.executor = None
+        self.stocks_future = None
+        self.dcf_future = None
+        self.profiles_future = None
+        self.start_time = None
+        self.timings = {}  # name -> seconds from start until that download finished
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self.executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='bulk')
+        self.stocks_future = self.executor.submit(self._timed, 'stock list', self.fetch_stocks)
+        self.dcf_future = self.executor.submit(self._timed, 'dcf-bulk', self.fetch_dcf)
+        self.profiles_future = self.executor.submit(self._run_profiles)
+        return self
+
+    def _timed(self, name, func, *args):
+        try:
+            return func(*args)
+        finally:
+            self.timings[name] = time.monotonic() - self.start_time
+
+    def _on_part(self, part_profiles):
+        with self.condition:
+            self.profiles.update(part_profiles)
+            if self.waiting is not None:
+                for symbol in part_profiles:
+                    stock = self.waiting.pop(symbol, None)
+                    if stock is not None:
+                        self.ready.append(stock)
+            self.condition.notify_all()
+
+    def _run_profiles(self):
+        try:
+            return self._timed('profile-bulk', self.fetch_profiles, self._on_part)
+        finally:
+            with self.condition:
+                self.profiles_done = True
+                if self.waiting is not None:
+                    self.ready.extend(self.waiting.values())
+                    self.waiting.clear()
+                self.condition.notify_all()
+
+    def stocks(self):
+        """Block until the stock list is in and return it."""
+        return self.stocks_future.result()
+
+    def dcf(self):
+        """Block until dcf-bulk is in and return it (None if unavailable)."""
+        return self.dcf_future.result()
+
+    def profiles_result(self):
+        """Block until profile-bulk has finished; returns its result."""
+        return self.profiles_future.result()
+
+    def iter_ready_chunks(self, stocks, max_chunk):
+        """
+        Yield lists of up to max_chunk stocks as they become ready. A chunk is
+        yielded with whatever is ready instead of waiting for it to fill.
+        """
+        with self.condition:
+            self.waiting = {}
+            for stock in stocks:
+                symbol = stock.get('symbol', '')
+                if not symbol or self.profiles_done or symbol in self.profiles:
+                    self.ready.append(stock)
+                else:
+                    self.waiting[symbol] = stock
+
+        while True:
+            with self.condition:
+                while not self.ready and self.waiting and not self.profiles_done and not self.stopped:
+                    self.condition.wait()
+                if self.stopped or not self.ready:
+                    return
+                chunk = [self.ready.popleft() for _ in range(min(max_chunk, len(self.ready)))]
+            yield chunk
+
+    def stop(self):
+        """Make iter_ready_chunks return without waiting for more profile parts."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def shutdown(self):
+        if self.executor is not None:
+            # Downloads not started yet (e.g. after Ctrl+C) are dropped rather than waited for
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def summary(self):
+        """One-line human readable summary of when each download finished."""
+        parts = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in sorted(self.timings.items(), key=lambda t: t[1]))
+        return f"Bulk prefetch finished: {parts}"
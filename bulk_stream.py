@@ -0,0 +1,122 @@
+"""
+Streaming parser for FMP bulk endpoints (stock/list, dcf-bulk, profile-bulk).
+response.json() holds the raw body, the full decoded list and whatever we
+derive from it in memory at the same time. These helpers read a streamed
+response (stream=True) chunk by chunk, decode one record at a time and
+keep only the requested fields, so memory stays roughly one chunk plus the
+result we actually keep.
+Handles a JSON array of objects or CSV with a header row (some FMP bulk
+endpoints return CSV).
+"""
+
+import codecs
+import csv
+import json
+
+CHUNK_SIZE = 64 * 1024  # Bytes read from the socket at a time
+
+_decoder = json.JSONDecoder()
+
+
+def _iter_text(response, chunk_size):
+    """Yield decoded text chunks from a streamed response."""
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if chunk:
+            yield decoder.decode(chunk)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _pick(record, fields):
+    if fields is None:
+        return record
+    return {field: record.get(field) for field in fields if field in record}
+
+
+def iter_json_array(chunks, fields=None):
+    """
+    Yield the objects of a top-level JSON array from an iterator of text
+    chunks, without materialising the whole array.
+    Raises ValueError if the payload is not a JSON array.
+    """
+    buffer = ''
+    pos = 0
+    started = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError(f"Expected a JSON array, got {buffer[pos]!r}")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                record, end = _decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Element continues in the next chunk
+                break
+            pos = end
+            if isinstance(record, dict):
+                yield _pick(record, fields)
+    if not started:
+        # Empty body
+        return
+    raise ValueError("Unterminated JSON array in bulk response")
+
+
+def _iter_lines(chunks):
+    # Keep line endings so csv can rejoin quoted fields that span lines
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(('\n', '\r')) else ''
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def iter_csv_records(chunks, fields=None):
+    """Yield rows of a CSV payload (header row first) as dicts."""
+    for row in csv.DictReader(_iter_lines(chunks)):
+        yield _pick(row, fields)
+
+
+def iter_bulk_records(response, fields=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield the records of a streamed bulk response one at a time, keeping only
+    fields (all fields if None). JSON or CSV is detected from the first
+    non-whitespace character. The response is closed when iteration ends.
+    """
+    try:
+        chunks = _iter_text(response, chunk_size)
+        first = ''
+        for chunk in chunks:
+            first += chunk
+            if first.strip():
+                break
+        if not first.strip():
+            return
+
+        def replay():
+            yield first
+            yield from chunks
+
+        if first.lstrip()[0] == '[':
+            yield from iter_json_array(replay(), fields)
+        else:
+            yield from iter_csv_records(replay(), fields)
+    finally:
+        response.close()
@@ -0,0 +1,168 @@
+"""
+Append-only journal for the JSON caches.
+Instead of rewriting the whole cache file on every checkpoint, each update
+is appended to a JSON Lines journal next to it (e.g. stock_cache.json.journal).
+On startup the snapshot is loaded and the journal replayed on top of it.
+Once the journal has grown to about the size of the snapshot it is folded
+into a new snapshot (compaction), so total I/O stays proportional to what
+changed.
+
+Journal records are full values, never deltas, so replaying a record twice
+is harmless. That makes compaction crash-safe: the new snapshot is written
+to a temp file and atomically renamed before the journal is truncated. A
+crash between those two steps just replays records already in the
+snapshot. A half-written line (crash mid-append) is skipped on replay,
+and the first append after load() cuts a torn tail off so new records
+start on a line of their own.
+"""
+
+import io
+import json
+import os
+import threading
+
+JOURNAL_SUFFIX = '.journal'
+COMPACT_MIN_RECORDS = 1000  # Never compact a journal shorter than this
+
+
+class CacheJournal:
+    """
+    Snapshot + journal persistence for a dict cache.
+
+    Record formats (one JSON object per line):
+        {"k": key, "v": value}                  data[key] = value
+        {"k": key, "v": item, "id": field}      upsert item into the list data[key],
+                                                matching on item[field]
+    """
+
+    def __init__(self, snapshot_path, compact_min_records=COMPACT_MIN_RECORDS):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + JOURNAL_SUFFIX
+        self.compact_min_records = compact_min_records
+        self.lock = threading.RLock()
+        self.file = None
+        self.records = 0  # Records in the journal since the last compaction
+        self.snapshot_size = 0  # Top-level keys in the last snapshot
+        self.good_length = None  # Journal bytes up to the end of the last good record, as of load()
+
+    def load(self):
+        """
+        Load the snapshot and replay the journal on top of it.
+        Returns (data, replayed_records). A missing snapshot starts empty.
+        """
+        data = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                data = json.load(f)
+        self.snapshot_size = len(data)
+
+        replayed = 0
+        positions = {}  # list key -> {id: index}, so upserts replay in O(1)
+        offset = good_length = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    offset += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash: skip it, the records around it are intact
+                        continue
+                    self._apply(data, record, positions)
+                    replayed += 1
+                    good_length = offset
+        self.records = replayed
+        self.good_length = good_length
+        return data, replayed
+
+    @staticmethod
+    def _apply(data, record, positions):
+        key, value = record['k'], record['v']
+        id_field = record.get('id')
+        if id_field is None:
+            data[key] = value
+            positions.pop(key, None)
+            return
+        items = data.setdefault(key, [])
+        index = positions.get(key)
+        if index is None:
+            index = positions[key] = {item.get(id_field): i for i, item in enumerate(items)}
+        i = index.get(value.get(id_field))
+        if i is not None:
+            items[i] = value
+        else:
+            index[value.get(id_field)] = len(items)
+            items.append(value)
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self.lock:
+            if self.file is None:
+                self.file = self._open_for_append()
+            self.file.write(line)
+            self.records += 1
+
+    def _open_for_append(self):
+        """
+        Open the journal for appending, first cutting off a torn tail left
+        after the last good record seen by load(), and ending an
+        unterminated last line, so the next record is not glued onto it.
+        """
+        f = open(self.journal_path, 'a+b')
+        size = f.seek(0, os.SEEK_END)
+        if self.good_length is not None and size > self.good_length:
+            f.truncate(self.good_length)
+            size = self.good_length
+        if size:
+            f.seek(size - 1)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+        return io.TextIOWrapper(f, encoding='utf-8', newline='\n')
+
+    def set(self, key, value):
+        """Journal data[key] = value."""
+        self._write({'k': key, 'v': value})
+
+    def upsert(self, key, item, id_field='Symbol'):
+        """Journal an upsert of item into the list data[key]."""
+        self._write({'k': key, 'v': item, 'id': id_field})
+
+    def flush(self):
+        """Push buffered journal records to disk (cheap checkpoint)."""
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+
+    def needs_compaction(self):
+        with self.lock:
+            return self.records >= max(self.compact_min_records, self.snapshot_size)
+
+    def compact(self, data):
+        """
+        Write data as the new snapshot and truncate the journal.
+        Callers must hold whatever lock guards data so it is not mutated
+        while being serialized.
+        """
+        with self.lock:
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self.records = 0
+            self.snapshot_size = len(data)
+            self.good_length = None
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
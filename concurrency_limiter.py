@@ -0,0 +1,203 @@
+"""
+Adaptive (AIMD) limit on the number of FMP requests in flight.
+Instead of a fixed MAX_WORKERS, each request takes a slot from an
+AdaptiveConcurrency before it is sent. While responses come back healthy
+(no 429, no timeout, latency near the best seen) the limit grows by about
+one slot per round of requests (additive increase); a 429 or a timeout
+cuts it by BACKOFF_FACTOR (multiplicative decrease), at most once per
+round. The limit is sampled every TRAJECTORY_INTERVAL seconds and logged
+with the throughput achieved, so the log shows what concurrency the plan
+can sustain; summary() reports it at the end of the run.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_FACTOR = 0.7  # Limit multiplier on a 429 or timeout
+INCREASE_STEP = 1.0  # Slots gained per round of healthy responses (a round = limit responses)
+LATENCY_TOLERANCE = 1.5  # Latency above this multiple of the best seen stops the limit growing
+LATENCY_SMOOTHING = 0.1  # Weight of each response in the latency moving average
+TRAJECTORY_INTERVAL = float(os.getenv('FMP_CONCURRENCY_LOG_INTERVAL', '10'))  # Seconds between trajectory samples
+TRAJECTORY_SUMMARY_POINTS = 20  # Samples shown in summary() (every sample is logged as it is taken)
+
+# Outcomes passed to release()
+OK = 'ok'
+RATE_LIMITED = 'rate_limited'
+TIMEOUT = 'timeout'
+ERROR = 'error'  # 5xx or connection error: holds the limit where it is
+
+
+class AdaptiveConcurrency:
+    """
+    Thread-safe AIMD concurrency limit.
+    acquire() blocks until fewer than limit requests are in flight and
+    returns a start time to hand back to release() with the outcome and the
+    request's network latency. With adaptive=False the limit stays at start.
+    """
+
+    def __init__(self, name, start, minimum=1, maximum=None, adaptive=True):
+        self.name = name
+        self.maximum = max(maximum or start, start)
+        self.minimum = min(minimum, start)
+        self.start_limit = start
+        self.limit = float(start)
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.slot_free = threading.Condition(self.lock)
+        self.last_backoff = 0.0  # Requests sent before this were in flight when the limit was last cut
+        self.latency = None  # Moving average
+        self.best_latency = None
+
+        # Statistics
+        self.started = None
+        self.completed = 0
+        self.rate_limited = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.backoffs = 0
+        self.low = start
+        self.high = start
+        self.trajectory = []  # (seconds since first request, limit, requests/s, 429s, timeouts) per interval
+        self.sample_start = None
+        self.sample = {'completed': 0, 'rate_limited': 0, 'timeouts': 0}
+
+    def _admit(self):
+        # Called with self.lock held
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        if self.started is None:
+            self.started = self.sample_start = time.monotonic()
+        return True
+
+    def _free_slots(self):
+        return max(0, int(self.limit) - self.in_flight)
+
+    def acquire(self):
+        """Block until a slot is free. Returns the start time to pass to release()."""
+        with self.slot_free:
+            self.slot_free.wait_for(self._admit)
+        return time.monotonic()
+
+    def release(self, start, outcome, latency):
+        """Give the slot back, adapting the limit to the request's outcome and latency (seconds)."""
+        lines = self._finish(start, outcome, latency)
+        for line in lines:
+            logger.info(line)
+
+    def _finish(self, start, outcome, latency):
+        """Free the slot and update the limit and statistics. Returns lines to log."""
+        lines = []
+        with self.lock:
+            full = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self.completed += 1
+            self.sample['completed'] += 1
+            now = time.monotonic()
+            if outcome in (RATE_LIMITED, TIMEOUT):
+                if outcome == RATE_LIMITED:
+                    self.rate_limited += 1
+                    self.sample['rate_limited'] += 1
+                else:
+                    self.timeouts += 1
+                    self.sample['timeouts'] += 1
+                # Requests already in flight at the last cut report the same congestion: cut once per round
+                if self.adaptive and start >= self.last_backoff and self.limit > self.minimum:
+                    previous = int(self.limit)
+                    self.limit = max(float(self.minimum), self.limit * BACKOFF_FACTOR)
+                    self.last_backoff = now
+                    self.backoffs += 1
+                    self.low = min(self.low, int(self.limit))
+                    lines.append(f"Concurrency ({self.name}): {outcome.replace('_', '-')} response, "
+                                 f"limit {previous} -> {int(self.limit)}")
+            elif outcome == OK:
+                self.latency = latency if self.latency is None else (
+                    self.latency + LATENCY_SMOOTHING * (latency - self.latency))
+                if self.best_latency is None or self.latency < self.best_latency:
+                    self.best_latency = self.latency
+                # Only grow while the limit is what holds requests back and latency has not built up
+                healthy = self.latency <= max(self.best_latency * LATENCY_TOLERANCE, 0.001)
+                if self.adaptive and full and healthy and self.limit < self.maximum:
+                    self.limit = min(float(self.maximum), self.limit + INCREASE_STEP / self.limit)
+                    self.high = max(self.high, int(self.limit))
+            else:
+                self.errors += 1
+            if now - self.sample_start >= TRAJECTORY_INTERVAL:
+                lines.append(self._take_sample(now))
+            self._wake()
+        return lines
+
+    def _wake(self):
+        # Called with self.lock held
+        free = self._free_slots()
+        if free:
+            self.slot_free.notify(free)
+
+    def _take_sample(self, now):
+        # Called with self.lock held
+        sample = self.sample
+        rate = sample['completed'] / (now - self.sample_start)
+        point = (now - self.started, int(self.limit), rate, sample['rate_limited'], sample['timeouts'])
+        self.trajectory.append(point)
+        self.sample_start = now
+        self.sample = {'completed': 0, 'rate_limited': 0, 'timeouts': 0}
+        latency = f"{self.latency * 1000:.0f}ms" if self.latency is not None else 'n/a'
+        return (f"Concurrency ({self.name}) at {point[0]:.0f}s: limit {point[1]}, {rate:.1f} requests/s, "
+                f"{point[3]} x 429, {point[4]} timeouts, latency {latency}")
+
+    def summary(self):
+        """End-of-run summary: limit range, backoffs and the throughput sustained along the trajectory."""
+        with self.lock:
+            if not self.completed:
+                return f"Concurrency ({self.name}): no requests made"
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            text = (f"Concurrency ({self.name}): limit {self.start_limit} -> {int(self.limit)} "
+                    f"(range {self.low}-{self.high}, max {self.maximum}), {self.backoffs} backoffs "
+                    f"({self.rate_limited} x 429, {self.timeouts} timeouts), "
+                    f"{self.completed} requests at {self.completed / elapsed:.1f}/s overall")
+            clean = [point for point in self.trajectory if not point[3] and not point[4]]
+            if clean:
+                best = max(clean, key=lambda point: point[2])
+                text += f"; best interval without 429s/timeouts: {best[2]:.1f} requests/s at limit {best[1]}"
+            if self.trajectory:
+                step = max(1, len(self.trajectory) // TRAJECTORY_SUMMARY_POINTS)
+                text += "; trajectory (s:limit) " + " ".join(
+                    f"{point[0]:.0f}:{point[1]}" for point in self.trajectory[::step])
+            return text
+
+
+class AsyncAdaptiveConcurrency(AdaptiveConcurrency):
+    """AdaptiveConcurrency for callers on one asyncio event loop (see async_engine.py)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.async_slot_free = None  # asyncio.Condition, created on the running loop
+
+    def _try_admit(self):
+        with self.lock:
+            return self._admit()
+
+    async def acquire(self):
+        if self.async_slot_free is None:
+            self.async_slot_free = asyncio.Condition()
+        async with self.async_slot_free:
+            await self.async_slot_free.wait_for(self._try_admit)
+        return time.monotonic()
+
+    async def release(self, start, outcome, latency):
+        for line in self._finish(start, outcome, latency):
+            logger.info(line)
+        with self.lock:
+            free = self._free_slots()
+        if free:
+            async with self.async_slot_free:
+                self.async_slot_free.notify(free)
+
+    def _wake(self):
+        pass  # Waiters are woken on the event loop by release()
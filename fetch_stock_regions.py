@@ -1,6 +1,8 @@
 """
 Script to fetch region information for undervalued stocks from cache
-and create an Excel file with the enhanced data.
+and save the enhanced data as a stage file (Parquet by default, see stage_io.py).
+Region fields come from the profiles fetch_undervalued_stocks.py already
+cached; only stocks without a cached profile are looked up on /profile.
 Uses multi-threading for faster processing.
 """
 
@@ -13,28 +15,45 @@ import logging
 import json
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock, Semaphore
+from threading import Lock
+
+import fmp_client
+import profile_cache
+import stage_io
+from key_pool import configured_key_values
 
 # Load environment variables
 load_dotenv()
 
 # FMP API Configuration
-API_KEY = os.getenv('FMP_API_KEY')
-if API_KEY:
-    API_KEY = API_KEY.strip()
+API_KEYS = configured_key_values()  # FMP_API_KEYS, or the single FMP_API_KEY (see key_pool.py)
+API_KEY = API_KEYS[0] if API_KEYS else None  # Placeholder apikey; fmp_client sends the key the pool picks
 BASE_URL = 'https://financialmodelingprep.com/api/v3'
 
-# Rate limiting configuration
-INITIAL_DELAY = 0.2  # Initial delay between requests (seconds)
+# Rate limiting configuration (calls/minute is set by FMP_CALLS_PER_MINUTE, see fmp_client)
 MAX_RETRIES = 1
 
 # Multi-threading configuration
-MAX_WORKERS = 20  # Number of concurrent threads
-API_SEMAPHORE = Semaphore(MAX_WORKERS)  # Limit concurrent API requests
+MAX_WORKERS = fmp_client.CONCURRENCY_MAX  # Worker threads; requests in flight follow fmp_client.concurrency (AIMD)
+fmp_client.configure(pool_size=MAX_WORKERS)  # One pooled connection per worker
 
 # File paths
 UNDERVALUED_CACHE_FILE = 'undervalued_stocks_cache.json'
-OUTPUT_EXCEL_FILE = 'undervalued_stocks_with_regions.xlsx'
+CACHE_BACKEND = os.getenv('FMP_CACHE_BACKEND', 'json')  # 'sqlite' reads undervalued stocks from the shared database
+OUTPUT_FILE = 'undervalued_stocks_with_regions'  # Stage file; stage_io adds the extension
+
+# Region fields: cached profile key -> region_info key
+REGION_FIELDS = {
+    'country': 'country',
+    'city': 'city',
+    'state': 'state',
+    'address': 'address',
+    'phone': 'phone',
+    'website': 'website',
+    'exchangeShortName': 'exchange',
+    'currency': 'currency'
+}
+REGIONS_FROM_CACHE = os.getenv('FMP_REGIONS_FROM_CACHE', '1') != '0'  # 0 = always call /profile
 
 # Setup logging
 def setup_logging():
@@ -63,7 +82,8 @@ def setup_logging():
     
     return logging.getLogger(__name__)
 
-logger = setup_logging()
+# Handlers are attached by setup_logging when run as a script (or by run_pipeline.py)
+logger = logging.getLogger(__name__)
 
 def make_api_request(url, params=None):
     """
@@ -75,19 +95,19 @@ def make_api_request(url, params=None):
     params['apikey'] = API_KEY
     
     try:
-        response = requests.get(url, params=params, timeout=30)
+        response = fmp_client.get(url, params=params, timeout=30)
         
         if response.status_code == 401 or response.status_code == 403:
             try:
                 error_data = response.json()
                 if 'Error Message' in error_data:
-                    logger.error(f"API Key Error: {error_data['Error Message']}")
+                    logger.error(f"API Key Error ({response.api_key.label}): {error_data['Error Message']}")
             except:
-                logger.error(f"Authentication failed. Status: {response.status_code}")
+                logger.error(f"Authentication failed with API key {response.api_key.label}. Status: {response.status_code}")
             return None
         
         if response.status_code == 429:
-            logger.warning(f"Rate limit hit for URL: {url}")
+            logger.warning(f"Rate limit hit for URL: {url} (retries exhausted)")
             return None
         
         if response.status_code >= 400:
@@ -116,78 +136,99 @@ def get_stock_region(symbol):
         try:
             data = response.json()
             if data and len(data) > 0 and isinstance(data[0], dict):
-                profile_data = data[0]
-                region_info = {
-                    'country': profile_data.get('country', 'N/A'),
-                    'city': profile_data.get('city', 'N/A'),
-                    'state': profile_data.get('state', 'N/A'),
-                    'address': profile_data.get('address', 'N/A'),
-                    'phone': profile_data.get('phone', 'N/A'),
-                    'website': profile_data.get('website', 'N/A'),
-                    'exchange': profile_data.get('exchangeShortName', 'N/A'),
-                    'currency': profile_data.get('currency', 'N/A')
-                }
+                region_info = region_from_profile(data[0])
                 logger.debug(f"Region info for {symbol}: {region_info.get('country')}")
                 return region_info
         except (ValueError, IndexError, TypeError) as e:
             logger.debug(f"Error parsing profile response for {symbol}: {e}")
     return None
 
-def process_stock(stock_data, stats_lock, processed_counter, results_list):
+def region_from_profile(profile):
+    """
+    Region information from a /profile record or a cached profile.
+    Cached profiles carry every region key, with None where FMP had no value:
+    those become 'N/A' as for a missing key, so both sources write the same.
+    """
+    return {region_key: profile.get(profile_key) or 'N/A' for profile_key, region_key in REGION_FIELDS.items()}
+
+def cached_region(profile):
+    """
+    Region information from a cached profile, or None if there is none or it
+    was cached before the region fields were kept (then /profile is called).
+    """
+    if not profile or any(field not in profile for field in REGION_FIELDS):
+        return None
+    return region_from_profile(profile)
+
+def process_stock(stock_data, profiles, stats_lock, processed_counter, results_list):
     """
     Process a single stock to fetch region information.
+    Uses the cached profile when it has the region fields, else calls /profile.
     Thread-safe function for parallel processing.
     """
     symbol = stock_data.get('Symbol', '')
     if not symbol:
         return None
     
-    # Use semaphore to limit concurrent API requests
-    with API_SEMAPHORE:
+    region_info = cached_region(profiles.get(symbol))
+    source = 'cache'
+    if region_info is None:
+        # Pacing is done by the shared rate limiter in fmp_client
         region_info = get_stock_region(symbol)
-        time.sleep(INITIAL_DELAY)
-        
-        # Combine existing stock data with region information
-        enhanced_stock = stock_data.copy()
-        
-        if region_info:
-            enhanced_stock['Country'] = region_info.get('country', 'N/A')
-            enhanced_stock['City'] = region_info.get('city', 'N/A')
-            enhanced_stock['State'] = region_info.get('state', 'N/A')
-            enhanced_stock['Address'] = region_info.get('address', 'N/A')
-            enhanced_stock['Phone'] = region_info.get('phone', 'N/A')
-            enhanced_stock['Website'] = region_info.get('website', 'N/A')
-            enhanced_stock['Exchange'] = region_info.get('exchange', 'N/A')
-            enhanced_stock['Currency'] = region_info.get('currency', 'N/A')
-            enhanced_stock['Region_Fetched'] = True
-        else:
-            # No region data available
-            enhanced_stock['Country'] = 'N/A'
-            enhanced_stock['City'] = 'N/A'
-            enhanced_stock['State'] = 'N/A'
-            enhanced_stock['Address'] = 'N/A'
-            enhanced_stock['Phone'] = 'N/A'
-            enhanced_stock['Website'] = 'N/A'
-            enhanced_stock['Exchange'] = 'N/A'
-            enhanced_stock['Currency'] = 'N/A'
-            enhanced_stock['Region_Fetched'] = False
-        
-        enhanced_stock['Region_Fetch_Timestamp'] = datetime.now().isoformat()
-        
-        # Thread-safe append
-        with stats_lock:
-            results_list.append(enhanced_stock)
-            processed_counter['value'] += 1
-        
-        logger.info(f"Processed {symbol}: {enhanced_stock.get('Company Name', 'N/A')} - Country: {enhanced_stock.get('Country', 'N/A')}")
-        print(f"Processed: {symbol} - {enhanced_stock.get('Company Name', 'N/A')} - Country: {enhanced_stock.get('Country', 'N/A')}")
-        
-        return enhanced_stock
+        source = 'api'
+    
+    # Combine existing stock data with region information
+    enhanced_stock = stock_data.copy()
+    
+    if region_info:
+        enhanced_stock['Country'] = region_info.get('country', 'N/A')
+        enhanced_stock['City'] = region_info.get('city', 'N/A')
+        enhanced_stock['State'] = region_info.get('state', 'N/A')
+        enhanced_stock['Address'] = region_info.get('address', 'N/A')
+        enhanced_stock['Phone'] = region_info.get('phone', 'N/A')
+        enhanced_stock['Website'] = region_info.get('website', 'N/A')
+        enhanced_stock['Exchange'] = region_info.get('exchange', 'N/A')
+        enhanced_stock['Currency'] = region_info.get('currency', 'N/A')
+        enhanced_stock['Region_Fetched'] = True
+    else:
+        # No region data available
+        enhanced_stock['Country'] = 'N/A'
+        enhanced_stock['City'] = 'N/A'
+        enhanced_stock['State'] = 'N/A'
+        enhanced_stock['Address'] = 'N/A'
+        enhanced_stock['Phone'] = 'N/A'
+        enhanced_stock['Website'] = 'N/A'
+        enhanced_stock['Exchange'] = 'N/A'
+        enhanced_stock['Currency'] = 'N/A'
+        enhanced_stock['Region_Fetched'] = False
+    
+    enhanced_stock['Region_Fetch_Timestamp'] = datetime.now().isoformat()
+    
+    # Thread-safe append
+    with stats_lock:
+        results_list.append(enhanced_stock)
+        processed_counter['value'] += 1
+        processed_counter[source] += 1
+    
+    logger.info(f"Processed {symbol}: {enhanced_stock.get('Company Name', 'N/A')} - Country: {enhanced_stock.get('Country', 'N/A')}")
+    print(f"Processed: {symbol} - {enhanced_stock.get('Company Name', 'N/A')} - Country: {enhanced_stock.get('Country', 'N/A')}")
+    
+    return enhanced_stock
 
 def load_undervalued_stocks():
     """
-    Load undervalued stocks from cache file.
+    Load undervalued stocks from cache file (or the SQLite cache database).
     """
+    if CACHE_BACKEND == 'sqlite':
+        from sqlite_cache import SQLiteCacheStore, CACHE_DB_FILE
+        try:
+            stocks = SQLiteCacheStore(CACHE_DB_FILE).get_valuations('UNDERVALUED')
+            logger.info(f"Loaded {len(stocks)} stocks from {CACHE_DB_FILE}")
+            return stocks
+        except Exception as e:
+            logger.error(f"Error loading cache database: {e}")
+            return None
+    
     if not os.path.exists(UNDERVALUED_CACHE_FILE):
         logger.error(f"Cache file not found: {UNDERVALUED_CACHE_FILE}")
         return None
@@ -201,30 +242,24 @@ def load_undervalued_stocks():
         logger.error(f"Error loading cache file: {e}")
         return None
 
-def fetch_regions_for_stocks():
+def fetch_regions(stocks):
     """
-    Main function to fetch region information for all undervalued stocks.
+    Fetch region information for a list of stocks (undervalued cache rows).
     Uses multi-threading and batch processing.
+    Returns a DataFrame with the region columns added, sorted by discount,
+    or None if no stock could be processed.
     """
-    logger.info("=" * 80)
-    logger.info("Starting region data fetch for undervalued stocks")
-    logger.info("=" * 80)
-    
-    # Load undervalued stocks from cache
-    stocks = load_undervalued_stocks()
-    if not stocks:
-        logger.error("No stocks to process. Exiting.")
-        return None
-    
     logger.info(f"Processing {len(stocks)} stocks...")
-    logger.info(f"Multi-threading: {MAX_WORKERS} concurrent threads")
+    logger.info(f"Multi-threading: {MAX_WORKERS} threads, up to {fmp_client.CONCURRENCY_MAX} requests in flight "
+                f"(adapted from {fmp_client.CONCURRENCY_START})")
     logger.info(f"Batch size: 2000 stocks per batch")
     logger.info("=" * 80)
     
     start_time = time.time()
     results = []
     stats_lock = Lock()
-    processed_counter = {'value': 0}
+    processed_counter = {'value': 0, 'cache': 0, 'api': 0}
+    profiles = profile_cache.load_cached_profiles([stock.get('Symbol', '') for stock in stocks]) if REGIONS_FROM_CACHE else {}
     
     # Process stocks in batches of 2000
     BATCH_SIZE = 2000
@@ -251,6 +286,7 @@ def fetch_regions_for_stocks():
                 executor.submit(
                     process_stock,
                     stock,
+                    profiles,
                     stats_lock,
                     processed_counter,
                     batch_results
@@ -286,50 +322,74 @@ def fetch_regions_for_stocks():
     total_time = time.time() - start_time
     logger.info("=" * 80)
     logger.info(f"Region fetch complete! Processed {len(results)} stocks in {total_time/60:.1f} minutes")
+    logger.info(f"Region sources: {processed_counter['cache']} from cached profiles, "
+                f"{processed_counter['api']} from /profile")
+    logger.info(fmp_client.rate_limiter.summary())
+    logger.info(fmp_client.concurrency.summary())
     logger.info("=" * 80)
     
-    # Create DataFrame
-    if results:
-        # Define column order for better readability
-        column_order = [
-            'Symbol',
-            'Company Name',
-            'Current Price',
-            'DCF Price',
-            'Discount %',
-            'Premium %',
-            'Valuation Status',
-            'Sector',
-            'Industry',
-            'Country',
-            'City',
-            'State',
-            'Exchange',
-            'Currency',
-            'Address',
-            'Phone',
-            'Website',
-            'Region_Fetched',
-            'Timestamp',
-            'Region_Fetch_Timestamp'
-        ]
-        
-        df = pd.DataFrame(results)
-        
-        # Reorder columns (only include columns that exist)
-        existing_columns = [col for col in column_order if col in df.columns]
-        other_columns = [col for col in df.columns if col not in column_order]
-        df = df[existing_columns + other_columns]
-        
-        # Sort by discount percentage (highest discount first)
-        if 'Discount %' in df.columns:
-            df = df.sort_values('Discount %', ascending=False)
-        
-        # Save to Excel
+    if not results:
+        return None
+    
+    # Define column order for better readability
+    column_order = [
+        'Symbol',
+        'Company Name',
+        'Current Price',
+        'DCF Price',
+        'Discount %',
+        'Premium %',
+        'Valuation Status',
+        'Sector',
+        'Industry',
+        'Country',
+        'City',
+        'State',
+        'Exchange',
+        'Currency',
+        'Address',
+        'Phone',
+        'Website',
+        'Region_Fetched',
+        'Timestamp',
+        'Region_Fetch_Timestamp'
+    ]
+    
+    df = pd.DataFrame(results)
+    
+    # Reorder columns (only include columns that exist)
+    existing_columns = [col for col in column_order if col in df.columns]
+    other_columns = [col for col in df.columns if col not in column_order]
+    df = df[existing_columns + other_columns]
+    
+    # Sort by discount percentage (highest discount first)
+    if 'Discount %' in df.columns:
+        df = df.sort_values('Discount %', ascending=False)
+    
+    return df
+
+def fetch_regions_for_stocks():
+    """
+    Main function to fetch region information for all undervalued stocks
+    and save them to the OUTPUT_FILE stage file.
+    """
+    logger.info("=" * 80)
+    logger.info("Starting region data fetch for undervalued stocks")
+    logger.info("=" * 80)
+    
+    # Load undervalued stocks from cache
+    stocks = load_undervalued_stocks()
+    if not stocks:
+        logger.error("No stocks to process. Exiting.")
+        return None
+    
+    df = fetch_regions(stocks)
+    
+    if df is not None:
         try:
-            df.to_excel(OUTPUT_EXCEL_FILE, index=False, engine='openpyxl')
-            logger.info(f"Results saved to {OUTPUT_EXCEL_FILE}")
-            print(f"\nResults saved to {OUTPUT_EXCEL_FILE}")
+            output_file = stage_io.write_stage(df, OUTPUT_FILE)
+            logger.info(f"Results saved to {output_file}")
+            print(f"\nResults saved to {output_file}")
             
             # Print summary statistics
             logger.info("\n" + "=" * 80)
@@ -355,13 +415,13 @@ def fetch_regions_for_stocks():
             if 'Region_Fetched' in df.columns:
                 fetched_count = df['Region_Fetched'].sum()
                 print(f"Region data fetched: {fetched_count}/{len(df)} ({fetched_count/len(df)*100:.1f}%)")
-            print(f"Output file: {OUTPUT_EXCEL_FILE}")
+            print(f"Output file: {output_file}")
             print("=" * 80)
             
             return df
         except Exception as e:
-            logger.error(f"Error saving Excel file: {e}")
-            print(f"\nError saving Excel file: {e}")
+            logger.error(f"Error saving results: {e}")
+            print(f"\nError saving results: {e}")
             return None
     else:
         logger.warning("No results to save.")
@@ -370,49 +430,64 @@ def fetch_regions_for_stocks():
 
 def validate_api_key():
     """
-    Test the API key by making a simple request.
-    Returns True if valid, False otherwise.
+    Test every configured API key by making a simple request with each.
+    Returns True if all are valid, False otherwise.
     """
-    logger.info("Validating API key...")
+    logger.info(f"Validating {len(API_KEYS)} API key(s)...")
     test_url = f"{BASE_URL}/profile/AAPL"
+    # A list, not a generator: report every bad key, not just the first
+    return all([validate_one_key(key, test_url) for key in fmp_client.api_keys()])
+
+def validate_one_key(key, test_url):
+    """
+    Test one pooled API key (an ApiKey from fmp_client.api_keys()).
+    Returns True if valid, False otherwise.
+    """
     test_params = {'apikey': API_KEY}
     
     try:
-        response = requests.get(test_url, params=test_params, timeout=10)
+        response = fmp_client.get(test_url, params=test_params, timeout=10, api_key=key)
         
         if response.status_code == 200:
-            logger.info("API key is valid!")
+            logger.info(f"API key {key.label} is valid! (quota {key.quota} calls/min)")
             return True
         elif response.status_code in [401, 403]:
             try:
                 error_data = response.json()
                 error_msg = error_data.get('Error Message', 'Unknown error')
-                logger.error(f"API key validation failed: {error_msg}")
-                print(f"\n❌ API Key Validation Failed!")
+                logger.error(f"API key {key.label} validation failed: {error_msg}")
+                print(f"\n❌ API Key Validation Failed for {key.label}!")
                 print(f"Error: {error_msg}")
             except:
-                logger.error(f"API key validation failed with status {response.status_code}")
-                print(f"\n❌ API Key Validation Failed! Status code: {response.status_code}")
+                logger.error(f"API key {key.label} validation failed with status {response.status_code}")
+                print(f"\n❌ API Key Validation Failed for {key.label}! Status code: {response.status_code}")
             return False
+        elif response.status_code == 429:
+            logger.warning(f"API key {key.label} is rate-limited at startup: its {key.quota} calls/min "
+                           f"quota may be shared with another run")
+            return True
         else:
-            logger.warning(f"API key validation returned status {response.status_code}")
+            logger.warning(f"API key {key.label} validation returned status {response.status_code}")
             return True
     except Exception as e:
-        logger.error(f"Error validating API key: {e}")
-        print(f"\n⚠️  Could not validate API key: {e}")
+        logger.error(f"Error validating API key {key.label}: {e}")
+        print(f"\n⚠️  Could not validate API key {key.label}: {e}")
         print("Proceeding anyway, but API calls may fail...")
         return True
 
 if __name__ == "__main__":
-    if not API_KEY:
-        logger.error("FMP_API_KEY not found in .env file")
-        print("Error: FMP_API_KEY not found in .env file")
+    logger = setup_logging()
+    short_keys = [key for key in API_KEYS if len(key) < 10]
+    if not API_KEYS:
+        logger.error("FMP_API_KEY (or FMP_API_KEYS) not found in .env file")
+        print("Error: FMP_API_KEY (or FMP_API_KEYS) not found in .env file")
         print("Please create a .env file with: FMP_API_KEY=your_api_key_here")
-    elif len(API_KEY) < 10:
-        logger.error(f"API key appears to be invalid (too short: {len(API_KEY)} chars)")
+    elif short_keys:
+        logger.error(f"API key appears to be invalid (too short: {len(short_keys[0])} chars)")
         print(f"Error: API key appears to be invalid. Please check your .env file.")
     else:
-        logger.info(f"API Key loaded (length: {len(API_KEY)} chars, starts with: {API_KEY[:5]}...)")
+        for key in API_KEYS:
+            logger.info(f"API Key loaded (length: {len(key)} chars, starts with: {key[:5]}...)")
         
         # Validate API key before proceeding
         if validate_api_key():
@@ -4,46 +4,109 @@ Also fetches sector, industry, and sub-industry information.
 """
 
 import os
+import sys
+import argparse
 import requests
 import pandas as pd
 from dotenv import load_dotenv
 import time
 import logging
 import json
+import contextvars
+import queue
+import signal
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock, Semaphore
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
+from threading import Event, Lock, RLock, Thread
+
+import fmp_client
+import profile_cache
+from cache_journal import CacheJournal
+import stock_filters
+from bulk_stream import iter_bulk_records
+from bulk_prefetch import BulkPrefetcher
+from quote_batcher import QuoteBatcher
+import vector_valuation
+import run_manifest
+from run_manifest import RunManifest
+from key_pool import configured_key_values
 
 # Load environment variables
 load_dotenv()
 
 # FMP API Configuration
-API_KEY = os.getenv('FMP_API_KEY')
-if API_KEY:
-    API_KEY = API_KEY.strip()  # Remove any whitespace
+API_KEYS = configured_key_values()  # FMP_API_KEYS, or the single FMP_API_KEY (see key_pool.py)
+API_KEY = API_KEYS[0] if API_KEYS else None  # Placeholder apikey; fmp_client sends the key the pool picks
 # Using v3 API endpoint (stable requires paid subscription for many endpoints)
-BASE_URL = 'https://financialmodelingprep.com/api/v3'
+BASE_URL = os.getenv('FMP_BASE_URL', 'https://financialmodelingprep.com/api/v3')
 
-# Rate limiting configuration
-MAX_RETRIES = 1  # Only 1 try per request
-INITIAL_DELAY = 0.2  # Initial delay between requests (seconds)
-MAX_DELAY = 60  # Maximum delay between retries (seconds)
-RATE_LIMIT_DELAY = 1.0  # Delay after rate limit hit (seconds)
-CONSECUTIVE_ERROR_PAUSE = 1  # Pause time after consecutive errors (seconds)
+# Rate limiting configuration (calls/minute is set by FMP_CALLS_PER_MINUTE, see fmp_client)
+MAX_RETRIES = 1  # Only 1 try per request (429s are retried by fmp_client after Retry-After)
 
 # Multi-threading configuration
-MAX_WORKERS = 20  # Number of concurrent threads
-API_SEMAPHORE = Semaphore(MAX_WORKERS)  # Limit concurrent API requests
+MAX_WORKERS = fmp_client.CONCURRENCY_MAX  # Worker threads; requests in flight follow fmp_client.concurrency (AIMD)
+WORK_QUEUE_SIZE = MAX_WORKERS * 4  # Stocks queued ahead of the workers (the feeder blocks when full)
+READY_CHUNK_SIZE = 1000  # Stocks taken from the bulk prefetcher at a time (prices are prefetched per chunk)
+VECTORIZE = True  # Classify symbols fully covered by bulk data in one pandas pass (--no-vectorize turns it off)
+fmp_client.configure(pool_size=MAX_WORKERS)  # One pooled connection per worker
+
+# Progress reports (summary + detailed stock data) while the work queue drains
+REPORT_EVERY = 2000  # Log a report after this many stocks...
+REPORT_INTERVAL = 300  # ...or after this many seconds, whichever comes first
+
+# Quote batching configuration
+QUOTE_BATCH_SIZE = int(os.getenv('FMP_QUOTE_BATCH_SIZE', '100'))  # Symbols per /quote request
+
+# Bulk endpoint parsing: stream records instead of response.json() (FMP_BULK_STREAMING=0 to disable)
+BULK_STREAMING = os.getenv('FMP_BULK_STREAMING', '1') != '0'
+STOCK_LIST_FIELDS = ['symbol', 'name', 'exchange', 'exchangeShortName', 'type']
+DCF_BULK_FIELDS = ['symbol', 'dcf']
+PROFILE_BULK_FIELDS = ['symbol', 'sector', 'industry', 'companyName', 'currency', 'country', 'mktCap', 'exchangeShortName',
+                       'city', 'state', 'address', 'phone', 'website']
+# Cached profile fields besides sector/industry/companyName. The region fields are kept so that
+# fetch_stock_regions.py can read them from the cache instead of calling /profile again.
+PROFILE_CACHE_FIELDS = ['currency', 'country', 'mktCap', 'exchangeShortName', 'city', 'state', 'address', 'phone', 'website']
+
+# Bulk profile download configuration
+PROFILE_BULK_PART_SIZE = 1000  # Profiles per profile-bulk part (a shorter part is the last one)
+PROFILE_BULK_WORKERS = 4  # Parts downloaded concurrently (all calls share the rate limiter)
+PROFILE_BULK_PART_RETRIES = 2  # Retries for a failed part before giving up on it
+PROFILE_BULK_PARTS = int(os.getenv('FMP_PROFILE_BULK_PARTS', '0'))  # Known part count (0 = probe until a short part)
 
 # Cache configuration
-CACHE_FILE = 'stock_cache.json'
+CACHE_FILE = 'stock_cache.json'  # Snapshot; updates go to stock_cache.json.journal between compactions
 UNDERVALUED_CACHE_FILE = 'undervalued_stocks_cache.json'
+VALUATIONS_FILE = 'stock_valuations.csv'
+CHANGES_FILE = 'stock_valuations_changes.csv'  # Written by --incremental
+CACHE_BACKEND = os.getenv('FMP_CACHE_BACKEND', 'json')  # 'json' (files above) or 'sqlite' (see sqlite_cache.py)
+
+# Cache freshness (seconds per field, only enforced with --refresh)
+CACHE_TTLS = {
+    'price': int(os.getenv('FMP_PRICE_TTL', str(15 * 60))),  # 15 minutes
+    'dcf': int(os.getenv('FMP_DCF_TTL', str(24 * 3600))),  # 1 day
+    'profile': profile_cache.PROFILE_TTL,  # 2 weeks (FMP_PROFILE_TTL)
+}
+REFRESH_EXPIRED = False  # Set by --refresh: treat expired cached fields as missing
+
+# Negative cache: symbols whose last lookup found no DCF and/or price
+NEGATIVE_CACHE_TTL = int(os.getenv('FMP_NEGATIVE_TTL', str(3 * 24 * 3600)))  # 3 days before the first re-probe (0 disables)
+NEGATIVE_MAX_BACKOFF = 8  # Each empty re-probe doubles the TTL, up to this multiple
+NEGATIVE_REASONS = ('DATA_UNAVAILABLE', 'NO_DCF_DATA', 'NO_PRICE_DATA')
 
 # Setup logging
+log_file = None  # Set by setup_logging
+
 def setup_logging():
     """
     Configure logging to both file and console.
+    Not done at import: the first call creates the timestamped log file,
+    later calls return the same logger.
     """
+    global log_file
+    if log_file is not None:
+        return logging.getLogger(__name__)
+    
     # Create logs directory if it doesn't exist
     log_dir = 'logs'
     if not os.path.exists(log_dir):
@@ -72,119 +135,377 @@ def setup_logging():
     logger.info(f"Logging initialized. Log file: {log_file}")
     return logger
 
-# Initialize logger
-logger = setup_logging()
+# Handlers are attached by setup_logging (main script run or find_undervalued_stocks)
+logger = logging.getLogger(__name__)
 
-# Stock data cache
-stock_cache = {}
+# Stock data cache, loaded on first use (see ensure_caches_loaded)
+stock_cache = {'_undervalued_stocks': [], '_fair_stocks': {}}
+cache_journal = CacheJournal(CACHE_FILE)
+cache_lock = RLock()  # Guards stock_cache mutations so compaction never sees a half-updated dict
+cache_store = None  # SQLiteCacheStore when CACHE_BACKEND == 'sqlite'
+caches_loaded = False
 
 def load_cache():
     """
-    Load stock cache from file.
+    Load stock cache from the snapshot file and replay its journal.
     Cache structure: {symbol: {'price': float, 'dcf': float, 'profile': dict, 'timestamp': str}}
-    Also includes '_undervalued_stocks' and '_fair_stocks' lists
+    Also includes '_undervalued_stocks' and '_fair_stocks' lists. '_fair_stocks' is a list
+    on disk and a symbol-keyed dict in memory (see results_by_symbol).
+    With the sqlite backend nothing is loaded up front; lookups go to the database.
     """
-    global stock_cache
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, 'r') as f:
-                stock_cache = json.load(f)
-            # Initialize lists if they don't exist
-            if '_undervalued_stocks' not in stock_cache:
-                stock_cache['_undervalued_stocks'] = []
-            if '_fair_stocks' not in stock_cache:
-                stock_cache['_fair_stocks'] = []
-            # Count actual stocks (excluding special keys)
-            stock_count = len([k for k in stock_cache.keys() if not k.startswith('_')])
-            logger.info(f"Loaded cache with {stock_count} stocks, {len(stock_cache.get('_undervalued_stocks', []))} undervalued, {len(stock_cache.get('_fair_stocks', []))} fair")
-        except Exception as e:
-            logger.warning(f"Error loading cache: {e}. Starting with empty cache.")
-            stock_cache = {'_undervalued_stocks': [], '_fair_stocks': []}
-    else:
-        stock_cache = {'_undervalued_stocks': [], '_fair_stocks': []}
+    global stock_cache, cache_store
+    if CACHE_BACKEND == 'sqlite':
+        from sqlite_cache import SQLiteCacheStore, CACHE_DB_FILE
+        cache_store = SQLiteCacheStore(CACHE_DB_FILE)
+        stock_cache = {'_undervalued_stocks': [], '_fair_stocks': {}}
+        logger.info(f"Using SQLite cache backend: {CACHE_DB_FILE}")
+        return
+    try:
+        stock_cache, replayed = cache_journal.load()
+        # Initialize lists if they don't exist
+        if '_undervalued_stocks' not in stock_cache:
+            stock_cache['_undervalued_stocks'] = []
+        stock_cache['_fair_stocks'] = results_by_symbol(stock_cache.get('_fair_stocks', []))
+        # Count actual stocks (excluding special keys)
+        stock_count = len([k for k in stock_cache.keys() if not k.startswith('_')])
+        if stock_count or replayed:
+            logger.info(f"Loaded cache with {stock_count} stocks, {len(stock_cache.get('_undervalued_stocks', []))} undervalued, {len(stock_cache.get('_fair_stocks', []))} fair ({replayed} journal records replayed)")
+    except Exception as e:
+        logger.warning(f"Error loading cache: {e}. Starting with empty cache.")
+        stock_cache = {'_undervalued_stocks': [], '_fair_stocks': {}}
 
-def save_cache():
+def save_cache(compact=False):
     """
-    Save stock cache to file.
+    Checkpoint the stock cache.
+    Updates are already in the journal, so this only flushes it to disk,
+    unless the journal has outgrown the snapshot (or compact=True), in which
+    case the snapshot is rewritten and the journal truncated.
     """
+    ensure_caches_loaded()
     try:
-        with open(CACHE_FILE, 'w') as f:
-            json.dump(stock_cache, f, indent=2)
-        stock_count = len([k for k in stock_cache.keys() if not k.startswith('_')])
-        logger.debug(f"Saved cache with {stock_count} stocks, {len(stock_cache.get('_undervalued_stocks', []))} undervalued, {len(stock_cache.get('_fair_stocks', []))} fair")
+        if cache_store is not None:
+            cache_store.flush()
+            return
+        with cache_lock:
+            if compact or cache_journal.needs_compaction():
+                # Keep the on-disk format: '_fair_stocks' is written as a list
+                cache_journal.compact(dict(stock_cache, _fair_stocks=list(stock_cache['_fair_stocks'].values())))
+                stock_count = len([k for k in stock_cache.keys() if not k.startswith('_')])
+                logger.debug(f"Compacted cache with {stock_count} stocks, {len(stock_cache.get('_undervalued_stocks', []))} undervalued, {len(stock_cache.get('_fair_stocks', []))} fair")
+            else:
+                cache_journal.flush()
     except Exception as e:
         logger.error(f"Error saving cache: {e}")
 
+def results_by_symbol(stocks):
+    """
+    Index a list of result rows by 'Symbol', keeping file order.
+    Dicts preserve insertion order, so list(index.values()) gives back the
+    same list format for saving, and upserts are O(1) instead of a scan.
+    """
+    return {stock.get('Symbol'): stock for stock in stocks}
+
+def is_field_expired(entry, field):
+    """
+    True if a cached field is older than its TTL.
+    Uses the per-field timestamp written by cache_stock when the field was
+    fetched. A field without one (caches written before per-field
+    timestamps) counts as expired: the entry's 'timestamp' is refreshed by
+    any write, so it says nothing about this field's age.
+    """
+    stamp = entry.get(f'{field}_timestamp')
+    if not stamp:
+        return True
+    try:
+        age = (datetime.now() - datetime.fromisoformat(stamp)).total_seconds()
+    except (TypeError, ValueError):
+        return True
+    return age > CACHE_TTLS[field]
+
+def fresh_field(entry, field):
+    """
+    Return entry[field], or None if it is missing or (with --refresh) expired.
+    """
+    if not entry or entry.get(field) is None:
+        return None
+    if REFRESH_EXPIRED and is_field_expired(entry, field):
+        return None
+    return entry[field]
+
+expired_fields = {'price': 0, 'dcf': 0, 'profile': 0}  # Expired cache hits refetched this run
+expired_lock = Lock()
+
+def get_cached_field(symbol, field):
+    """
+    Return a cached field ('price', 'dcf' or 'profile') or None if it is
+    missing, or expired while running with --refresh.
+    """
+    cached = get_cached_stock(symbol)
+    value = fresh_field(cached, field)
+    if value is None and cached and cached.get(field) is not None:
+        with expired_lock:
+            expired_fields[field] += 1
+    return value
+
 def get_cached_stock(symbol):
     """
     Get cached stock data if available.
     Returns dict with 'price', 'dcf', and 'profile' or None if not cached.
     """
+    ensure_caches_loaded()
+    if cache_store is not None:
+        return cache_store.get(symbol)
     if symbol in stock_cache:
         return stock_cache[symbol]
     return None
 
 def cache_stock(symbol, price=None, dcf=None, profile=None):
     """
-    Cache stock data.
+    Cache stock data and append the updated entry to the cache journal.
     """
-    if symbol not in stock_cache:
-        stock_cache[symbol] = {}
-    
-    if price is not None:
-        stock_cache[symbol]['price'] = price
-    if dcf is not None:
-        stock_cache[symbol]['dcf'] = dcf
-    if profile is not None:
-        stock_cache[symbol]['profile'] = profile
+    ensure_caches_loaded()
+    if cache_store is not None:
+        cache_store.put(symbol, price=price, dcf=dcf, profile=profile)
+        return
+    now = datetime.now().isoformat()
+    with cache_lock:
+        if symbol not in stock_cache:
+            stock_cache[symbol] = {}
+        
+        # Each field keeps its own timestamp so TTLs expire them independently
+        if price is not None:
+            stock_cache[symbol]['price'] = price
+            stock_cache[symbol]['price_timestamp'] = now
+        if dcf is not None:
+            stock_cache[symbol]['dcf'] = dcf
+            stock_cache[symbol]['dcf_timestamp'] = now
+        if profile is not None:
+            stock_cache[symbol]['profile'] = profile
+            stock_cache[symbol]['profile_timestamp'] = now
+        
+        stock_cache[symbol]['timestamp'] = now
+        cache_journal.set(symbol, stock_cache[symbol])
+
+def cache_negative(symbol, reason):
+    """
+    Remember that symbol had no usable data (reason is one of NEGATIVE_REASONS),
+    or clear the entry with reason=None once it has data again.
+    Consecutive empty results are counted in 'probes' to back off re-probing.
+    """
+    cached = get_cached_stock(symbol) or {}
+    previous = cached.get('negative')
+    if reason is None and previous is None:
+        return
+    negative = None
+    if reason is not None:
+        probes = previous.get('probes', 0) + 1 if previous else 1
+        negative = {'reason': reason, 'timestamp': datetime.now().isoformat(), 'probes': probes}
     
-    stock_cache[symbol]['timestamp'] = datetime.now().isoformat()
+    if cache_store is not None:
+        cache_store.put_negative(symbol, negative)
+        return
+    with cache_lock:
+        entry = stock_cache.setdefault(symbol, {})
+        if negative is None:
+            entry.pop('negative', None)
+        else:
+            entry['negative'] = negative
+        cache_journal.set(symbol, entry)
 
-# Undervalued stocks cache (separate file)
-undervalued_stocks_cache = []
+def get_negative_reason(symbol, dcf_bulk=None):
+    """
+    Return the cached negative reason for symbol if it is still in force, else None.
+    An entry expires after NEGATIVE_CACHE_TTL, doubled for each consecutive empty
+    re-probe (up to NEGATIVE_MAX_BACKOFF). A DCF value in today's bulk data
+    overrides a cached missing DCF.
+    """
+    if NEGATIVE_CACHE_TTL <= 0:
+        return None
+    cached = get_cached_stock(symbol)
+    negative = cached.get('negative') if cached else None
+    if not negative:
+        return None
+    if dcf_bulk and dcf_bulk.get(symbol) is not None and negative['reason'] != 'NO_PRICE_DATA':
+        return None
+    ttl = NEGATIVE_CACHE_TTL * min(2 ** (negative.get('probes', 1) - 1), NEGATIVE_MAX_BACKOFF)
+    try:
+        age = (datetime.now() - datetime.fromisoformat(negative['timestamp'])).total_seconds()
+    except (KeyError, TypeError, ValueError):
+        return None
+    return negative['reason'] if age <= ttl else None
+
+def negative_cached_detail(symbol, company_name, reason, dcf_bulk):
+    """
+    stock_detail for a symbol skipped because of the negative cache.
+    'calls_avoided' estimates the lookups a probe would have cost: the
+    per-symbol DCF call (unless bulk DCF covers it) and the quote.
+    """
+    logger.debug(f"Skipping {symbol}: cached {reason}")
+    has_bulk_dcf = bool(dcf_bulk) and dcf_bulk.get(symbol) is not None
+    return {
+        'symbol': symbol,
+        'company_name': company_name,
+        'price': None,
+        'dcf': None,
+        'status': reason,
+        'has_data': False,
+        'negative_cached': True,
+        'calls_avoided': (0 if has_bulk_dcf else 1) + 1
+    }
+
+def update_negative_cache(stock_detail):
+    """
+    Record or clear the negative cache entry after a symbol was looked up.
+    Empty results caused by failed requests (timeouts, exhausted 429 retries)
+    are not cached.
+    """
+    if NEGATIVE_CACHE_TTL <= 0:
+        return
+    if lookups_failed(stock_detail['symbol']):
+        return
+    if stock_detail['has_data']:
+        cache_negative(stock_detail['symbol'], None)
+    elif stock_detail['status'] in NEGATIVE_REASONS:
+        cache_negative(stock_detail['symbol'], stock_detail['status'])
+
+def cache_fair_stock(stock_data):
+    """
+    Add or replace a stock in the cached '_fair_stocks' list and journal it.
+    """
+    ensure_caches_loaded()
+    if cache_store is not None:
+        cache_store.put_valuation(stock_data)
+        return
+    with cache_lock:
+        stock_cache['_fair_stocks'][stock_data.get('Symbol')] = stock_data
+        cache_journal.upsert('_fair_stocks', stock_data)
+
+# Undervalued stocks cache (separate file); symbol -> stock_data in memory, a list on disk
+undervalued_stocks_cache = {}
 
 def load_undervalued_cache():
     """
     Load undervalued stocks cache from separate file.
+    With the sqlite backend the undervalued stocks live in the database instead.
+    Fills the dict in place, so references handed out before loading stay valid.
     """
-    global undervalued_stocks_cache
-    if os.path.exists(UNDERVALUED_CACHE_FILE):
+    undervalued_stocks_cache.clear()
+    if cache_store is None and os.path.exists(UNDERVALUED_CACHE_FILE):
         try:
             with open(UNDERVALUED_CACHE_FILE, 'r') as f:
-                undervalued_stocks_cache = json.load(f)
+                undervalued_stocks_cache.update(results_by_symbol(json.load(f)))
             logger.info(f"Loaded undervalued stocks cache with {len(undervalued_stocks_cache)} stocks")
         except Exception as e:
             logger.warning(f"Error loading undervalued cache: {e}. Starting with empty cache.")
-            undervalued_stocks_cache = []
-    else:
-        undervalued_stocks_cache = []
+            undervalued_stocks_cache.clear()
 
 def save_undervalued_cache():
     """
     Save undervalued stocks cache to separate file.
     """
+    ensure_caches_loaded()
     try:
+        if cache_store is not None:
+            cache_store.flush()
+            return
         with open(UNDERVALUED_CACHE_FILE, 'w') as f:
-            json.dump(undervalued_stocks_cache, f, indent=2)
+            json.dump(list(undervalued_stocks_cache.values()), f, indent=2)
         logger.debug(f"Saved undervalued stocks cache with {len(undervalued_stocks_cache)} stocks")
     except Exception as e:
         logger.error(f"Error saving undervalued cache: {e}")
 
-# Load cache on startup
-load_cache()
-load_undervalued_cache()
+def cache_undervalued_stock(stock_data, undervalued_stocks_cache):
+    """
+    Add or replace a stock in the undervalued stocks cache (avoid duplicates).
+    Callers hold stats_lock.
+    """
+    ensure_caches_loaded()
+    if cache_store is not None:
+        cache_store.put_valuation(stock_data)
+        return
+    undervalued_stocks_cache[stock_data.get('Symbol')] = stock_data
+
+def cache_counts():
+    """
+    Return (cached stocks, undervalued, fair) counts for logging.
+    """
+    ensure_caches_loaded()
+    if cache_store is not None:
+        return cache_store.counts()
+    with cache_lock:
+        # profile-bulk parts may still be adding symbols from another thread
+        stock_count = len([k for k in stock_cache.keys() if not k.startswith('_')])
+        fair_count = len(stock_cache.get('_fair_stocks', []))
+    return stock_count, len(undervalued_stocks_cache), fair_count
 
-def make_api_request(url, params=None, max_retries=MAX_RETRIES):
+def cached_valuation_inputs():
+    """
+    Return {symbol: (price, dcf)} for every cached stock, i.e. the inputs the
+    last run classified with (--incremental diffs today's quotes against it).
+    """
+    ensure_caches_loaded()
+    if cache_store is not None:
+        return cache_store.valuation_inputs()
+    with cache_lock:
+        return {symbol: (entry.get('price'), entry.get('dcf')) for symbol, entry in stock_cache.items()
+                if not symbol.startswith('_')}
+
+def ensure_caches_loaded():
+    """
+    Load the stock cache and the undervalued stocks cache on first use rather
+    than at import, so importing this module from other tools stays cheap.
+    Every cache accessor calls this first, so nothing is ever saved over
+    caches that were not loaded.
+    """
+    global caches_loaded
+    if caches_loaded:
+        return
+    with cache_lock:
+        if not caches_loaded:
+            load_cache()
+            load_undervalued_cache()
+            caches_loaded = True
+
+# Set per symbol by process_stock so a failed request is not mistaken for missing data
+lookup_status = contextvars.ContextVar('lookup_status', default=None)
+failed_quote_symbols = set()  # Symbols whose batched /quote request failed
+failed_quote_lock = Lock()
+
+def begin_symbol_lookups():
+    """Start tracking request failures for the symbol being processed in this thread/task."""
+    lookup_status.set({'failed': False})
+
+def mark_lookup_failed():
+    status = lookup_status.get()
+    if status is not None:
+        status['failed'] = True
+
+def lookups_failed(symbol):
+    """True if any request for symbol failed since begin_symbol_lookups()."""
+    status = lookup_status.get()
+    with failed_quote_lock:
+        quote_failed = symbol in failed_quote_symbols
+        failed_quote_symbols.discard(symbol)
+    return quote_failed or bool(status and status['failed'])
+
+def make_api_request(url, params=None, max_retries=MAX_RETRIES, stream=False):
     """
     Make an API request with only 1 try (no retries).
     Returns response object or None if failed.
+    stream=True leaves the body unread for bulk_stream.iter_bulk_records.
     """
+    response = _make_api_request(url, params, max_retries, stream)
+    if response is None:
+        mark_lookup_failed()
+    return response
+
+def _make_api_request(url, params=None, max_retries=MAX_RETRIES, stream=False):
     if params is None:
         params = {}
     params['apikey'] = API_KEY
     
     try:
-        response = requests.get(url, params=params, timeout=30)
+        response = fmp_client.get(url, params=params, timeout=30, stream=stream)
         
         # Check for API key errors in response
         if response.status_code == 401 or response.status_code == 403:
@@ -192,14 +513,15 @@ def make_api_request(url, params=None, max_retries=MAX_RETRIES):
                 error_data = response.json()
                 if 'Error Message' in error_data:
                     logger.error(f"API Key Error: {error_data['Error Message']}")
-                    logger.error(f"Please check your API key in .env file. Current key (first 10 chars): {API_KEY[:10] if API_KEY and len(API_KEY) > 10 else 'INVALID'}")
+                    logger.error(f"Please check your API key in .env file. Failing key: {response.api_key.label}")
             except:
                 logger.error(f"Authentication failed. Status: {response.status_code}")
             return None
         
-        # Handle rate limiting (HTTP 429) - just log and return None
+        # Handle rate limiting (HTTP 429) - fmp_client already waited and retried
         if response.status_code == 429:
-            logger.warning(f"Rate limit hit for URL: {url}")
+            logger.warning(f"Rate limit hit for URL: {url} (retries exhausted)")
+            response.close()
             return None
         
         # Handle other HTTP errors - log response body for debugging
@@ -230,6 +552,26 @@ def make_api_request(url, params=None, max_retries=MAX_RETRIES):
         logger.warning(f"Request error: {e} for URL: {url}")
         return None
 
+def read_bulk_records(url, fields, params=None):
+    """
+    Fetch a bulk endpoint and return an iterable of records with only the given fields.
+    Streams and parses the body incrementally when BULK_STREAMING is on.
+    Returns None if the request failed or (without streaming) the body is
+    malformed; a streamed body raises ValueError as it is read.
+    """
+    response = make_api_request(url, params, stream=BULK_STREAMING)
+    if not response:
+        return None
+    if BULK_STREAMING:
+        return iter_bulk_records(response, fields)
+    try:
+        data = response.json()
+    except (ValueError, requests.exceptions.RequestException) as e:
+        # Truncated or non-JSON (e.g. an HTML error page) body: callers fall back as for a failed request
+        logger.error(f"Error parsing bulk response from {url}: {e}")
+        return None
+    return data if isinstance(data, list) else []
+
 def get_all_stocks():
     """
     Fetch all available stocks from FMP API.
@@ -240,16 +582,16 @@ def get_all_stocks():
     # Try v3 API stock list endpoint
     url = f"{BASE_URL}/stock/list"
     
-    response = make_api_request(url)
-    if response:
+    records = read_bulk_records(url, STOCK_LIST_FIELDS)
+    if records is not None:
         try:
-            stocks = response.json()
+            stocks = list(records)
             if stocks and len(stocks) > 0:
                 logger.info(f"Successfully fetched {len(stocks)} stocks")
                 return stocks
             else:
                 logger.warning("Received empty stock list from API")
-        except ValueError as e:
+        except (ValueError, requests.exceptions.RequestException) as e:
             logger.error(f"Error parsing response: {e}")
     
     # If stock-list fails, use popular stocks as fallback
@@ -276,21 +618,26 @@ def get_dcf_bulk():
     logger.info("Fetching DCF values using bulk API...")
     url = f"{BASE_URL}/dcf-bulk"
     
-    response = make_api_request(url)
-    if response:
+    records = read_bulk_records(url, DCF_BULK_FIELDS)
+    if records is not None:
         try:
-            data = response.json()
             dcf_dict = {}
-            for item in data:
+            for item in records:
                 symbol = item.get('symbol', '')
                 dcf_value = item.get('dcf', None)
+                if isinstance(dcf_value, str):
+                    # CSV bulk payloads carry numbers as text
+                    try:
+                        dcf_value = float(dcf_value)
+                    except ValueError:
+                        dcf_value = None
                 if symbol and dcf_value:
                     dcf_dict[symbol] = dcf_value
                     # Cache the DCF value
                     cache_stock(symbol, dcf=dcf_value)
             logger.info(f"Successfully fetched DCF values for {len(dcf_dict)} stocks and cached them")
             return dcf_dict
-        except ValueError as e:
+        except (ValueError, requests.exceptions.RequestException) as e:
             logger.error(f"Error parsing DCF bulk response: {e}")
             return {}
     logger.warning("Failed to fetch DCF bulk data, will use individual API calls")
@@ -305,12 +652,11 @@ def get_dcf_value(symbol):
     Returns tuple: (dcf_value, stock_price_from_dcf) or (None, None)
     """
     # Check cache first
-    cached = get_cached_stock(symbol)
-    if cached and 'dcf' in cached and cached['dcf'] is not None:
-        logger.debug(f"Using cached DCF for {symbol}: {cached['dcf']}")
-        # Also return cached price if available
-        cached_price = cached.get('price', None)
-        return cached['dcf'], cached_price
+    cached_dcf = get_cached_field(symbol, 'dcf')
+    if cached_dcf is not None:
+        logger.debug(f"Using cached DCF for {symbol}: {cached_dcf}")
+        # Also return cached price if available (get_stock_price refetches it otherwise)
+        return cached_dcf, fresh_field(get_cached_stock(symbol), 'price')
     
     # Fetch from API - using correct endpoint format per FMP documentation
     # Reference: https://site.financialmodelingprep.com/developer/docs#discounted-cash-flow
@@ -319,106 +665,232 @@ def get_dcf_value(symbol):
     response = make_api_request(url)
     if response:
         try:
-            data = response.json()
-            if data and len(data) > 0 and isinstance(data[0], dict):
-                dcf_value = data[0].get('dcf', None)
-                # Extract Stock Price from DCF response (field name is "Stock Price")
-                stock_price_from_dcf = data[0].get('Stock Price', None)
-                dcf_date = data[0].get('date', None)
-                
-                if dcf_value and dcf_value > 0:
-                    # Cache both DCF and price if available
-                    if stock_price_from_dcf and stock_price_from_dcf > 0:
-                        cache_stock(symbol, dcf=dcf_value, price=stock_price_from_dcf)
-                        logger.debug(f"DCF value for {symbol}: {dcf_value}, Stock Price from DCF: {stock_price_from_dcf}, Date: {dcf_date}")
-                    else:
-                        cache_stock(symbol, dcf=dcf_value)
-                        logger.debug(f"DCF value for {symbol}: {dcf_value}, Date: {dcf_date}")
-                    return dcf_value, stock_price_from_dcf
-            else:
-                logger.debug(f"No DCF data available for {symbol} (empty response)")
-        except (ValueError, IndexError, TypeError) as e:
+            return parse_dcf_response(symbol, response.json())
+        except ValueError as e:
             logger.debug(f"Error parsing DCF response for {symbol}: {e}")
     return None, None
 
+def parse_dcf_response(symbol, data):
+    """
+    Extract (dcf_value, stock_price_from_dcf) from a discounted-cash-flow response
+    and cache them. Shared by the threaded and async engines.
+    Returns (None, None) if the response has no usable DCF.
+    """
+    try:
+        if data and len(data) > 0 and isinstance(data[0], dict):
+            dcf_value = data[0].get('dcf', None)
+            # Extract Stock Price from DCF response (field name is "Stock Price")
+            stock_price_from_dcf = data[0].get('Stock Price', None)
+            dcf_date = data[0].get('date', None)
+            
+            if dcf_value and dcf_value > 0:
+                # Cache both DCF and price if available
+                if stock_price_from_dcf and stock_price_from_dcf > 0:
+                    cache_stock(symbol, dcf=dcf_value, price=stock_price_from_dcf)
+                    logger.debug(f"DCF value for {symbol}: {dcf_value}, Stock Price from DCF: {stock_price_from_dcf}, Date: {dcf_date}")
+                else:
+                    cache_stock(symbol, dcf=dcf_value)
+                    logger.debug(f"DCF value for {symbol}: {dcf_value}, Date: {dcf_date}")
+                return dcf_value, stock_price_from_dcf
+        else:
+            logger.debug(f"No DCF data available for {symbol} (empty response)")
+    except (ValueError, IndexError, TypeError) as e:
+        logger.debug(f"Error parsing DCF response for {symbol}: {e}")
+    return None, None
+
 def get_stock_price(symbol):
     """
     Fetch current stock price for a symbol.
-    Checks cache first, then fetches from API if not cached.
+    Checks cache first, then fetches from API (via the quote batcher) if not cached.
     Reference: https://site.financialmodelingprep.com/developer/docs#quote
     """
     # Check cache first
-    cached = get_cached_stock(symbol)
-    if cached and 'price' in cached and cached['price'] is not None:
-        logger.debug(f"Using cached price for {symbol}: {cached['price']}")
-        return cached['price']
-    
-    # Fetch from API - using path parameter format for v3 API
-    url = f"{BASE_URL}/quote/{symbol}"
+    cached_price = get_cached_field(symbol, 'price')
+    if cached_price is not None:
+        logger.debug(f"Using cached price for {symbol}: {cached_price}")
+        return cached_price
     
+    # Fetch from API - batched with other pending symbols into one /quote call
+    # (fetch_quote_chunk caches the price)
+    quote = quote_batcher.get(symbol)
+    price = quote.get('price') if quote else None
+    return price if price and price > 0 else None
+
+def fetch_quote_chunk(symbols):
+    """
+    Fetch quotes for several symbols with one comma-separated /quote request.
+    Returns dict mapping symbol to quote data, or None if the request failed.
+    """
+    url = f"{BASE_URL}/quote/{','.join(symbols)}"
     response = make_api_request(url)
-    if response:
+    if not response:
+        with failed_quote_lock:
+            failed_quote_symbols.update(symbols)
+        return None
+    try:
+        data = response.json()
+    except ValueError as e:
+        logger.debug(f"Error parsing batched quote response: {e}")
+        return None
+    if not isinstance(data, list):
+        return None
+    quotes = {}
+    for item in data:
+        if isinstance(item, dict) and item.get('symbol'):
+            quotes[item['symbol']] = item
+            # Cache prices as they arrive so prefetched symbols hit the cache
+            parse_price_response(item['symbol'], [item])
+    return quotes
+
+# Shared by all workers (and the async engine) so concurrent price lookups coalesce
+quote_batcher = QuoteBatcher(fetch_quote_chunk, batch_size=QUOTE_BATCH_SIZE)
+
+def prefetch_prices(stocks, use_bulk, dcf_bulk):
+    """
+    Queue batched quote lookups for stocks that will need a separate price call:
+    those whose DCF comes from bulk data (the per-symbol DCF response already
+    carries a price) and that have no cached price.
+    """
+    if not (use_bulk and dcf_bulk):
+        return 0
+    symbols = []
+    for stock in stocks:
+        symbol = stock.get('symbol', '')
+        if not symbol or symbol not in dcf_bulk:
+            continue
+        if fresh_field(get_cached_stock(symbol), 'price') is not None:
+            continue
+        if get_negative_reason(symbol, dcf_bulk):
+            continue
+        symbols.append(symbol)
+    quote_batcher.prefetch(symbols)
+    return len(symbols)
+
+def parse_price_response(symbol, data):
+    """
+    Extract the current price from a quote response and cache it.
+    Returns None if the response has no usable price.
+    """
+    try:
+        if data and len(data) > 0 and isinstance(data[0], dict):
+            price = data[0].get('price', None)
+            if price and price > 0:
+                cache_stock(symbol, price=price)
+                logger.debug(f"Price for {symbol}: {price}")
+                return price
+    except (ValueError, IndexError, TypeError) as e:
+        logger.debug(f"Error parsing price response for {symbol}: {e}")
+    return None
+
+def fetch_profile_bulk_part(part):
+    """
+    Fetch one profile-bulk part, retrying it on its own if it fails.
+    Returns the list of profiles (empty past the last part) or None if every attempt failed.
+    """
+    url = f"{BASE_URL}/profile-bulk"
+    for attempt in range(PROFILE_BULK_PART_RETRIES + 1):
         try:
-            data = response.json()
-            if data and len(data) > 0 and isinstance(data[0], dict):
-                price = data[0].get('price', None)
-                if price and price > 0:
-                    cache_stock(symbol, price=price)
-                    logger.debug(f"Price for {symbol}: {price}")
-                    return price
-        except (ValueError, IndexError, TypeError) as e:
-            logger.debug(f"Error parsing price response for {symbol}: {e}")
+            records = read_bulk_records(url, PROFILE_BULK_FIELDS, {'part': part})
+            if records is not None:
+                return list(records)
+        except (ValueError, requests.exceptions.RequestException) as e:
+            logger.error(f"Error parsing profile bulk response for part {part}: {e}")
+        logger.warning(f"Profile bulk part {part} failed (attempt {attempt + 1}/{PROFILE_BULK_PART_RETRIES + 1})")
     return None
 
-def get_profiles_bulk():
+def get_profiles_bulk(on_part=None):
     """
     Fetch company profiles for all stocks using bulk API.
     Also populates cache with fetched data.
+    Parts are downloaded PROFILE_BULK_WORKERS at a time and merged as they
+    arrive. Without a known part count (FMP_PROFILE_BULK_PARTS), new parts
+    keep being requested until one comes back shorter than a full part.
+    If given, on_part(profiles) is called with each part's symbol -> profile
+    dict as soon as it is merged (see bulk_prefetch.py).
     Reference: https://site.financialmodelingprep.com/developer/docs#bulk
     Returns a dictionary mapping symbol to profile data.
     """
     logger.info("Fetching company profiles using bulk API...")
     profiles_dict = {}
-    part = 0
+    last_part = PROFILE_BULK_PARTS - 1 if PROFILE_BULK_PARTS > 0 else None
+    next_part = 0
+    highest_full_part = -1  # Probing stays within PROFILE_BULK_WORKERS parts of this
+    failed_parts = []
+    start_time = time.time()
     
-    while True:
-        url = f"{BASE_URL}/profile-bulk"
-        params = {'part': part}
-        
-        response = make_api_request(url, params)
-        if not response:
-            break
-            
-        try:
-            data = response.json()
-            if not data or len(data) == 0:
+    with ThreadPoolExecutor(max_workers=PROFILE_BULK_WORKERS) as executor:
+        pending = {}
+        while True:
+            if stop_requested.is_set():
+                # Ctrl+C: request no more parts; leaving the with block waits only for those downloading
+                for future in pending:
+                    future.cancel()
+                logger.warning(f"Profile bulk download interrupted after {next_part} parts requested")
                 break
-                
-            for item in data:
-                symbol = item.get('symbol', '')
-                if symbol:
-                    profile = {
-                        'sector': item.get('sector', 'N/A'),
-                        'industry': item.get('industry', 'N/A'),
-                        'companyName': item.get('companyName', 'N/A')
-                    }
-                    profiles_dict[symbol] = profile
-                    # Cache the profile
-                    cache_stock(symbol, profile=profile)
-            
-            # Check if there are more parts
-            if len(data) < 1000:  # Assuming 1000 items per part
+            # Keep PROFILE_BULK_WORKERS parts in flight until the last part is known.
+            # While probing, only go PROFILE_BULK_WORKERS parts past the highest full part,
+            # so a string of failures (e.g. the API is down) cannot probe forever.
+            if last_part is not None:
+                limit = last_part
+            else:
+                limit = highest_full_part + PROFILE_BULK_WORKERS
+            while len(pending) < PROFILE_BULK_WORKERS and next_part <= limit:
+                pending[executor.submit(fetch_profile_bulk_part, next_part)] = next_part
+                next_part += 1
+            if not pending:
                 break
-            part += 1
-            time.sleep(INITIAL_DELAY)  # Small delay between bulk requests
             
-        except ValueError as e:
-            logger.error(f"Error parsing profile bulk response: {e}")
-            break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                part = pending.pop(future)
+                data = future.result()
+                if data is None:
+                    # Does not end the download: later parts may still exist
+                    failed_parts.append(part)
+                    continue
+                
+                if len(data) < PROFILE_BULK_PART_SIZE:
+                    if last_part is None or part < last_part:
+                        last_part = part
+                else:
+                    highest_full_part = max(highest_full_part, part)
+                
+                part_profiles = {}
+                for item in data:
+                    symbol = item.get('symbol', '')
+                    if symbol:
+                        profile = build_profile(item)
+                        part_profiles[symbol] = profile
+                        # Cache the profile
+                        cache_stock(symbol, profile=profile)
+                profiles_dict.update(part_profiles)
+                if on_part is not None:
+                    on_part(part_profiles)
     
-    logger.info(f"Successfully fetched profiles for {len(profiles_dict)} stocks and cached them")
+    failed_parts = sorted(p for p in failed_parts if last_part is None or p <= last_part)
+    if failed_parts:
+        logger.warning(f"Profile bulk parts failed after retries: {failed_parts}")
+    parts_desc = f"{last_part + 1} parts" if last_part is not None else f"{next_part} parts requested"
+    logger.info(f"Successfully fetched profiles for {len(profiles_dict)} stocks ({parts_desc}, "
+                f"{time.time() - start_time:.1f}s) and cached them")
     return profiles_dict if profiles_dict else None
 
+def build_profile(item):
+    """
+    Profile dict as cached, from a /profile or profile-bulk record: sector,
+    industry and company name plus PROFILE_CACHE_FIELDS (currency, country,
+    mktCap and exchange are used by prefilter_universe to drop symbols
+    before per-symbol calls; the rest by fetch_stock_regions.py).
+    """
+    profile = {
+        'sector': item.get('sector', 'N/A'),
+        'industry': item.get('industry', 'N/A'),
+        'companyName': item.get('companyName', 'N/A')
+    }
+    for field in PROFILE_CACHE_FIELDS:
+        profile[field] = item.get(field)
+    return profile
+
 def get_company_profile(symbol):
     """
     Fetch company profile including sector, industry, and sub-industry for a single symbol.
@@ -426,10 +898,10 @@ def get_company_profile(symbol):
     Reference: https://site.financialmodelingprep.com/developer/docs#company-information
     """
     # Check cache first
-    cached = get_cached_stock(symbol)
-    if cached and 'profile' in cached and cached['profile'] is not None:
+    cached_profile = get_cached_field(symbol, 'profile')
+    if cached_profile is not None:
         logger.debug(f"Using cached profile for {symbol}")
-        return cached['profile']
+        return cached_profile
     
     # Fetch from API - using path parameter format for v3 API
     url = f"{BASE_URL}/profile/{symbol}"
@@ -437,223 +909,679 @@ def get_company_profile(symbol):
     response = make_api_request(url)
     if response:
         try:
-            data = response.json()
-            if data and len(data) > 0 and isinstance(data[0], dict):
-                profile = {
-                    'sector': data[0].get('sector', 'N/A'),
-                    'industry': data[0].get('industry', 'N/A'),
-                    'companyName': data[0].get('companyName', 'N/A')
-                }
-                cache_stock(symbol, profile=profile)
-                logger.debug(f"Profile for {symbol}: {profile.get('companyName')} - {profile.get('sector')}")
-                return profile
-        except (ValueError, IndexError, TypeError) as e:
+            return parse_profile_response(symbol, response.json())
+        except ValueError as e:
             logger.debug(f"Error parsing profile response for {symbol}: {e}")
     return None
 
-def process_stock(stock, use_bulk, dcf_bulk, profiles_bulk, OVERVALUED_BUFFER, stats_lock, undervalued_stocks, fair_stocks, undervalued_stocks_cache, processed_counter):
+def parse_profile_response(symbol, data):
     """
-    Process a single stock to determine if it's undervalued, fair, or overvalued.
-    Thread-safe function for parallel processing.
-    Returns stock_detail dictionary.
+    Extract the profile fields (see build_profile) from a profile response and cache them.
+    Returns None if the response has no profile.
+    """
+    try:
+        if data and len(data) > 0 and isinstance(data[0], dict):
+            profile = build_profile(data[0])
+            cache_stock(symbol, profile=profile)
+            logger.debug(f"Profile for {symbol}: {profile.get('companyName')} - {profile.get('sector')}")
+            return profile
+    except (ValueError, IndexError, TypeError) as e:
+        logger.debug(f"Error parsing profile response for {symbol}: {e}")
+    return None
+
+def get_display_name(symbol, use_bulk, profiles_bulk):
+    """
+    Best-effort company name for logging, from bulk profiles or cache.
+    """
+    profile_display = None
+    if use_bulk and profiles_bulk:
+        profile_display = profiles_bulk.get(symbol)
+    if not profile_display:
+        cached = get_cached_stock(symbol)
+        if cached and 'profile' in cached:
+            profile_display = cached['profile']
+    return profile_display.get('companyName', symbol) if profile_display else symbol
+
+def classify_stock(symbol, company_name, dcf_value, current_price, OVERVALUED_BUFFER):
+    """
+    Classify a stock from its DCF value and current price and log the result.
+    Returns stock_detail dictionary; 'has_data' is True only when both values are valid.
     """
-    symbol = stock.get('symbol', '')
-    if not symbol:
-        return None
-    
     stock_detail = {
         'symbol': symbol,
-        'company_name': '',
+        'company_name': company_name,
         'price': None,
         'dcf': None,
         'status': 'UNKNOWN',
         'has_data': False
     }
     
-    # Use semaphore to limit concurrent API requests
-    with API_SEMAPHORE:
-        # Try to get company name early for logging
-        profile_display = None
-        if use_bulk and profiles_bulk:
-            profile_display = profiles_bulk.get(symbol)
-        if not profile_display:
-            cached = get_cached_stock(symbol)
-            if cached and 'profile' in cached:
-                profile_display = cached['profile']
-        company_name = profile_display.get('companyName', symbol) if profile_display else symbol
-        
-        # Get DCF value (from bulk or individual, cache is checked in get_dcf_value)
-        stock_price_from_dcf = None
-        if use_bulk and dcf_bulk:
-            dcf_value = dcf_bulk.get(symbol)
-            # If not in bulk, try cache or individual API
-            if dcf_value is None:
-                dcf_value, stock_price_from_dcf = get_dcf_value(symbol)
-                time.sleep(INITIAL_DELAY)
-        else:
-            dcf_value, stock_price_from_dcf = get_dcf_value(symbol)
-            time.sleep(INITIAL_DELAY)
-        
-        # Get current price - use price from DCF response if available, otherwise fetch separately
-        if stock_price_from_dcf and stock_price_from_dcf > 0:
-            current_price = stock_price_from_dcf
-        else:
-            current_price = get_stock_price(symbol)
-        
-        # Log/print information for ALL stocks checked, regardless of data availability
-        if dcf_value is None or dcf_value <= 0:
-            if current_price is None or current_price <= 0:
-                # No DCF and no price
-                log_msg = f"Stock: {company_name} ({symbol}) - DCF: N/A, Price: N/A - Status: DATA_UNAVAILABLE"
-                logger.info(log_msg)
-                print(f"DATA_UNAVAILABLE: {company_name} ({symbol}) - DCF: N/A, Price: N/A")
-                stock_detail['status'] = 'DATA_UNAVAILABLE'
-            else:
-                # No DCF but have price
-                log_msg = f"Stock: {company_name} ({symbol}) - DCF: N/A, Price: ${current_price:.2f} - Status: NO_DCF_DATA"
-                logger.info(log_msg)
-                print(f"NO_DCF_DATA: {company_name} ({symbol}) - DCF: N/A, Price: ${current_price:.2f}")
-                stock_detail['status'] = 'NO_DCF_DATA'
-                stock_detail['price'] = current_price
-            
-            stock_detail['company_name'] = company_name
-            return stock_detail
-        
+    # Log/print information for ALL stocks checked, regardless of data availability
+    if dcf_value is None or dcf_value <= 0:
         if current_price is None or current_price <= 0:
-            # Have DCF but no price
-            log_msg = f"Stock: {company_name} ({symbol}) - DCF: ${dcf_value:.2f}, Price: N/A - Status: NO_PRICE_DATA"
+            # No DCF and no price
+            log_msg = f"Stock: {company_name} ({symbol}) - DCF: N/A, Price: N/A - Status: DATA_UNAVAILABLE"
             logger.info(log_msg)
-            print(f"NO_PRICE_DATA: {company_name} ({symbol}) - DCF: ${dcf_value:.2f}, Price: N/A")
-            stock_detail['status'] = 'NO_PRICE_DATA'
-            stock_detail['dcf'] = dcf_value
-            stock_detail['company_name'] = company_name
-            return stock_detail
-        
-        # Both DCF and price available - log complete information
-        premium_pct = round(((current_price - dcf_value) / dcf_value) * 100, 2) if current_price > dcf_value else 0
-        discount_pct = round(((dcf_value - current_price) / dcf_value) * 100, 2) if current_price < dcf_value else 0
-        
-        if current_price < dcf_value:
-            status = "UNDERVALUED"
-        elif current_price > dcf_value * (1 + OVERVALUED_BUFFER):
-            status = "OVERVALUED (>20%)"
+            print(f"DATA_UNAVAILABLE: {company_name} ({symbol}) - DCF: N/A, Price: N/A")
+            stock_detail['status'] = 'DATA_UNAVAILABLE'
         else:
-            status = "FAIR"
-        
-        log_msg = f"Stock: {company_name} ({symbol}) - Price: ${current_price:.2f}, DCF: ${dcf_value:.2f}, Diff: {abs(discount_pct) if discount_pct > 0 else premium_pct:.2f}% - Status: {status}"
+            # No DCF but have price
+            log_msg = f"Stock: {company_name} ({symbol}) - DCF: N/A, Price: ${current_price:.2f} - Status: NO_DCF_DATA"
+            logger.info(log_msg)
+            print(f"NO_DCF_DATA: {company_name} ({symbol}) - DCF: N/A, Price: ${current_price:.2f}")
+            stock_detail['status'] = 'NO_DCF_DATA'
+            stock_detail['price'] = current_price
+        return stock_detail
+    
+    if current_price is None or current_price <= 0:
+        # Have DCF but no price
+        log_msg = f"Stock: {company_name} ({symbol}) - DCF: ${dcf_value:.2f}, Price: N/A - Status: NO_PRICE_DATA"
         logger.info(log_msg)
-        print(f"{status}: {company_name} ({symbol}) - Price: ${current_price:.2f}, DCF: ${dcf_value:.2f}, Diff: {abs(discount_pct) if discount_pct > 0 else premium_pct:.2f}%")
-        
-        # Update stock detail for batch tracking
-        stock_detail['company_name'] = company_name
-        stock_detail['price'] = current_price
+        print(f"NO_PRICE_DATA: {company_name} ({symbol}) - DCF: ${dcf_value:.2f}, Price: N/A")
+        stock_detail['status'] = 'NO_PRICE_DATA'
         stock_detail['dcf'] = dcf_value
-        stock_detail['status'] = status
-        stock_detail['has_data'] = True
+        return stock_detail
+    
+    # Both DCF and price available - log complete information
+    premium_pct = round(((current_price - dcf_value) / dcf_value) * 100, 2) if current_price > dcf_value else 0
+    discount_pct = round(((dcf_value - current_price) / dcf_value) * 100, 2) if current_price < dcf_value else 0
+    
+    if current_price < dcf_value:
+        status = "UNDERVALUED"
+    elif current_price > dcf_value * (1 + OVERVALUED_BUFFER):
+        status = "OVERVALUED (>20%)"
+    else:
+        status = "FAIR"
+    
+    log_msg = f"Stock: {company_name} ({symbol}) - Price: ${current_price:.2f}, DCF: ${dcf_value:.2f}, Diff: {abs(discount_pct) if discount_pct > 0 else premium_pct:.2f}% - Status: {status}"
+    logger.info(log_msg)
+    print(f"{status}: {company_name} ({symbol}) - Price: ${current_price:.2f}, DCF: ${dcf_value:.2f}, Diff: {abs(discount_pct) if discount_pct > 0 else premium_pct:.2f}%")
+    
+    # Update stock detail for progress reports
+    stock_detail['price'] = current_price
+    stock_detail['dcf'] = dcf_value
+    stock_detail['status'] = status
+    stock_detail['has_data'] = True
+    return stock_detail
+
+def record_valuation(stock_detail, profile, OVERVALUED_BUFFER, stats_lock, undervalued_stocks, fair_stocks, undervalued_stocks_cache):
+    """
+    Record a classified stock (with complete data) in the result lists and caches.
+    Undervalued and fair stocks are added to the results and result caches.
+    The price, DCF and profile are not cached again here: each was cached
+    (and stamped) when it was fetched, and re-caching values read from the
+    cache would make stale fields look fresh to --refresh.
+    """
+    symbol = stock_detail['symbol']
+    current_price = stock_detail['price']
+    dcf_value = stock_detail['dcf']
+    
+    if profile:
+        company_name = profile.get('companyName', 'N/A')
+        
+        # Check if undervalued
+        if current_price < dcf_value:
+            discount_pct = round(((dcf_value - current_price) / dcf_value) * 100, 2)
+            stock_data = {
+                'Symbol': symbol,
+                'Company Name': company_name,
+                'Current Price': round(current_price, 2),
+                'DCF Price': round(dcf_value, 2),
+                'Discount %': discount_pct,
+                'Premium %': 0,
+                'Valuation Status': 'UNDERVALUED',
+                'Sector': profile.get('sector', 'N/A'),
+                'Industry': profile.get('industry', 'N/A'),
+                'Timestamp': datetime.now().isoformat()
+            }
+            # Thread-safe append
+            with stats_lock:
+                undervalued_stocks.append(stock_data)
+                # Add to separate undervalued cache (avoid duplicates)
+                cache_undervalued_stock(stock_data, undervalued_stocks_cache)
+            stock_detail['valuation'] = stock_data  # Stored in the run manifest
+            logger.info(f"Found undervalued: {symbol} - Price: ${current_price:.2f} < DCF: ${dcf_value:.2f} "
+                       f"({discount_pct}% discount) - {company_name}")
+            print(f"UNDERVALUED: {company_name} ({symbol}) - Price: ${current_price:.2f}, DCF: ${dcf_value:.2f}, Discount: {discount_pct}%")
+        
+        # Check if fair value (between DCF and DCF * 1.20)
+        elif current_price >= dcf_value and current_price <= dcf_value * (1 + OVERVALUED_BUFFER):
+            premium_pct = round(((current_price - dcf_value) / dcf_value) * 100, 2)
+            stock_data = {
+                'Symbol': symbol,
+                'Company Name': company_name,
+                'Current Price': round(current_price, 2),
+                'DCF Price': round(dcf_value, 2),
+                'Discount %': 0,
+                'Premium %': premium_pct,
+                'Valuation Status': 'FAIR',
+                'Sector': profile.get('sector', 'N/A'),
+                'Industry': profile.get('industry', 'N/A'),
+                'Timestamp': datetime.now().isoformat()
+            }
+            # Thread-safe append
+            with stats_lock:
+                fair_stocks.append(stock_data)
+                # Add to cache list (avoid duplicates)
+                cache_fair_stock(stock_data)
+            stock_detail['valuation'] = stock_data  # Stored in the run manifest
+            logger.info(f"Found fair value: {symbol} - Price: ${current_price:.2f}, DCF: ${dcf_value:.2f} "
+                       f"({premium_pct}% premium) - {company_name}")
+            print(f"FAIR: {company_name} ({symbol}) - Price: ${current_price:.2f}, DCF: ${dcf_value:.2f}, Premium: {premium_pct}%")
         
-        # Get company profile for all stocks
-        profile = None
-        if use_bulk and profiles_bulk:
-            profile = profiles_bulk.get(symbol)
+        # Overvalued stocks (price > DCF * 1.20) are not included in results
+
+def process_stock(stock, use_bulk, dcf_bulk, profiles_bulk, OVERVALUED_BUFFER, stats_lock, undervalued_stocks, fair_stocks, undervalued_stocks_cache, processed_counter):
+    """
+    Process a single stock to determine if it's undervalued, fair, or overvalued.
+    Thread-safe function for parallel processing.
+    Returns stock_detail dictionary.
+    """
+    symbol = stock.get('symbol', '')
+    if not symbol:
+        return None
+    
+    # Pacing is done by the shared rate limiter in fmp_client
+    # Try to get company name early for logging
+    company_name = get_display_name(symbol, use_bulk, profiles_bulk)
+    
+    # Skip symbols that recently came back empty
+    begin_symbol_lookups()
+    negative_reason = get_negative_reason(symbol, dcf_bulk if use_bulk else None)
+    if negative_reason:
+        return negative_cached_detail(symbol, company_name, negative_reason, dcf_bulk if use_bulk else None)
+    
+    # Get DCF value (from bulk or individual, cache is checked in get_dcf_value)
+    stock_price_from_dcf = None
+    if use_bulk and dcf_bulk:
+        dcf_value = dcf_bulk.get(symbol)
+        # If not in bulk, try cache or individual API
+        if dcf_value is None:
+            dcf_value, stock_price_from_dcf = get_dcf_value(symbol)
+    else:
+        dcf_value, stock_price_from_dcf = get_dcf_value(symbol)
+    
+    # Get current price - use price from DCF response if available, otherwise fetch separately
+    if stock_price_from_dcf and stock_price_from_dcf > 0:
+        current_price = stock_price_from_dcf
+    else:
+        current_price = get_stock_price(symbol)
+    
+    stock_detail = classify_stock(symbol, company_name, dcf_value, current_price, OVERVALUED_BUFFER)
+    update_negative_cache(stock_detail)
+    if not stock_detail['has_data']:
+        return stock_detail
+    
+    # Get company profile for all stocks
+    profile = None
+    if use_bulk and profiles_bulk:
+        profile = profiles_bulk.get(symbol)
+    if profile is None:
+        profile = get_company_profile(symbol)
+    
+    record_valuation(stock_detail, profile, OVERVALUED_BUFFER, stats_lock, undervalued_stocks, fair_stocks, undervalued_stocks_cache)
+    return stock_detail
+
+def split_vectorizable(chunk, use_bulk, dcf_bulk, profiles_bulk):
+    """
+    Split a chunk into symbols the columnar path (see vector_valuation.py) can
+    classify without per-symbol calls and the residual stocks that go through
+    process_stock. Vectorizable symbols have a DCF in dcf-bulk, a profile from
+    profile-bulk or the cache and no negative cache entry in force; quotes for
+    the ones without a cached price are submitted to the quote batcher here.
+    Returns (vector, residual_stocks); vector holds parallel lists per symbol.
+    """
+    vector = {'stocks': [], 'symbols': [], 'dcf': [], 'prices': [], 'profiles': [],
+              'quotes': {}, 'had_negative': set()}
+    if not (VECTORIZE and use_bulk and dcf_bulk):
+        return vector, chunk
+    residual = []
+    
+    for stock in chunk:
+        symbol = stock.get('symbol', '')
+        dcf_value = dcf_bulk.get(symbol) if symbol else None
+        if dcf_value is None:
+            residual.append(stock)
+            continue
+        cached = get_cached_stock(symbol)
+        profile = profiles_bulk.get(symbol) if profiles_bulk else None
         if profile is None:
-            profile = get_company_profile(symbol)
-            time.sleep(INITIAL_DELAY)
+            profile = fresh_field(cached, 'profile')
+        if profile is None or get_negative_reason(symbol, dcf_bulk):
+            residual.append(stock)
+            continue
         
-        if profile:
-            company_name = profile.get('companyName', 'N/A')
-            
-            # Check if undervalued
-            if current_price < dcf_value:
-                discount_pct = round(((dcf_value - current_price) / dcf_value) * 100, 2)
-                stock_data = {
-                    'Symbol': symbol,
-                    'Company Name': company_name,
-                    'Current Price': round(current_price, 2),
-                    'DCF Price': round(dcf_value, 2),
-                    'Discount %': discount_pct,
-                    'Premium %': 0,
-                    'Valuation Status': 'UNDERVALUED',
-                    'Sector': profile.get('sector', 'N/A'),
-                    'Industry': profile.get('industry', 'N/A'),
-                    'Timestamp': datetime.now().isoformat()
-                }
-                # Thread-safe append
-                with stats_lock:
-                    undervalued_stocks.append(stock_data)
-                    # Add to separate undervalued cache (avoid duplicates)
-                    existing_idx = next((i for i, s in enumerate(undervalued_stocks_cache) if s.get('Symbol') == symbol), None)
-                    if existing_idx is not None:
-                        undervalued_stocks_cache[existing_idx] = stock_data
-                    else:
-                        undervalued_stocks_cache.append(stock_data)
-                # Update cache with stock data
-                cache_stock(symbol, price=current_price, dcf=dcf_value, profile=profile)
-                logger.info(f"Found undervalued: {symbol} - Price: ${current_price:.2f} < DCF: ${dcf_value:.2f} "
-                           f"({discount_pct}% discount) - {company_name}")
-                print(f"UNDERVALUED: {company_name} ({symbol}) - Price: ${current_price:.2f}, DCF: ${dcf_value:.2f}, Discount: {discount_pct}%")
-            
-            # Check if fair value (between DCF and DCF * 1.20)
-            elif current_price >= dcf_value and current_price <= dcf_value * (1 + OVERVALUED_BUFFER):
-                premium_pct = round(((current_price - dcf_value) / dcf_value) * 100, 2)
-                stock_data = {
-                    'Symbol': symbol,
-                    'Company Name': company_name,
-                    'Current Price': round(current_price, 2),
-                    'DCF Price': round(dcf_value, 2),
-                    'Discount %': 0,
-                    'Premium %': premium_pct,
-                    'Valuation Status': 'FAIR',
-                    'Sector': profile.get('sector', 'N/A'),
-                    'Industry': profile.get('industry', 'N/A'),
-                    'Timestamp': datetime.now().isoformat()
-                }
-                # Thread-safe append
-                with stats_lock:
-                    fair_stocks.append(stock_data)
-                    # Add to cache list (avoid duplicates)
-                    if '_fair_stocks' not in stock_cache:
-                        stock_cache['_fair_stocks'] = []
-                    existing_idx = next((i for i, s in enumerate(stock_cache['_fair_stocks']) if s.get('Symbol') == symbol), None)
-                    if existing_idx is not None:
-                        stock_cache['_fair_stocks'][existing_idx] = stock_data
-                    else:
-                        stock_cache['_fair_stocks'].append(stock_data)
-                # Update cache with stock data
-                cache_stock(symbol, price=current_price, dcf=dcf_value, profile=profile)
-                logger.info(f"Found fair value: {symbol} - Price: ${current_price:.2f}, DCF: ${dcf_value:.2f} "
-                           f"({premium_pct}% premium) - {company_name}")
-                print(f"FAIR: {company_name} ({symbol}) - Price: ${current_price:.2f}, DCF: ${dcf_value:.2f}, Premium: {premium_pct}%")
-            
-            # Skip overvalued stocks (price > DCF * 1.20) - not including in results
+        price = get_cached_field(symbol, 'price')
+        if price is None:
+            vector['quotes'][symbol] = quote_batcher.submit(symbol)
+        if cached and cached.get('negative'):
+            vector['had_negative'].add(symbol)
+        vector['stocks'].append(stock)
+        vector['symbols'].append(symbol)
+        vector['dcf'].append(dcf_value)
+        vector['prices'].append(price)
+        vector['profiles'].append(profile)
+    
+    return vector, residual
+
+def classify_vectorized(vector, OVERVALUED_BUFFER, stats_lock, undervalued_stocks_cache):
+    """
+    Classify the symbols from split_vectorizable in one pandas pass once their
+    quotes are in, and record the UNDERVALUED/FAIR rows in the result caches.
+    DCF, price and profile were cached when the bulk and quote responses came
+    in, so unlike record_valuation nothing is re-cached per symbol.
+    Returns (classified frame, stock_valuations.csv rows frame).
+    """
+    prices = vector['prices']
+    for i, symbol in enumerate(vector['symbols']):
+        if symbol in vector['quotes']:
+            quote = vector['quotes'][symbol].result()
+            prices[i] = quote.get('price') if quote else None
+    
+    frame = vector_valuation.build_frame(vector['symbols'], vector['dcf'], prices, vector['profiles'])
+    classified = vector_valuation.classify_frame(frame, OVERVALUED_BUFFER)
+    rows = vector_valuation.result_rows(classified, datetime.now().isoformat())
+    
+    # Same result cache upserts record_valuation makes
+    with stats_lock:
+        for stock_data in rows.to_dict('records'):
+            if stock_data['Valuation Status'] == 'UNDERVALUED':
+                cache_undervalued_stock(stock_data, undervalued_stocks_cache)
             else:
-                # Update cache with stock data even for overvalued
-                cache_stock(symbol, price=current_price, dcf=dcf_value, profile=profile)
+                cache_fair_stock(stock_data)
+    
+    # Same negative cache updates update_negative_cache makes, for the few symbols they apply to
+    if NEGATIVE_CACHE_TTL > 0:
+        no_data = classified[~classified['has_data']]
+        for symbol, status in zip(no_data['symbol'], no_data['status']):
+            if not lookups_failed(symbol):
+                cache_negative(symbol, status)
+        recovered = classified['has_data'] & classified['symbol'].isin(vector['had_negative'])
+        for symbol in classified.loc[recovered, 'symbol']:
+            cache_negative(symbol, None)
+    
+    counts = classified['status'].value_counts()
+    summary = (f"{counts.get('UNDERVALUED', 0)} undervalued, {counts.get('FAIR', 0)} fair, "
+               f"{counts.get('OVERVALUED (>20%)', 0)} overvalued, {int((~classified['has_data']).sum())} without data")
+    logger.info(f"Vectorized classification of {len(classified)} stocks: {summary}")
+    print(f"Vectorized {len(classified)} stocks: {summary}")
+    return classified, rows
+
+def select_changed(stocks, dcf_bulk, previous_inputs):
+    """
+    --incremental: take a fresh quote snapshot (batched /quote calls, which also
+    cache the new prices) of the stocks valued before and split them into
+    (changed, unchanged) lists. A stock is changed if it is new, its price or
+    DCF moved or its quote could not be fetched; negative-cached ones count as
+    unchanged.
+    """
+    changed = []
+    unchanged = []
+    quotes = {}
+    for stock in stocks:
+        symbol = stock.get('symbol', '')
+        if symbol not in previous_inputs:
+            changed.append(stock)
+        elif get_negative_reason(symbol, dcf_bulk):
+            unchanged.append(stock)
         else:
-            # No profile available, but still track the stock and update cache
-            cache_stock(symbol, price=current_price, dcf=dcf_value)
+            quotes[symbol] = (stock, quote_batcher.submit(symbol))
     
-    return stock_detail
+    for symbol, (stock, future) in quotes.items():
+        old_price, old_dcf = previous_inputs[symbol]
+        quote = future.result()
+        price = quote.get('price') if quote else None
+        dcf_value = dcf_bulk.get(symbol, old_dcf) if dcf_bulk else old_dcf
+        if price is None or price != old_price or dcf_value != old_dcf:
+            changed.append(stock)
+        else:
+            unchanged.append(stock)
+    return changed, unchanged
+
+def load_previous_results():
+    """The last run's stock_valuations.csv as a DataFrame, or None if there is none."""
+    if not os.path.exists(VALUATIONS_FILE):
+        return None
+    try:
+        # Keep 'N/A' sectors and tickers such as NA as strings
+        return pd.read_csv(VALUATIONS_FILE, keep_default_na=False, na_values=[''])
+    except Exception as e:
+        logger.warning(f"Error reading {VALUATIONS_FILE}: {e}")
+        return None
+
+def prune_result_caches(changes):
+    """
+    --incremental: drop symbols whose status moved away from UNDERVALUED/FAIR
+    from the matching result cache (their new rows were already upserted).
+    """
+    ensure_caches_loaded()
+    if cache_store is not None:
+        dropped = changes.loc[changes['New Status'].isna(), 'Symbol']
+        if len(dropped):
+            cache_store.delete_valuations(dropped.tolist())
+        return
+    left_undervalued = changes.loc[(changes['Old Status'] == 'UNDERVALUED') & (changes['New Status'] != 'UNDERVALUED'), 'Symbol']
+    for symbol in left_undervalued:
+        undervalued_stocks_cache.pop(symbol, None)
+    left_fair = changes.loc[(changes['Old Status'] == 'FAIR') & (changes['New Status'] != 'FAIR'), 'Symbol']
+    if len(left_fair):
+        with cache_lock:
+            for symbol in left_fair:
+                stock_cache['_fair_stocks'].pop(symbol, None)
+            cache_journal.set('_fair_stocks', list(stock_cache['_fair_stocks'].values()))
+
+def report_changes(previous_results, current_results):
+    """
+    --incremental: write the changeset between the previous and the new
+    stock_valuations.csv to CHANGES_FILE, log it and prune the result caches.
+    """
+    changes = vector_valuation.diff_results(previous_results, current_results)
+    try:
+        changes.to_csv(CHANGES_FILE, index=False, encoding='utf-8')
+    except Exception as e:
+        logger.error(f"Error saving changeset: {e}")
+    prune_result_caches(changes)
+    
+    counts = changes['Change'].value_counts()
+    summary = ", ".join(f"{counts.get(change, 0)} {change.lower().replace('_', ' ')}"
+                        for change in ('NEWLY_UNDERVALUED', 'NEWLY_FAIR', 'DROPPED_OUT', 'STATUS_FLIP'))
+    logger.info("\n" + "=" * 80)
+    logger.info(f"Changes since the previous run: {summary}")
+    statuses = changes[['Old Status', 'New Status']].fillna('-')
+    for symbol, change, old_status, new_status in zip(changes['Symbol'], changes['Change'],
+                                                      statuses['Old Status'], statuses['New Status']):
+        logger.info(f"  {change}: {symbol} {old_status} -> {new_status}")
+    print(f"Changes since the previous run: {summary} (saved to {CHANGES_FILE})")
+    return changes
+
+# Set on the first Ctrl+C: the feeder stops queueing stocks and the run winds down cleanly
+stop_requested = Event()
+
+def install_interrupt_handler(prefetcher):
+    """
+    On the first Ctrl+C, stop queueing new stocks and let the workers finish
+    the ones in flight, so find_undervalued_stocks can save the caches and run
+    manifest; a second Ctrl+C interrupts immediately.
+    Returns the previous SIGINT handler.
+    """
+    def handle_interrupt(signum, frame):
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        stop_requested.set()
+        prefetcher.stop()
+        logger.warning("Interrupt received: finishing in-flight stocks and saving state (Ctrl+C again to quit now)")
+    if threading.current_thread() is not threading.main_thread():
+        # Signal handlers can only be set from the main thread
+        return None
+    return signal.signal(signal.SIGINT, handle_interrupt)
+
+def open_run_manifest(resume, options):
+    """
+    Manifest for this run: a new one, or with resume ('latest' or a run ID)
+    the interrupted run's, so the symbols it already finished are skipped.
+    """
+    if resume:
+        run_id = RunManifest.latest_incomplete() if resume == 'latest' else resume
+        if run_id is None:
+            logger.warning("Resume: no interrupted run found, starting a new run")
+        else:
+            try:
+                manifest = RunManifest.load(run_id)
+            except FileNotFoundError:
+                logger.error(f"Resume: no manifest for run {run_id} in {run_manifest.MANIFEST_DIR}/, starting a new run")
+            else:
+                if manifest.options != options:
+                    logger.warning(f"Resume: run {run_id} was started with {manifest.options}, now {options}")
+                return manifest
+    return RunManifest.create(options)
+
+def feed_work_queue(stock_chunks, work_queue, results, consumers, process_args, fed_counter):
+    """
+    Put stocks on work_queue as chunks of them become ready, blocking while the
+    queue is full, then one None per consumer to tell it the run is over.
+    Symbols the columnar path can handle are classified here instead and put
+    on results as one (None, {'classified': ..., 'rows': ...}, None) item per chunk.
+    """
+    use_bulk, dcf_bulk, profiles_bulk, OVERVALUED_BUFFER, stats_lock = process_args[:5]
+    undervalued_stocks_cache = process_args[7]
+    try:
+        for chunk in stock_chunks:
+            if stop_requested.is_set():
+                break
+            vector, residual = split_vectorizable(chunk, use_bulk, dcf_bulk, profiles_bulk)
+            # Queue the residual stocks' price lookups up front so /quote chunks go out full
+            prefetch_prices(residual, use_bulk, dcf_bulk)
+            for stock in residual:
+                if stop_requested.is_set():
+                    break
+                work_queue.put(stock)
+                fed_counter['value'] += 1
+            if vector['symbols']:
+                # Quotes were fetched while the workers took the residual stocks
+                classified, rows = classify_vectorized(vector, OVERVALUED_BUFFER, stats_lock, undervalued_stocks_cache)
+                fed_counter['value'] += len(classified)
+                results.put((None, {'classified': classified, 'rows': rows}, None))
+    except Exception as e:
+        logger.error(f"Error queueing stocks for processing: {e}")
+    finally:
+        for _ in range(consumers):
+            work_queue.put(None)
+
+def work_queue_worker(work_queue, results, process_args):
+    """
+    Long-lived worker thread: run process_stock on stocks from work_queue until
+    it gets None, putting (stock, stock_detail, error) tuples on results.
+    """
+    while True:
+        stock = work_queue.get()
+        if stock is None:
+            return
+        try:
+            results.put((stock, process_stock(stock, *process_args), None))
+        except Exception as e:
+            results.put((stock, None, e))
+
+def _run_consumer(target, results, *args):
+    try:
+        target(*args)
+    except Exception as e:
+        logger.error(f"Worker stopped: {e}")
+    finally:
+        results.put(None)  # One end marker per consumer
+
+def iter_results(engine, stock_chunks, process_args, fed_counter):
+    """
+    Process stocks from an iterable of chunks on one long-lived worker pool
+    and yield (stock, stock_detail, error) as each one completes. Chunks
+    classified by the columnar path come through as (None, {...}, None), see
+    feed_work_queue.
+    A feeder thread puts stocks on a queue bounded to WORK_QUEUE_SIZE, so it
+    only runs ahead of the workers by that much. engine='threads' runs
+    process_stock on MAX_WORKERS threads; engine='async' runs the asyncio
+    engine (see async_engine.py) on one thread.
+    """
+    work_queue = queue.Queue(maxsize=WORK_QUEUE_SIZE)
+    results = queue.Queue()
+    
+    if engine == 'async':
+        import async_engine
+        consumers = [Thread(target=_run_consumer, name='async-engine', daemon=True,
+                            args=(async_engine.process_queue, results, work_queue, results, process_args))]
+    else:
+        consumers = [Thread(target=_run_consumer, name=f'worker-{i}', daemon=True,
+                            args=(work_queue_worker, results, work_queue, results, process_args))
+                     for i in range(MAX_WORKERS)]
+    feeder = Thread(target=feed_work_queue, name='work-feeder', daemon=True,
+                    args=(stock_chunks, work_queue, results, len(consumers), process_args, fed_counter))
+    feeder.start()
+    for consumer in consumers:
+        consumer.start()
+    
+    running = len(consumers)
+    while running:
+        item = results.get()
+        if item is None:
+            running -= 1
+            continue
+        yield item
+    feeder.join()
+
+def prefilter_universe(all_stocks, use_bulk, dcf_bulk, profiles_bulk):
+    """
+    Apply the final pipeline filters (USD, US, NYSE/NASDAQ, market cap >= 1B,
+    see stock_filters.py) to the stock list before any per-symbol calls.
+    Uses the exchange from stock/list and currency/country/mktCap from
+    profile-bulk or the cache; symbols we know nothing about are kept.
+    Returns (kept_stocks, rejected_counts, calls_saved).
+    """
+    kept = []
+    rejected = {}
+    calls_saved = 0
+    
+    for stock in all_stocks:
+        symbol = stock.get('symbol', '')
+        if not symbol:
+            kept.append(stock)
+            continue
+        
+        cached = get_cached_stock(symbol) or {}
+        profile = profiles_bulk.get(symbol) if profiles_bulk else None
+        if profile is None:
+            profile = cached.get('profile')
+        
+        reason = stock_filters.rejection_reason(stock, profile)
+        if reason is None:
+            kept.append(stock)
+            continue
+        
+        rejected[reason] = rejected.get(reason, 0) + 1
+        # Estimate the per-symbol calls process_stock would have made for this symbol
+        has_bulk_dcf = use_bulk and dcf_bulk and dcf_bulk.get(symbol) is not None
+        if not has_bulk_dcf and fresh_field(cached, 'dcf') is None:
+            calls_saved += 1  # /discounted-cash-flow
+        if fresh_field(cached, 'price') is None:
+            calls_saved += 1  # /quote (batched, so an upper bound)
+        if not (profiles_bulk and symbol in profiles_bulk) and fresh_field(cached, 'profile') is None:
+            calls_saved += 1  # /profile
+    
+    return kept, rejected, calls_saved
 
-def find_undervalued_stocks():
+def new_report_data():
+    """
+    Empty statistics for one progress report.
+    """
+    return {
+        'processed': 0,
+        'skipped': 0,
+        'with_data': 0,
+        'no_data': 0,
+        'negative_cached': 0,
+        'calls_avoided': 0,
+        'undervalued': 0,
+        'fair': 0,
+        'overvalued': 0,
+        'stocks_details': [],
+        'valuation_frames': []  # Chunks classified by the columnar path
+    }
+
+def log_progress_report(report_num, report_data, handled_total, found_undervalued, found_fair):
+    """
+    Checkpoint the caches and log a summary plus the detailed stock data for
+    the stocks handled since the previous report.
+    """
+    save_cache()
+    save_undervalued_cache()
+    stock_count, undervalued_count, fair_count = cache_counts()
+    report_size = report_data['processed'] + report_data['skipped']
+    
+    logger.info("=" * 80)
+    logger.info(f"PROGRESS REPORT {report_num}")
+    logger.info("=" * 80)
+    logger.info(f"Stocks in this report: {report_size} (stocks {handled_total - report_size + 1}-{handled_total} handled)")
+    logger.info(f"Processed: {report_data['processed']} stocks")
+    logger.info(f"Skipped (no symbol or error): {report_data['skipped']} stocks")
+    valid_stocks = report_data['processed']
+    if valid_stocks > 0:
+        logger.info(f"With Complete Data: {report_data['with_data']} stocks ({report_data['with_data']/valid_stocks*100:.1f}% of processed)")
+        logger.info(f"No Data/Missing: {report_data['no_data']} stocks ({report_data['no_data']/valid_stocks*100:.1f}% of processed)")
+    else:
+        logger.info(f"With Complete Data: {report_data['with_data']} stocks")
+        logger.info(f"No Data/Missing: {report_data['no_data']} stocks")
+    logger.info(f"Undervalued: {report_data['undervalued']} stocks")
+    logger.info(f"Fair Value: {report_data['fair']} stocks")
+    logger.info(f"Overvalued: {report_data['overvalued']} stocks")
+    logger.info(f"Negative Cache: skipped {report_data['negative_cached']} known-empty stocks (~{report_data['calls_avoided']} API calls avoided)")
+    logger.info(f"Total Found So Far: {found_undervalued} undervalued, {found_fair} fair")
+    logger.info(f"Cache Status: {stock_count} stocks cached, {undervalued_count} undervalued in separate cache")
+    logger.info("=" * 80)
+    
+    # Log all stock details for this report
+    logger.info(f"\nDETAILED STOCK DATA FOR REPORT {report_num}:")
+    logger.info("-" * 80)
+    for detail in report_data['stocks_details']:
+        if detail['has_data']:
+            logger.info(f"{detail['symbol']} | {detail['company_name']} | Price: ${detail['price']:.2f} | DCF: ${detail['dcf']:.2f} | Status: {detail['status']}")
+        else:
+            logger.info(f"{detail['symbol']} | {detail['company_name']} | Price: {detail['price']} | DCF: {detail['dcf']} | Status: {detail['status']}")
+    for classified in report_data['valuation_frames']:
+        # One log call per vectorized chunk
+        logger.info(classified[['symbol', 'company_name', 'price', 'dcf', 'status']].to_string(index=False))
+    logger.info("-" * 80)
+    
+    if report_data['with_data'] == report_data['processed']:
+        logger.info(f"DATA VALIDATION: All {report_data['processed']} processed stocks have complete data")
+    else:
+        logger.warning(f"⚠️  DATA VALIDATION: Only {report_data['with_data']}/{report_data['processed']} processed stocks have complete data")
+    
+    print(f"Report {report_num}: {handled_total} stocks handled. Processed: {report_data['processed']}, With Data: {report_data['with_data']}, Cache saved.")
+
+def find_undervalued_stocks(engine='threads', prefilter=True, resume=None, incremental=False):
     """
     Main function to find stocks where price < DCF price.
     Uses bulk APIs where possible for efficiency.
+    engine selects how per-symbol calls are made: 'threads' (default) or 'async'.
+    prefilter drops symbols that cannot pass the final USD/US/exchange/market cap
+    filters before making any per-symbol calls.
+    resume ('latest' or a run ID) continues an interrupted run: only symbols
+    missing from its manifest are processed and its stored results are merged
+    into stock_valuations.csv.
+    incremental re-classifies only symbols whose price or DCF moved since the
+    last run, keeps the previous stock_valuations.csv rows of the others and
+    writes the changeset to stock_valuations_changes.csv.
     """
+    setup_logging()
     logger.info("=" * 80)
     logger.info("Starting undervalued stocks analysis")
     logger.info("=" * 80)
     
-    # Get all stocks
-    all_stocks = get_all_stocks()
+    run_start = time.time()
+    ensure_caches_loaded()
+    
+    previous_results = None
+    previous_inputs = None
+    if incremental:
+        previous_results = load_previous_results()
+        if previous_results is None:
+            logger.warning(f"Incremental: no previous {VALUATIONS_FILE}, running a full scan")
+            incremental = False
+        else:
+            # Before the bulk downloads below overwrite the cached DCF values
+            previous_inputs = cached_valuation_inputs()
+            logger.info(f"Incremental: {len(previous_results)} previous results, {len(previous_inputs)} cached inputs to diff against")
+    
+    # Download the stock list, dcf-bulk and profile-bulk in the background, all at once.
+    # Processing starts as soon as the stock list and dcf-bulk are in; symbols are
+    # handed out as their profile-bulk part arrives instead of after the last part.
+    logger.info("Fetching stock list and bulk data in the background...")
+    prefetcher = BulkPrefetcher(get_all_stocks, get_dcf_bulk, get_profiles_bulk).start()
+    all_stocks = prefetcher.stocks()
     
     if not all_stocks:
         logger.error("No stocks found. Exiting.")
+        prefetcher.shutdown()
         return
     
-    # Try to fetch bulk data first (much faster)
-    logger.info("Attempting to fetch bulk data for faster processing...")
-    dcf_bulk = get_dcf_bulk()
-    profiles_bulk = get_profiles_bulk()
+    dcf_bulk = prefetcher.dcf()
+    profiles_bulk = prefetcher.profiles  # Filled in while stocks are being processed
     
     use_bulk = dcf_bulk is not None
     
@@ -662,6 +1590,47 @@ def find_undervalued_stocks():
     else:
         logger.info("Bulk APIs not available, using individual API calls")
     
+    manifest = open_run_manifest(resume, {'prefilter': prefilter, 'vectorize': VECTORIZE, 'refresh': REFRESH_EXPIRED,
+                                          'incremental': incremental})
+    if manifest.done:
+        listed = len(all_stocks)
+        all_stocks = [stock for stock in all_stocks if stock.get('symbol', '') not in manifest.done]
+        logger.info(f"Resuming run {manifest.run_id}: {len(manifest.done)} symbols already done, "
+                    f"{len(manifest.rows)} results carried over, {len(all_stocks)} of {listed} stocks left")
+        print(f"Resuming run {manifest.run_id}: {len(all_stocks)} of {listed} stocks left")
+    else:
+        logger.info(f"Run ID: {manifest.run_id} (continue an interrupted run with --resume {manifest.run_id})")
+    
+    total_listed = len(all_stocks)
+    prefilter_stats = {'kept': 0, 'rejected': {}, 'calls_saved': 0}
+    # A resumed incremental run re-classifies everything left: the interrupted session
+    # already cached today's quotes, so diffing against the cache would miss changes
+    diff_inputs = incremental and not manifest.done
+    previous_rows = {}
+    if diff_inputs:
+        previous_rows = {row['Symbol']: row for row in previous_results.to_dict('records')}
+    incremental_stats = {'changed': 0, 'unchanged': 0, 'kept_rows': []}  # Updated on the feeder thread only
+    
+    def ready_chunks():
+        # Stocks in chunks as their bulk data arrives, pre-filtered (runs on the feeder thread)
+        for ready_stocks in prefetcher.iter_ready_chunks(all_stocks, READY_CHUNK_SIZE):
+            if prefilter:
+                ready_stocks, rejected, calls_saved = prefilter_universe(ready_stocks, use_bulk, dcf_bulk, profiles_bulk)
+                prefilter_stats['kept'] += len(ready_stocks)
+                prefilter_stats['calls_saved'] += calls_saved
+                for reason, count in rejected.items():
+                    prefilter_stats['rejected'][reason] = prefilter_stats['rejected'].get(reason, 0) + count
+            if diff_inputs and ready_stocks:
+                ready_stocks, unchanged = select_changed(ready_stocks, dcf_bulk if use_bulk else None, previous_inputs)
+                # Unchanged symbols keep their previous rows; they are done as far as --resume is concerned
+                rows = [previous_rows[stock['symbol']] for stock in unchanged if stock['symbol'] in previous_rows]
+                manifest.mark_done([stock['symbol'] for stock in unchanged], rows)
+                incremental_stats['changed'] += len(ready_stocks)
+                incremental_stats['unchanged'] += len(unchanged)
+                incremental_stats['kept_rows'].extend(rows)
+            if ready_stocks:
+                yield ready_stocks
+    
     undervalued_stocks = []
     fair_stocks = []  # Stocks fairly valued (between DCF and DCF * 1.20)
     processed = 0
@@ -670,178 +1639,221 @@ def find_undervalued_stocks():
     # Thread-safe lock for shared data structures
     stats_lock = Lock()
     processed_counter = {'value': 0}  # Use dict to allow modification in threads
+    fed_counter = {'value': 0}  # Stocks put on the work queue
     
-    logger.info(f"Analyzing {len(all_stocks)} stocks...")
-    logger.info(f"Multi-threading: {MAX_WORKERS} concurrent threads")
-    logger.info(f"Rate limiting: {INITIAL_DELAY}s delay between requests, max {MAX_RETRIES} retries per request")
+    logger.info(f"Analyzing up to {total_listed} stocks...")
+    if engine == 'async':
+        import async_engine
+        logger.info(f"Async engine: {async_engine.ASYNC_WORKERS} symbols at a time, up to "
+                    f"{async_engine.ASYNC_MAX_IN_FLIGHT} requests in flight (adapted from {async_engine.ASYNC_START_IN_FLIGHT})")
+    else:
+        logger.info(f"Multi-threading: {MAX_WORKERS} threads, up to {fmp_client.CONCURRENCY_MAX} requests in flight "
+                    f"(adapted from {fmp_client.CONCURRENCY_START})")
+    logger.info(f"Rate limiting: token bucket at {fmp_client.rate_limiter.calls_per_minute:.0f} calls/minute shared by all workers"
+                + (f" and other processes ({fmp_client.RATE_BUDGET_FILE})" if fmp_client.SHARED_RATE_LIMIT else ""))
     logger.info("=" * 80)
     
     start_time = time.time()
+    first_result_time = None
     
-    # Process stocks in batches of 2000
-    BATCH_SIZE = 2000
-    total_batches = (len(all_stocks) + BATCH_SIZE - 1) // BATCH_SIZE
+    logger.info(f"Processing {total_listed} stocks through a work queue of {WORK_QUEUE_SIZE} as bulk data arrives "
+                f"(report every {REPORT_EVERY} stocks or {REPORT_INTERVAL}s)")
+    engine_desc = "asyncio engine" if engine == 'async' else f"{MAX_WORKERS} threads"
+    print(f"Processing {total_listed} stocks as bulk data arrives (using {engine_desc})")
     
-    logger.info(f"Processing {len(all_stocks)} stocks in {total_batches} batches of {BATCH_SIZE}")
-    print(f"Processing {len(all_stocks)} stocks in {total_batches} batches of {BATCH_SIZE} (using {MAX_WORKERS} threads)")
+    process_args = (use_bulk, dcf_bulk, profiles_bulk, OVERVALUED_BUFFER, stats_lock,
+                    undervalued_stocks, fair_stocks, undervalued_stocks_cache, processed_counter)
     
-    for batch_num in range(total_batches):
-        batch_start = batch_num * BATCH_SIZE
-        batch_end = min(batch_start + BATCH_SIZE, len(all_stocks))
-        batch_stocks = all_stocks[batch_start:batch_end]
-        
-        logger.info(f"Processing batch {batch_num + 1}/{total_batches} (stocks {batch_start + 1}-{batch_end})...")
-        print(f"Processing batch {batch_num + 1}/{total_batches} (stocks {batch_start + 1}-{batch_end})...")
-        
-        # Track batch statistics
-        batch_data = {
-            'processed': 0,
-            'skipped': 0,
-            'with_data': 0,
-            'no_data': 0,
-            'undervalued': 0,
-            'fair': 0,
-            'overvalued': 0,
-            'stocks_details': []
-        }
-        
-        # Process stocks in parallel using ThreadPoolExecutor
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            # Submit all stocks in the batch for processing
-            future_to_stock = {
-                executor.submit(
-                    process_stock,
-                    stock,
-                    use_bulk,
-                    dcf_bulk,
-                    profiles_bulk,
-                    OVERVALUED_BUFFER,
-                    stats_lock,
-                    undervalued_stocks,
-                    fair_stocks,
-                    undervalued_stocks_cache,
-                    processed_counter
-                ): stock
-                for stock in batch_stocks
-            }
+    report_num = 0
+    report_start = time.time()
+    report_data = new_report_data()
+    handled_total = 0
+    skipped_total = 0
+    # stock_valuations.csv rows kept as DataFrames: carried over by --resume, then one per vectorized chunk
+    valuation_rows = []
+    other_found = {'UNDERVALUED': 0, 'FAIR': 0}  # Their counts (not in undervalued_stocks/fair_stocks)
+    if manifest.rows:
+        valuation_rows.append(pd.DataFrame(manifest.rows, columns=vector_valuation.RESULT_COLUMNS))
+        for row in manifest.rows:
+            other_found[row['Valuation Status']] += 1
+    
+    stop_requested.clear()
+    previous_handler = install_interrupt_handler(prefetcher)
+    
+    # Handle results as they complete; reports and checkpoints do not stop the workers
+    try:
+        for stock, stock_detail, error in iter_results(engine, ready_chunks(), process_args, fed_counter):
+            previous = processed_counter['value']
             
-            # Process completed futures as they finish
-            for future in as_completed(future_to_stock):
-                stock = future_to_stock[future]
+            if stock is None:
+                # A chunk classified in one pass by classify_vectorized
+                classified = stock_detail['classified']
+                valuation_rows.append(stock_detail['rows'])
+                counts = classified['status'].value_counts()
+                with_data = int(classified['has_data'].sum())
+                handled_total += len(classified)
+                other_found['UNDERVALUED'] += int(counts.get('UNDERVALUED', 0))
+                other_found['FAIR'] += int(counts.get('FAIR', 0))
+                with stats_lock:
+                    processed_counter['value'] += len(classified)
+                    report_data['processed'] += len(classified)
+                    report_data['with_data'] += with_data
+                    report_data['no_data'] += len(classified) - with_data
+                    report_data['undervalued'] += int(counts.get('UNDERVALUED', 0))
+                    report_data['fair'] += int(counts.get('FAIR', 0))
+                    report_data['overvalued'] += int(counts.get('OVERVALUED (>20%)', 0))
+                    report_data['valuation_frames'].append(classified)
+                manifest.mark_done(classified['symbol'].tolist(), stock_detail['rows'].to_dict('records'))
+            else:
                 symbol = stock.get('symbol', '')
+                handled_total += 1
                 
-                try:
-                    stock_detail = future.result()
-                    
-                    if stock_detail is None:
-                        # Stock was skipped (no symbol)
-                        with stats_lock:
-                            batch_data['skipped'] += 1
-                        continue
-                    
-                    # Update batch statistics
+                if error is not None:
+                    logger.error(f"Error processing stock {symbol}: {error}")
+                    report_data['skipped'] += 1
+                elif stock_detail is None:
+                    # Stock was skipped (no symbol)
+                    report_data['skipped'] += 1
+                else:
+                    # Update report statistics
                     with stats_lock:
                         processed_counter['value'] += 1
-                        processed = processed_counter['value']
-                        batch_data['processed'] += 1
+                        report_data['processed'] += 1
                         
                         if stock_detail['has_data']:
-                            batch_data['with_data'] += 1
+                            report_data['with_data'] += 1
                             if stock_detail['status'] == 'UNDERVALUED':
-                                batch_data['undervalued'] += 1
+                                report_data['undervalued'] += 1
                             elif stock_detail['status'] == 'FAIR':
-                                batch_data['fair'] += 1
+                                report_data['fair'] += 1
                             elif 'OVERVALUED' in stock_detail['status']:
-                                batch_data['overvalued'] += 1
+                                report_data['overvalued'] += 1
                         else:
-                            batch_data['no_data'] += 1
+                            report_data['no_data'] += 1
+                            if stock_detail.get('negative_cached'):
+                                report_data['negative_cached'] += 1
+                                report_data['calls_avoided'] += stock_detail['calls_avoided']
                         
-                        batch_data['stocks_details'].append(stock_detail)
-                        
-                        # Show progress every 50 stocks
-                        if processed % 50 == 0:
-                            elapsed = time.time() - start_time
-                            rate = processed / elapsed if elapsed > 0 else 0
-                            remaining = (len(all_stocks) - processed) / rate if rate > 0 else 0
-                            logger.info(f"Progress: {processed}/{len(all_stocks)} stocks ({rate:.1f} stocks/sec) | "
-                                       f"Found {len(undervalued_stocks)} undervalued, {len(fair_stocks)} fair | "
-                                       f"ETA: {remaining/60:.1f} minutes")
-                        
-                        # Save cache every 100 stocks to prevent data loss
-                        if processed % 100 == 0:
-                            save_cache()
-                            save_undervalued_cache()
-                            stock_count = len([k for k in stock_cache.keys() if not k.startswith('_')])
-                            logger.info(f"Cache saved: {stock_count} stocks, {len(undervalued_stocks_cache)} undervalued in separate cache, {len(stock_cache.get('_fair_stocks', []))} fair")
+                        report_data['stocks_details'].append(stock_detail)
+                    manifest.mark_done([symbol], [stock_detail['valuation']] if 'valuation' in stock_detail else [])
+            
+            processed = processed_counter['value']
+            found_undervalued = len(undervalued_stocks) + other_found['UNDERVALUED']
+            found_fair = len(fair_stocks) + other_found['FAIR']
+            if processed > previous:
+                if first_result_time is None:
+                    first_result_time = time.time() - run_start
+                    bulk_state = "bulk data complete" if prefetcher.profiles_done else "profile-bulk still downloading"
+                    logger.info(f"First result after {first_result_time:.1f}s ({bulk_state})")
                 
-                except Exception as e:
-                    logger.error(f"Error processing stock {symbol}: {e}")
-                    with stats_lock:
-                        batch_data['skipped'] += 1
-        
-        # Save cache after each batch completes
-        save_cache()
+                # Show progress every 50 stocks
+                if processed // 50 > previous // 50:
+                    elapsed = time.time() - start_time
+                    rate = processed / elapsed if elapsed > 0 else 0
+                    remaining = (total_listed - processed) / rate if rate > 0 else 0
+                    logger.info(f"Progress: {processed}/{total_listed} stocks ({rate:.1f} stocks/sec) | "
+                               f"Found {found_undervalued} undervalued, {found_fair} fair | "
+                               f"ETA: {remaining/60:.1f} minutes")
+                
+                # Save cache every 100 stocks to prevent data loss
+                if processed // 100 > previous // 100:
+                    save_cache()
+                    save_undervalued_cache()
+                    manifest.flush()
+                    stock_count, undervalued_count, fair_count = cache_counts()
+                    logger.info(f"Cache saved: {stock_count} stocks, {undervalued_count} undervalued in separate cache, {fair_count} fair")
+            
+            report_size = report_data['processed'] + report_data['skipped']
+            if report_size >= REPORT_EVERY or time.time() - report_start >= REPORT_INTERVAL:
+                report_num += 1
+                skipped_total += report_data['skipped']
+                log_progress_report(report_num, report_data, handled_total, found_undervalued, found_fair)
+                manifest.flush()
+                report_data = new_report_data()
+                report_start = time.time()
+    finally:
+        # Also on an exception or an interrupt, so no handler or prefetch thread outlives the run
+        if previous_handler is not None:
+            signal.signal(signal.SIGINT, previous_handler)
+        prefetcher.shutdown()
+    
+    found_undervalued = len(undervalued_stocks) + other_found['UNDERVALUED']
+    found_fair = len(fair_stocks) + other_found['FAIR']
+    if report_data['processed'] or report_data['skipped']:
+        report_num += 1
+        skipped_total += report_data['skipped']
+        log_progress_report(report_num, report_data, handled_total, found_undervalued, found_fair)
+    
+    # Validation check - every stock put on the work queue came back once
+    fed_total = fed_counter['value']
+    if handled_total != fed_total:
+        logger.warning(f"⚠️  VALIDATION: Queued {fed_total} stocks, but processed {processed_counter['value']} + skipped {skipped_total} = {handled_total} stocks")
+    else:
+        logger.info(f"VALIDATION: All {fed_total} queued stocks handled (processed: {processed_counter['value']}, skipped: {skipped_total})")
+    
+    if stop_requested.is_set():
+        # Interrupted: everything finished so far is in the caches and the manifest
+        save_cache(compact=True)
         save_undervalued_cache()
-        stock_count = len([k for k in stock_cache.keys() if not k.startswith('_')])
-        
-        # Log comprehensive batch summary
-        logger.info("=" * 80)
-        logger.info(f"BATCH {batch_num + 1}/{total_batches} SUMMARY")
-        logger.info("=" * 80)
-        logger.info(f"Batch Range: Stocks {batch_start + 1}-{batch_end} ({len(batch_stocks)} stocks)")
-        logger.info(f"Processed: {batch_data['processed']} stocks")
-        logger.info(f"Skipped (no symbol): {batch_data['skipped']} stocks")
-        valid_stocks = batch_data['processed']
-        if valid_stocks > 0:
-            logger.info(f"With Complete Data: {batch_data['with_data']} stocks ({batch_data['with_data']/valid_stocks*100:.1f}% of processed)")
-            logger.info(f"No Data/Missing: {batch_data['no_data']} stocks ({batch_data['no_data']/valid_stocks*100:.1f}% of processed)")
-        else:
-            logger.info(f"With Complete Data: {batch_data['with_data']} stocks")
-            logger.info(f"No Data/Missing: {batch_data['no_data']} stocks")
-        logger.info(f"Undervalued: {batch_data['undervalued']} stocks")
-        logger.info(f"Fair Value: {batch_data['fair']} stocks")
-        logger.info(f"Overvalued: {batch_data['overvalued']} stocks")
-        logger.info(f"Total Found So Far: {len(undervalued_stocks)} undervalued, {len(fair_stocks)} fair")
-        logger.info(f"Cache Status: {stock_count} stocks cached, {len(undervalued_stocks_cache)} undervalued in separate cache")
-        logger.info("=" * 80)
-        
-        # Log all stock details for this batch
-        logger.info(f"\nDETAILED STOCK DATA FOR BATCH {batch_num + 1}:")
-        logger.info("-" * 80)
-        for detail in batch_data['stocks_details']:
-            if detail['has_data']:
-                logger.info(f"{detail['symbol']} | {detail['company_name']} | Price: ${detail['price']:.2f} | DCF: ${detail['dcf']:.2f} | Status: {detail['status']}")
-            else:
-                logger.info(f"{detail['symbol']} | {detail['company_name']} | Price: {detail['price']} | DCF: {detail['dcf']} | Status: {detail['status']}")
-        logger.info("-" * 80)
-        
-        # Validation check - account for skipped stocks
-        expected_count = len(batch_stocks)
-        actual_processed = batch_data['processed'] + batch_data['skipped']
-        if actual_processed != expected_count:
-            logger.warning(f"⚠️  BATCH VALIDATION: Expected {expected_count} stocks, but processed {batch_data['processed']} + skipped {batch_data['skipped']} = {actual_processed} stocks")
-        else:
-            logger.info(f"BATCH VALIDATION: All {expected_count} stocks handled (processed: {batch_data['processed']}, skipped: {batch_data['skipped']})")
-            if batch_data['with_data'] == batch_data['processed']:
-                logger.info(f"DATA VALIDATION: All {batch_data['processed']} processed stocks have complete data")
-            else:
-                logger.warning(f"⚠️  DATA VALIDATION: Only {batch_data['with_data']}/{batch_data['processed']} processed stocks have complete data")
-        
-        print(f"Batch {batch_num + 1}/{total_batches} complete. Processed: {batch_data['processed']}, With Data: {batch_data['with_data']}, Cache saved.")
+        manifest.flush()
+        logger.warning(f"Run {manifest.run_id} interrupted after {processed_counter['value']} stocks "
+                       f"({len(manifest.done)} symbols done in total). Continue with --resume {manifest.run_id}")
+        print(f"\nInterrupted. State saved; continue with: python fetch_undervalued_stocks.py --resume {manifest.run_id}")
+        return None
+    manifest.complete()
+    
+    logger.info(prefetcher.summary())
+    
+    if diff_inputs:
+        kept_rows = incremental_stats['kept_rows']
+        if kept_rows:
+            valuation_rows.append(pd.DataFrame(kept_rows, columns=vector_valuation.RESULT_COLUMNS))
+            for row in kept_rows:
+                other_found[row['Valuation Status']] += 1
+            found_undervalued = len(undervalued_stocks) + other_found['UNDERVALUED']
+            found_fair = len(fair_stocks) + other_found['FAIR']
+        logger.info(f"Incremental: re-classified {incremental_stats['changed']} changed stocks, "
+                    f"kept {incremental_stats['unchanged']} unchanged ({len(kept_rows)} previous results carried over)")
+        print(f"Incremental: {incremental_stats['changed']} changed stocks re-classified, {incremental_stats['unchanged']} unchanged")
+    
+    if prefilter:
+        rejected_desc = ", ".join(f"{reason}: {count}" for reason, count in sorted(prefilter_stats['rejected'].items())) or "none"
+        logger.info(f"Pre-filter: kept {prefilter_stats['kept']} of {total_listed} stocks (rejected by {rejected_desc})")
+        logger.info(f"Pre-filter: saved approximately {prefilter_stats['calls_saved']} per-symbol API calls")
+        print(f"Pre-filter: kept {prefilter_stats['kept']} of {total_listed} stocks, saved ~{prefilter_stats['calls_saved']} API calls")
+        if not prefilter_stats['kept']:
+            logger.error("No stocks left after pre-filter.")
     
     total_time = time.time() - start_time
     final_processed = processed_counter['value']
     logger.info("=" * 80)
     logger.info(f"Analysis complete! Processed {final_processed} stocks in {total_time/60:.1f} minutes")
-    logger.info(f"Found {len(undervalued_stocks)} undervalued stocks")
-    logger.info(f"Found {len(fair_stocks)} fair value stocks")
+    if first_result_time is not None:
+        logger.info(f"Time to first result: {first_result_time:.1f}s, total wall clock: {time.time() - run_start:.1f}s")
+    logger.info(f"Found {found_undervalued} undervalued stocks")
+    logger.info(f"Found {found_fair} fair value stocks")
+    logger.info(fmp_client.rate_limiter.summary())
+    logger.info(fmp_client.concurrency.summary())
+    logger.info(quote_batcher.summary())
+    if REFRESH_EXPIRED:
+        logger.info(f"Refresh: re-fetched expired cache fields - {expired_fields['price']} prices, "
+                    f"{expired_fields['dcf']} DCF values, {expired_fields['profile']} profiles")
     logger.info("=" * 80)
     
     # Combine undervalued and fair stocks only
     all_selected_stocks = undervalued_stocks + fair_stocks
+    if valuation_rows:
+        # Rows from the columnar path are already a DataFrame
+        selected_frames = [pd.DataFrame(all_selected_stocks, columns=vector_valuation.RESULT_COLUMNS)] + valuation_rows
+        selected_frames = [frame for frame in selected_frames if not frame.empty]
+        if selected_frames:
+            all_selected_stocks = pd.concat(selected_frames, ignore_index=True)
+    
+    if incremental:
+        report_changes(previous_results, pd.DataFrame(all_selected_stocks, columns=vector_valuation.RESULT_COLUMNS))
     
     # Create DataFrame and save to CSV
-    if all_selected_stocks:
+    if len(all_selected_stocks):
         df = pd.DataFrame(all_selected_stocks)
         # Sort by valuation status (undervalued first, then fair) then by discount/premium
         df['Status Order'] = df['Valuation Status'].map({'UNDERVALUED': 0, 'FAIR': 1})
@@ -850,7 +1862,7 @@ def find_undervalued_stocks():
         df = df.drop(['Status Order', 'Sort Value'], axis=1)
         
         # Save to CSV
-        output_file = 'stock_valuations.csv'
+        output_file = VALUATIONS_FILE
         try:
             df.to_csv(output_file, index=False, encoding='utf-8')
             logger.info(f"Results saved to {output_file}")
@@ -859,7 +1871,7 @@ def find_undervalued_stocks():
             return None
         
         # Log summary for undervalued stocks
-        if undervalued_stocks:
+        if found_undervalued:
             df_undervalued = df[df['Valuation Status'] == 'UNDERVALUED']
             logger.info("\nTop 10 Undervalued Stocks:")
             logger.info("=" * 80)
@@ -882,7 +1894,7 @@ def find_undervalued_stocks():
             logger.info(f"Min discount: {df_undervalued['Discount %'].min():.2f}%")
         
         # Log summary for fair value stocks
-        if fair_stocks:
+        if found_fair:
             df_fair = df[df['Valuation Status'] == 'FAIR']
             logger.info("\n" + "=" * 80)
             logger.info("Fair Value Stocks Summary:")
@@ -898,26 +1910,29 @@ def find_undervalued_stocks():
             logger.info(f"  {sector}: {count}")
         
         # Save cache before exiting
-        save_cache()
+        save_cache(compact=True)
         save_undervalued_cache()
         
         # Also print to console for immediate visibility
-        stock_count = len([k for k in stock_cache.keys() if not k.startswith('_')])
+        stock_count, undervalued_count, fair_count = cache_counts()
         print("\n" + "=" * 80)
         print(f"\nAnalysis complete!")
-        print(f"Found {len(undervalued_stocks)} undervalued stocks")
-        print(f"Found {len(fair_stocks)} fair value stocks")
+        print(f"Found {found_undervalued} undervalued stocks")
+        print(f"Found {found_fair} fair value stocks")
         print(f"Total: {len(all_selected_stocks)} stocks (undervalued + fair only)")
         print(f"Results saved to {output_file}")
-        print(f"Cache saved to {CACHE_FILE} ({stock_count} stocks cached, {len(stock_cache.get('_fair_stocks', []))} fair in cache)")
-        print(f"Undervalued stocks cache saved to {UNDERVALUED_CACHE_FILE} ({len(undervalued_stocks_cache)} stocks)")
+        if cache_store is not None:
+            print(f"Cache saved to {cache_store.path} ({stock_count} stocks cached, {undervalued_count} undervalued, {fair_count} fair in cache)")
+        else:
+            print(f"Cache saved to {CACHE_FILE} ({stock_count} stocks cached, {fair_count} fair in cache)")
+            print(f"Undervalued stocks cache saved to {UNDERVALUED_CACHE_FILE} ({undervalued_count} stocks)")
         print(f"Log file: logs/fmp_stocks_*.log")
         print("=" * 80)
         
         return df
     else:
         # Save cache even if no results
-        save_cache()
+        save_cache(compact=True)
         save_undervalued_cache()
         logger.warning("No stocks found matching criteria.")
         print("\nNo stocks found matching criteria.")
@@ -925,63 +1940,100 @@ def find_undervalued_stocks():
 
 def validate_api_key():
     """
-    Test the API key by making a simple request.
-    Returns True if valid, False otherwise.
+    Test every configured API key by making a simple request with each.
+    Returns True if all are valid, False otherwise.
     """
-    logger.info("Validating API key...")
-    # Use a simple endpoint to test the API key - using v3 API path format
+    logger.info(f"Validating {len(API_KEYS)} API key(s)...")
+    # Use a simple endpoint to test the API keys - using v3 API path format
     test_url = f"{BASE_URL}/profile/AAPL"
+    # A list, not a generator: report every bad key, not just the first
+    return all([validate_one_key(key, test_url) for key in fmp_client.api_keys()])
+
+def validate_one_key(key, test_url):
+    """
+    Test one pooled API key (an ApiKey from fmp_client.api_keys()).
+    Returns True if valid, False otherwise.
+    """
     test_params = {'apikey': API_KEY}
     
     try:
-        response = requests.get(test_url, params=test_params, timeout=10)
+        response = fmp_client.get(test_url, params=test_params, timeout=10, api_key=key)
         
         if response.status_code == 200:
-            logger.info("API key is valid!")
+            logger.info(f"API key {key.label} is valid! (quota {key.quota} calls/min)")
             return True
         elif response.status_code in [401, 403]:
             try:
                 error_data = response.json()
                 error_msg = error_data.get('Error Message', 'Unknown error')
-                logger.error(f"API key validation failed: {error_msg}")
+                logger.error(f"API key {key.label} validation failed: {error_msg}")
                 print(f"\n❌ API Key Validation Failed!")
                 print(f"Error: {error_msg}")
                 print(f"\nPlease:")
                 print("1. Verify your API key at https://site.financialmodelingprep.com/")
                 print("2. Make sure your API key is active and not expired")
                 print("3. Check that the API key in .env file matches your account")
-                print(f"\nCurrent API key (first 10 chars): {API_KEY[:10]}...")
+                print(f"\nFailing API key: {key.label}")
             except:
-                logger.error(f"API key validation failed with status {response.status_code}")
-                print(f"\n❌ API Key Validation Failed! Status code: {response.status_code}")
+                logger.error(f"API key {key.label} validation failed with status {response.status_code}")
+                print(f"\n❌ API Key Validation Failed for {key.label}! Status code: {response.status_code}")
             return False
+        elif response.status_code == 429:
+            # Valid, but its per-minute quota is already used up (e.g. by another run)
+            logger.warning(f"API key {key.label} is rate-limited at startup: its {key.quota} calls/min "
+                           f"quota may be shared with another run")
+            return True
         else:
-            logger.warning(f"API key validation returned status {response.status_code}")
+            logger.warning(f"API key {key.label} validation returned status {response.status_code}")
             # Might still be valid, just log the warning
             return True
     except Exception as e:
-        logger.error(f"Error validating API key: {e}")
-        print(f"\n⚠️  Could not validate API key: {e}")
+        logger.error(f"Error validating API key {key.label}: {e}")
+        print(f"\n⚠️  Could not validate API key {key.label}: {e}")
         print("Proceeding anyway, but API calls may fail...")
         return True  # Proceed anyway
 
 if __name__ == "__main__":
-    if not API_KEY:
-        logger.error("FMP_API_KEY not found in .env file")
-        print("Error: FMP_API_KEY not found in .env file")
+    parser = argparse.ArgumentParser(description='Find undervalued stocks using FMP DCF values.')
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads',
+                        help='Per-symbol fetch engine: thread pool (default) or asyncio')
+    parser.add_argument('--no-prefilter', action='store_true',
+                        help='Fetch every listed symbol instead of dropping non-USD/non-US/small-cap ones up front')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Re-fetch cached prices, DCF values and profiles older than their TTL (FMP_*_TTL)')
+    parser.add_argument('--resume', nargs='?', const='latest', metavar='RUN_ID',
+                        help='Continue an interrupted run (the latest one, or RUN_ID from run_manifests/)')
+    parser.add_argument('--no-vectorize', action='store_true',
+                        help='Classify every symbol through process_stock instead of one pandas pass over bulk data')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'Re-classify only symbols whose price or DCF moved since the last run and write the changeset to {CHANGES_FILE}')
+    args = parser.parse_args()
+    REFRESH_EXPIRED = args.refresh
+    VECTORIZE = not args.no_vectorize
+    setup_logging()
+    
+    # Let engine modules that import this one share its caches when run as a script
+    sys.modules.setdefault('fetch_undervalued_stocks', sys.modules[__name__])
+    
+    short_keys = [key for key in API_KEYS if len(key) < 10]
+    if not API_KEYS:
+        logger.error("FMP_API_KEY (or FMP_API_KEYS) not found in .env file")
+        print("Error: FMP_API_KEY (or FMP_API_KEYS) not found in .env file")
         print("Please create a .env file with: FMP_API_KEY=your_api_key_here")
         print("\nTo get a free API key, visit: https://site.financialmodelingprep.com/")
-    elif len(API_KEY) < 10:
-        logger.error(f"API key appears to be invalid (too short: {len(API_KEY)} chars)")
+    elif short_keys:
+        logger.error(f"API key appears to be invalid (too short: {len(short_keys[0])} chars)")
         print(f"Error: API key appears to be invalid. Please check your .env file.")
-        print(f"Current key length: {len(API_KEY)} characters")
+        print(f"Current key length: {len(short_keys[0])} characters")
     else:
-        logger.info(f"API Key loaded (length: {len(API_KEY)} chars, starts with: {API_KEY[:5]}...)")
+        for key in API_KEYS:
+            logger.info(f"API Key loaded (length: {len(key)} chars, starts with: {key[:5]}...)")
         
         # Validate API key before proceeding
         if validate_api_key():
             try:
-                find_undervalued_stocks()
+                find_undervalued_stocks(engine=args.engine, prefilter=not args.no_prefilter, resume=args.resume,
+                                        incremental=args.incremental)
             except KeyboardInterrupt:
                 logger.warning("Process interrupted by user")
                 save_cache()  # Save cache before exiting
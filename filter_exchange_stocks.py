@@ -1,20 +1,21 @@
 """
-Script to filter stocks by exchange (NYSE or NASDAQ) from sector-wise Excel files
+Script to filter stocks by exchange (NYSE or NASDAQ) from sector-wise stage files
 and save filtered results to a new folder.
 """
 
 import os
-import pandas as pd
 import logging
 from datetime import datetime
-from pathlib import Path
+
+import stage_io
+import stock_filters
 
 # File paths
 INPUT_FOLDER = 'undervalued_stocks_by_sector'
 OUTPUT_FOLDER = 'undervalued_stocks_by_sector_filtered'
 
-# Allowed exchanges
-ALLOWED_EXCHANGES = ['NYSE', 'NASDAQ', 'Nasdaq', 'nasdaq', 'nyse', 'NYS', 'NSDQ']
+# Allowed exchanges (shared with the pre-filter in fetch_undervalued_stocks.py)
+ALLOWED_EXCHANGES = stock_filters.ALLOWED_EXCHANGES
 
 # Setup logging
 def setup_logging():
@@ -41,62 +42,67 @@ def setup_logging():
     
     return logging.getLogger(__name__)
 
-logger = setup_logging()
+# Handlers are attached by setup_logging when run as a script (or by run_pipeline.py)
+logger = logging.getLogger(__name__)
+
+def find_exchange_column(df):
+    """
+    Name of the exchange column in df (tries the usual spellings, then any
+    column with 'exchange' in its name), or None.
+    """
+    possible_names = ['Exchange', 'exchange', 'EXCHANGE', 'Stock Exchange', 'Stock_Exchange']
+    for col_name in possible_names:
+        if col_name in df.columns:
+            return col_name
+    
+    # Try to find column containing 'exchange' in name (case-insensitive)
+    for col in df.columns:
+        if 'exchange' in str(col).lower():
+            logger.info(f"Found exchange column: {col}")
+            return col
+    return None
+
+def filter_by_exchange(df):
+    """
+    Keep only NYSE or NASDAQ stocks (case-insensitive, handles variations).
+    Returns the filtered DataFrame, or None if df has no exchange column.
+    """
+    exchange_column = find_exchange_column(df)
+    if exchange_column is None:
+        return None
+    return df[stock_filters.exchange_mask(df[exchange_column])]
 
 def filter_stocks_by_exchange(input_file, output_file):
     """
-    Filter stocks from an Excel file to keep only NYSE or NASDAQ stocks.
+    Filter stocks from a stage file to keep only NYSE or NASDAQ stocks.
     
     Args:
-        input_file: Path to input Excel file
-        output_file: Path to output Excel file
+        input_file: Path to input stage file (any format stage_io reads)
+        output_file: Output path without extension (stage_io adds it)
     
     Returns:
         tuple: (total_count, filtered_count, removed_count)
     """
     try:
-        # Read Excel file
-        df = pd.read_excel(input_file, engine='openpyxl')
+        df = stage_io.read_stage(input_file)
         total_count = len(df)
         
         if total_count == 0:
             logger.warning(f"Empty file: {input_file}")
             return (0, 0, 0)
         
-        # Check for Exchange column (try different possible column names)
-        exchange_column = None
-        possible_names = ['Exchange', 'exchange', 'EXCHANGE', 'Stock Exchange', 'Stock_Exchange']
-        
-        for col_name in possible_names:
-            if col_name in df.columns:
-                exchange_column = col_name
-                break
-        
-        if exchange_column is None:
-            logger.warning(f"No Exchange column found in {input_file}. Available columns: {list(df.columns)}")
-            # Try to find column containing 'exchange' in name (case-insensitive)
-            for col in df.columns:
-                if 'exchange' in str(col).lower():
-                    exchange_column = col
-                    logger.info(f"Found exchange column: {col}")
-                    break
-        
-        if exchange_column is None:
-            logger.error(f"Cannot find Exchange column in {input_file}. Skipping.")
-            return (total_count, 0, total_count)
-        
         # Filter for NYSE or NASDAQ
-        # Handle case-insensitive matching and variations
-        df_filtered = df[
-            df[exchange_column].astype(str).str.upper().str.contains('NYSE|NASDAQ|NYS|NSDQ', case=False, na=False, regex=True)
-        ]
+        df_filtered = filter_by_exchange(df)
+        if df_filtered is None:
+            logger.error(f"Cannot find Exchange column in {input_file}. Available columns: {list(df.columns)}. Skipping.")
+            return (total_count, 0, total_count)
         
         filtered_count = len(df_filtered)
         removed_count = total_count - filtered_count
         
         # Save filtered results
         if filtered_count > 0:
-            df_filtered.to_excel(output_file, index=False, engine='openpyxl')
+            stage_io.write_stage(df_filtered, output_file)
             logger.info(f"Filtered {input_file}: {total_count} -> {filtered_count} stocks (removed {removed_count})")
         else:
             logger.warning(f"No NYSE/NASDAQ stocks found in {input_file}. File not created.")
@@ -108,7 +114,7 @@ def filter_stocks_by_exchange(input_file, output_file):
         return (0, 0, 0)
 
 def main():
-    """Main function to filter all Excel files by exchange."""
+    """Main function to filter all sector stage files by exchange."""
     print("=" * 80)
     print("Filtering Stocks by Exchange (NYSE/NASDAQ)")
     print("=" * 80)
@@ -126,18 +132,15 @@ def main():
     else:
         print(f"\nUsing existing output folder: {OUTPUT_FOLDER}")
     
-    # Get all Excel files from input folder
-    excel_files = list(Path(INPUT_FOLDER).glob('*.xlsx'))
-    
-    # Exclude summary files
-    excel_files = [f for f in excel_files if not f.name.startswith('_')]
+    # Get all stage files from input folder (summary files are excluded)
+    stage_files = stage_io.list_stage_files(INPUT_FOLDER)
     
-    if len(excel_files) == 0:
-        logger.warning(f"No Excel files found in {INPUT_FOLDER}")
-        print(f"Error: No Excel files found in {INPUT_FOLDER}")
+    if len(stage_files) == 0:
+        logger.warning(f"No stage files found in {INPUT_FOLDER}")
+        print(f"Error: No stage files found in {INPUT_FOLDER}")
         return
     
-    print(f"\nFound {len(excel_files)} Excel files to process")
+    print(f"\nFound {len(stage_files)} files to process")
     print("=" * 80)
     
     # Process each file
@@ -152,10 +155,9 @@ def main():
     print("\nProcessing files...")
     print("-" * 80)
     
-    for excel_file in sorted(excel_files):
-        file_name = excel_file.name
-        input_path = str(excel_file)
-        output_path = os.path.join(OUTPUT_FOLDER, file_name)
+    for input_path in stage_files:
+        file_name = os.path.basename(input_path)
+        output_path = os.path.join(OUTPUT_FOLDER, os.path.splitext(file_name)[0])
         
         print(f"\nProcessing: {file_name}")
         
@@ -208,5 +210,6 @@ def main():
     print("=" * 80)
 
 if __name__ == '__main__':
+    setup_logging()
     main()
 
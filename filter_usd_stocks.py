@@ -1,17 +1,129 @@
 """
-Script to filter stocks with USD currency, remove duplicates, and save to Excel.
+Script to filter stocks with USD currency, remove duplicates, and save the
+result as a stage file (Parquet by default, see stage_io.py).
 Uses multi-threading for faster processing if needed.
 """
 
-import pandas as pd
-import os
 from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 import time
 
-# File paths
-INPUT_EXCEL_FILE = 'undervalued_stocks_with_regions_cleaned.xlsx'
-OUTPUT_EXCEL_FILE = 'undervalued_stocks_usd_filtered.xlsx'
+import stage_io
+import stock_filters
+
+# Stage files (stage_io adds the extension)
+INPUT_FILE = 'undervalued_stocks_with_regions_cleaned'
+OUTPUT_FILE = 'undervalued_stocks_usd_filtered'
+
+def filter_usd_frame(df):
+    """
+    Keep USD stocks from the US (see stock_filters.py), remove duplicate
+    symbols and sort by discount.
+    Returns (filtered DataFrame or None, row counts after each filter).
+    """
+    counts = {'original': len(df)}
+    
+    # Check if required columns exist
+    if 'Currency' not in df.columns:
+        print("Error: 'Currency' column not found in the input file.")
+        print(f"Available columns: {list(df.columns)}")
+        return None, counts
+    
+    if 'Symbol' not in df.columns:
+        print("Error: 'Symbol' column not found in the input file.")
+        return None, counts
+    
+    # Step 1: Filter for USD currency and US country
+    print("\n" + "=" * 80)
+    print("Step 1: Filtering for USD currency and US country...")
+    print("=" * 80)
+    
+    # Get currency value counts before filtering
+    currency_counts = df['Currency'].value_counts()
+    print(f"\nCurrency distribution (top 10):")
+    for currency, count in currency_counts.head(10).items():
+        print(f"  {currency}: {count} stocks")
+    
+    # Get country value counts before filtering
+    if 'Country' in df.columns:
+        country_counts = df['Country'].value_counts()
+        print(f"\nCountry distribution (top 10):")
+        for country, count in country_counts.head(10).items():
+            print(f"  {country}: {count} stocks")
+    
+    # Filter for USD (case-insensitive, handle variations)
+    df_usd = df[stock_filters.usd_mask(df['Currency'])]
+    counts['usd'] = len(df_usd)
+    
+    print(f"\nAfter USD currency filter: {len(df_usd)} rows (from {len(df)} rows)")
+    print(f"Removed {len(df) - len(df_usd)} non-USD stocks")
+    
+    if len(df_usd) == 0:
+        print("\nNo USD stocks found. Exiting.")
+        return None, counts
+    
+    # Filter for US country (case-insensitive, handle variations)
+    if 'Country' in df_usd.columns:
+        df_usd_us = df_usd[stock_filters.us_mask(df_usd['Country'])]
+        
+        print(f"\nAfter US country filter: {len(df_usd_us)} rows (from {len(df_usd)} rows)")
+        print(f"Removed {len(df_usd) - len(df_usd_us)} non-US stocks")
+        
+        if len(df_usd_us) == 0:
+            print("\nNo US stocks found. Exiting.")
+            return None, counts
+        
+        df_filtered = df_usd_us
+    else:
+        print("\nWarning: 'Country' column not found. Skipping country filter.")
+        df_filtered = df_usd
+    counts['us'] = len(df_filtered)
+    
+    # Step 2: Remove duplicates based on Symbol
+    print("\n" + "=" * 80)
+    print("Step 2: Removing duplicates based on Symbol...")
+    print("=" * 80)
+    
+    # Count duplicates before removal
+    duplicate_count = df_filtered.duplicated(subset=['Symbol']).sum()
+    unique_count = df_filtered['Symbol'].nunique()
+    
+    print(f"\nDuplicate Analysis:")
+    print(f"  Total rows: {len(df_filtered)}")
+    print(f"  Unique tickers: {unique_count}")
+    print(f"  Duplicate rows to remove: {duplicate_count}")
+    
+    if duplicate_count == 0:
+        print("\nNo duplicates found. All tickers are unique!")
+        df_final = df_filtered
+    else:
+        # Remove duplicates, keeping the first occurrence
+        print("\nRemoving duplicates (keeping first occurrence of each ticker)...")
+        df_final = df_filtered.drop_duplicates(subset=['Symbol'], keep='first')
+        
+        removed_count = len(df_filtered) - len(df_final)
+        print(f"Removed {removed_count} duplicate row(s)")
+        
+        # Show which symbols had duplicates
+        duplicates = df_filtered[df_filtered.duplicated(subset=['Symbol'], keep=False)]['Symbol'].unique()
+        print(f"\nSymbols that had duplicates ({len(duplicates)}):")
+        for symbol in sorted(duplicates)[:20]:  # Show first 20
+            count = len(df_filtered[df_filtered['Symbol'] == symbol])
+            print(f"  {symbol}: {count} occurrences (kept 1, removed {count-1})")
+        if len(duplicates) > 20:
+            print(f"  ... and {len(duplicates) - 20} more")
+    
+    # Step 3: Sort and prepare final dataframe
+    print("\n" + "=" * 80)
+    print("Step 3: Preparing final data...")
+    print("=" * 80)
+    
+    # Sort by discount percentage (highest first) if available
+    if 'Discount %' in df_final.columns:
+        df_final = df_final.sort_values('Discount %', ascending=False)
+        print("Sorted by Discount % (highest first)")
+    
+    return df_final, counts
 
 def filter_usd_stocks():
     """
@@ -22,138 +134,37 @@ def filter_usd_stocks():
     print("=" * 80)
     
     # Check if input file exists
-    if not os.path.exists(INPUT_EXCEL_FILE):
-        print(f"Error: Input file not found: {INPUT_EXCEL_FILE}")
+    input_file = stage_io.find_stage(INPUT_FILE)
+    if input_file is None:
+        print(f"Error: Input file not found: {stage_io.stage_path(INPUT_FILE)}")
         return None
     
-    print(f"Reading Excel file: {INPUT_EXCEL_FILE}")
+    print(f"Reading file: {input_file}")
     start_time = time.time()
     
     try:
-        # Read the Excel file
-        df = pd.read_excel(INPUT_EXCEL_FILE, engine='openpyxl')
+        df = stage_io.read_stage(input_file)
         
         read_time = time.time() - start_time
         print(f"File read in {read_time:.2f} seconds")
         print(f"Original file contains {len(df)} rows")
         print(f"Columns: {list(df.columns)}")
         
-        # Check if required columns exist
-        if 'Currency' not in df.columns:
-            print("Error: 'Currency' column not found in the Excel file.")
-            print(f"Available columns: {list(df.columns)}")
-            return None
-        
-        if 'Symbol' not in df.columns:
-            print("Error: 'Symbol' column not found in the Excel file.")
+        df_final, counts = filter_usd_frame(df)
+        if df_final is None:
             return None
         
-        # Step 1: Filter for USD currency and US country
-        print("\n" + "=" * 80)
-        print("Step 1: Filtering for USD currency and US country...")
-        print("=" * 80)
-        
-        # Get currency value counts before filtering
-        currency_counts = df['Currency'].value_counts()
-        print(f"\nCurrency distribution (top 10):")
-        for currency, count in currency_counts.head(10).items():
-            print(f"  {currency}: {count} stocks")
-        
-        # Get country value counts before filtering
-        if 'Country' in df.columns:
-            country_counts = df['Country'].value_counts()
-            print(f"\nCountry distribution (top 10):")
-            for country, count in country_counts.head(10).items():
-                print(f"  {country}: {count} stocks")
-        
-        # Filter for USD (case-insensitive, handle variations)
-        usd_variations = ['USD', 'usd', 'Usd', 'US Dollar', 'US$', '$']
-        df_usd = df[df['Currency'].isin(usd_variations) | 
-                    df['Currency'].str.contains('USD', case=False, na=False) |
-                    df['Currency'].str.contains('US Dollar', case=False, na=False)]
-        
-        print(f"\nAfter USD currency filter: {len(df_usd)} rows (from {len(df)} rows)")
-        print(f"Removed {len(df) - len(df_usd)} non-USD stocks")
-        
-        if len(df_usd) == 0:
-            print("\nNo USD stocks found. Exiting.")
-            return None
-        
-        # Filter for US country (case-insensitive, handle variations)
-        if 'Country' in df_usd.columns:
-            us_variations = ['US', 'us', 'Us', 'USA', 'usa', 'U.S.', 'U.S.A.', 'United States', 'United States of America']
-            df_usd_us = df_usd[df_usd['Country'].isin(us_variations) | 
-                              df_usd['Country'].str.contains('United States', case=False, na=False) |
-                              df_usd['Country'].str.contains('USA', case=False, na=False) |
-                              df_usd['Country'].str.contains('US', case=False, na=False)]
-            
-            print(f"\nAfter US country filter: {len(df_usd_us)} rows (from {len(df_usd)} rows)")
-            print(f"Removed {len(df_usd) - len(df_usd_us)} non-US stocks")
-            
-            if len(df_usd_us) == 0:
-                print("\nNo US stocks found. Exiting.")
-                return None
-            
-            df_filtered = df_usd_us
-        else:
-            print("\nWarning: 'Country' column not found. Skipping country filter.")
-            df_filtered = df_usd
-        
-        # Step 2: Remove duplicates based on Symbol
-        print("\n" + "=" * 80)
-        print("Step 2: Removing duplicates based on Symbol...")
-        print("=" * 80)
-        
-        # Count duplicates before removal
-        duplicate_count = df_filtered.duplicated(subset=['Symbol']).sum()
-        unique_count = df_filtered['Symbol'].nunique()
-        
-        print(f"\nDuplicate Analysis:")
-        print(f"  Total rows: {len(df_filtered)}")
-        print(f"  Unique tickers: {unique_count}")
-        print(f"  Duplicate rows to remove: {duplicate_count}")
-        
-        if duplicate_count == 0:
-            print("\nNo duplicates found. All tickers are unique!")
-            df_final = df_filtered
-        else:
-            # Remove duplicates, keeping the first occurrence
-            print("\nRemoving duplicates (keeping first occurrence of each ticker)...")
-            df_final = df_filtered.drop_duplicates(subset=['Symbol'], keep='first')
-            
-            removed_count = len(df_filtered) - len(df_final)
-            print(f"Removed {removed_count} duplicate row(s)")
-            
-            # Show which symbols had duplicates
-            duplicates = df_filtered[df_filtered.duplicated(subset=['Symbol'], keep=False)]['Symbol'].unique()
-            print(f"\nSymbols that had duplicates ({len(duplicates)}):")
-            for symbol in sorted(duplicates)[:20]:  # Show first 20
-                count = len(df_filtered[df_filtered['Symbol'] == symbol])
-                print(f"  {symbol}: {count} occurrences (kept 1, removed {count-1})")
-            if len(duplicates) > 20:
-                print(f"  ... and {len(duplicates) - 20} more")
-        
-        # Step 3: Sort and prepare final dataframe
-        print("\n" + "=" * 80)
-        print("Step 3: Preparing final data...")
-        print("=" * 80)
-        
-        # Sort by discount percentage (highest first) if available
-        if 'Discount %' in df_final.columns:
-            df_final = df_final.sort_values('Discount %', ascending=False)
-            print("Sorted by Discount % (highest first)")
-        
-        # Step 4: Save to Excel
+        # Step 4: Save the stage file
         print("\n" + "=" * 80)
-        print("Step 4: Saving to Excel...")
+        print("Step 4: Saving results...")
         print("=" * 80)
         
         save_start = time.time()
-        df_final.to_excel(OUTPUT_EXCEL_FILE, index=False, engine='openpyxl')
+        output_file = stage_io.write_stage(df_final, OUTPUT_FILE)
         save_time = time.time() - save_start
         
         print(f"File saved in {save_time:.2f} seconds")
-        print(f"Output file: {OUTPUT_EXCEL_FILE}")
+        print(f"Output file: {output_file}")
         
         # Final Summary
         total_time = time.time() - start_time
@@ -161,9 +172,9 @@ def filter_usd_stocks():
         print("Summary:")
         print("=" * 80)
         print(f"  Original rows: {len(df)}")
-        print(f"  After USD currency filter: {len(df_usd) if 'df_usd' in locals() else 'N/A'} rows")
+        print(f"  After USD currency filter: {counts['usd']} rows")
         if 'Country' in df.columns:
-            print(f"  After US country filter: {len(df_filtered) if 'df_filtered' in locals() else 'N/A'} rows")
+            print(f"  After US country filter: {counts['us']} rows")
         print(f"  After duplicate removal: {len(df_final)} rows")
         print(f"  Total removed: {len(df) - len(df_final)} rows")
         print(f"  Final unique USD/US stocks: {len(df_final)}")
@@ -189,13 +200,13 @@ def filter_usd_stocks():
             print(f"    Minimum: {min_discount:.2f}%")
         
         print(f"\n  Processing time: {total_time:.2f} seconds")
-        print(f"  Output file: {OUTPUT_EXCEL_FILE}")
+        print(f"  Output file: {output_file}")
         print("=" * 80)
         
         return df_final
         
     except FileNotFoundError:
-        print(f"Error: File not found: {INPUT_EXCEL_FILE}")
+        print(f"Error: File not found: {input_file}")
         return None
     except Exception as e:
         print(f"Error processing file: {e}")
@@ -212,16 +223,16 @@ def filter_usd_stocks_parallel():
     print("Filtering USD Stocks (Parallel Processing)")
     print("=" * 80)
     
-    if not os.path.exists(INPUT_EXCEL_FILE):
-        print(f"Error: Input file not found: {INPUT_EXCEL_FILE}")
+    input_file = stage_io.find_stage(INPUT_FILE)
+    if input_file is None:
+        print(f"Error: Input file not found: {stage_io.stage_path(INPUT_FILE)}")
         return None
     
-    print(f"Reading Excel file: {INPUT_EXCEL_FILE}")
+    print(f"Reading file: {input_file}")
     start_time = time.time()
     
     try:
-        # Read the Excel file
-        df = pd.read_excel(INPUT_EXCEL_FILE, engine='openpyxl')
+        df = stage_io.read_stage(input_file)
         
         print(f"Original file contains {len(df)} rows")
         
@@ -230,10 +241,7 @@ def filter_usd_stocks_parallel():
             return None
         
         # Filter for USD currency (vectorized operation - already fast)
-        usd_variations = ['USD', 'usd', 'Usd', 'US Dollar', 'US$', '$']
-        df_usd = df[df['Currency'].isin(usd_variations) | 
-                    df['Currency'].str.contains('USD', case=False, na=False) |
-                    df['Currency'].str.contains('US Dollar', case=False, na=False)]
+        df_usd = df[stock_filters.usd_mask(df['Currency'])]
         
         print(f"Filtered to USD: {len(df_usd)} rows")
         
@@ -243,11 +251,7 @@ def filter_usd_stocks_parallel():
         
         # Filter for US country
         if 'Country' in df_usd.columns:
-            us_variations = ['US', 'us', 'Us', 'USA', 'usa', 'U.S.', 'U.S.A.', 'United States', 'United States of America']
-            df_filtered = df_usd[df_usd['Country'].isin(us_variations) | 
-                                df_usd['Country'].str.contains('United States', case=False, na=False) |
-                                df_usd['Country'].str.contains('USA', case=False, na=False) |
-                                df_usd['Country'].str.contains('US', case=False, na=False)]
+            df_filtered = df_usd[stock_filters.us_mask(df_usd['Country'])]
             print(f"Filtered to US country: {len(df_filtered)} rows")
             
             if len(df_filtered) == 0:
@@ -266,12 +270,11 @@ def filter_usd_stocks_parallel():
         if 'Discount %' in df_final.columns:
             df_final = df_final.sort_values('Discount %', ascending=False)
         
-        # Save to Excel
-        df_final.to_excel(OUTPUT_EXCEL_FILE, index=False, engine='openpyxl')
+        output_file = stage_io.write_stage(df_final, OUTPUT_FILE)
         
         total_time = time.time() - start_time
         print(f"\nCompleted in {total_time:.2f} seconds")
-        print(f"Output saved to: {OUTPUT_EXCEL_FILE}")
+        print(f"Output saved to: {output_file}")
         
         return df_final
         
@@ -0,0 +1,203 @@
+"""
+Shared HTTP client for all FMP API calls.
+Keeps one pooled, keep-alive connection pool per host so the per-symbol
+requests made by the fetch scripts reuse TCP/TLS connections instead of
+opening a new one for every call. Every call draws from the token
+bucket of one API key in a shared key pool (see key_pool.py and
+rate_limiter.py), which also sets the request's apikey. By default each
+key's bucket lives in a file shared by every process on the host, so
+scripts that run at the same time stay within one FMP per-minute
+allowance per key together. Requests in flight are capped by an
+adaptive (AIMD) limit, see concurrency_limiter.py.
+"""
+
+import getpass
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+import concurrency_limiter
+from concurrency_limiter import AdaptiveConcurrency
+from key_pool import KeyPool
+from rate_limiter import SharedTokenBucket, TokenBucket, parse_retry_after
+
+# Imported before the scripts load their .env, so load it here for the settings below
+load_dotenv()
+
+# Connection pool configuration
+POOL_SIZE = 20  # Default only; the fetch scripts configure() one connection per worker (CONCURRENCY_MAX)
+POOL_CONNECTIONS = 4  # Number of distinct hosts to keep pools for
+REQUEST_TIMEOUT = 30  # Default request timeout (seconds)
+
+# Rate limiting configuration
+CALLS_PER_MINUTE = int(os.getenv('FMP_CALLS_PER_MINUTE', '3000'))  # Match the FMP plan (per key, see key_pool.py)
+RATE_LIMIT_RETRIES = 3  # Retries after a 429 before giving up
+SHARED_RATE_LIMIT = os.getenv('FMP_SHARED_RATE_LIMIT', '1') != '0'  # 0 = per-process budget only
+RATE_BUDGET_USER = str(os.getuid()) if hasattr(os, 'getuid') else getpass.getuser()  # Budget files are per user
+RATE_BUDGET_FILE = os.getenv('FMP_RATE_BUDGET_FILE', os.path.join(
+    tempfile.gettempdir(), f"fmp_rate_budget_{RATE_BUDGET_USER}.bin"))  # One per key
+
+# Concurrency configuration (requests in flight, see concurrency_limiter.py)
+ADAPTIVE_CONCURRENCY = os.getenv('FMP_ADAPTIVE_CONCURRENCY', '1') != '0'  # 0 = fixed at CONCURRENCY_START
+CONCURRENCY_START = int(os.getenv('FMP_CONCURRENCY_START', '20'))  # Initial limit (the old fixed MAX_WORKERS)
+CONCURRENCY_MAX = int(os.getenv('FMP_CONCURRENCY_MAX', '64'))  # Upper bound; the fetch scripts start this many threads
+
+DEFAULT_HEADERS = {
+    'Accept': 'application/json',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+_adapter = None
+_adapter_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def make_rate_limiter(calls_per_minute, api_key=None):
+    """
+    Host-wide SharedTokenBucket for api_key (RATE_BUDGET_FILE with a hash of
+    the key in its name), or a per-process TokenBucket with FMP_SHARED_RATE_LIMIT=0.
+    """
+    if SHARED_RATE_LIMIT:
+        path = RATE_BUDGET_FILE
+        if api_key:
+            base, extension = os.path.splitext(path)
+            path = f"{base}_{hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:10]}{extension}"
+        return SharedTokenBucket(calls_per_minute, path)
+    return TokenBucket(calls_per_minute)
+
+
+# Shared by every worker thread and the async engine (and, by default, other processes):
+# a KeyPool with one token bucket per API key
+rate_limiter = KeyPool(make_rate_limiter, CALLS_PER_MINUTE)
+
+# Shared by every worker thread: AIMD limit on requests in flight
+concurrency = AdaptiveConcurrency('threads', CONCURRENCY_START, maximum=CONCURRENCY_MAX, adaptive=ADAPTIVE_CONCURRENCY)
+
+
+def configure(pool_size=POOL_SIZE, calls_per_minute=None):
+    """
+    Size the shared connection pool and optionally reset the rate limit.
+    Should be called once at startup with the script's MAX_WORKERS, before
+    any requests are made. Existing sessions keep the old adapter.
+    """
+    global _adapter, rate_limiter
+    with _adapter_lock:
+        _adapter = _build_adapter(pool_size)
+        if calls_per_minute is not None:
+            rate_limiter = KeyPool(make_rate_limiter, calls_per_minute)
+
+
+def _build_adapter(pool_size):
+    """
+    Create an HTTPAdapter with a bounded per-host pool.
+    pool_block=True makes threads wait for a free connection instead of
+    opening throwaway connections beyond the limit.
+    """
+    return HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=pool_size,
+        pool_block=True,
+        max_retries=0
+    )
+
+
+def _get_adapter():
+    global _adapter
+    if _adapter is None:
+        with _adapter_lock:
+            if _adapter is None:
+                _adapter = _build_adapter(POOL_SIZE)
+    return _adapter
+
+
+def get_session():
+    """
+    Return the calling thread's session.
+    requests.Session is not guaranteed to be thread-safe, so each thread
+    gets its own Session object, but all of them share one HTTPAdapter and
+    therefore one urllib3 connection pool (which is thread-safe).
+    """
+    session = getattr(_thread_local, 'session', None)
+    adapter = _get_adapter()
+    if session is None or getattr(_thread_local, 'adapter', None) is not adapter:
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _thread_local.session = session
+        _thread_local.adapter = adapter
+    return session
+
+
+def response_outcome(status_code):
+    """Concurrency feedback for a response status (see concurrency_limiter.py)."""
+    if status_code == 429:
+        return concurrency_limiter.RATE_LIMITED
+    if status_code >= 500:
+        return concurrency_limiter.ERROR
+    return concurrency_limiter.OK
+
+
+def api_keys():
+    """The ApiKeys of the shared key pool (FMP_API_KEYS, or FMP_API_KEY)."""
+    return rate_limiter.api_keys()
+
+
+def get(url, params=None, timeout=REQUEST_TIMEOUT, rate_limit_retries=RATE_LIMIT_RETRIES, stream=False,
+        api_key=None):
+    """
+    Drop-in replacement for requests.get that goes through the shared pool,
+    the shared rate limiter and the adaptive concurrency limit.
+    The apikey param is set to the key the request's token came from (with
+    no key configured, the caller's apikey is kept).
+    A 429 response pauses that key's bucket for Retry-After and is retried
+    up to rate_limit_retries times, and so is a 401/403 the key pool wants
+    retried with another key (see KeyPool.on_response). The last response
+    is returned either way, with the ApiKey it was sent with as
+    response.api_key. Passing api_key (an ApiKey from api_keys()) sends
+    the request with that key only, e.g. to validate each key at startup.
+    With stream=True the body is not read up front (see bulk_stream.py);
+    the caller must consume or close the response to free the connection.
+    """
+    session = get_session()
+    params = dict(params) if params else {}
+    failed_key = None  # Key the previous attempt was told to switch away from
+    for attempt in range(rate_limit_retries + 1):
+        # Take the concurrency slot first so at most limit callers hold token reservations
+        slot = concurrency.acquire()
+        outcome, network_time = concurrency_limiter.ERROR, 0.0
+        try:
+            key = rate_limiter.acquire(exclude=failed_key, only=api_key)
+            if key.value:
+                params['apikey'] = key.value
+            start = time.monotonic()
+            try:
+                response = session.get(url, params=params, timeout=timeout, stream=stream)
+                outcome = response_outcome(response.status_code)
+            except requests.exceptions.Timeout:
+                outcome = concurrency_limiter.TIMEOUT
+                raise
+            finally:
+                network_time = time.monotonic() - start
+                rate_limiter.record_network_time(key, network_time)
+        finally:
+            # Also when taking a token fails, or the slot would be lost for the rest of the run
+            concurrency.release(slot, outcome, network_time)
+        
+        response.api_key = key
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if response.status_code == 429 else None
+        switch_key = rate_limiter.on_response(key, response.status_code, retry_after) and api_key is None
+        if response.status_code != 429 and not switch_key:
+            return response
+        failed_key = key if switch_key else None
+        
+        if stream and attempt < rate_limit_retries:
+            response.close()
+    return response
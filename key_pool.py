@@ -0,0 +1,249 @@
+"""
+Pool of FMP API keys, each with its own per-minute quota and token bucket.
+Keys come from FMP_API_KEYS (comma-separated, each optionally key:calls_per_minute),
+or the single FMP_API_KEY. Every request takes its token from the key
+that can serve it soonest, so aggregate throughput scales with the number
+of keys. A key is taken out of rotation after KEY_MAX_AUTH_FAILURES
+401/403 responses in a row, and for KEY_COOLDOWN seconds after
+KEY_MAX_CONSECUTIVE_429 429s in a row; the last usable key is never
+taken out. summary() reports per-key usage for the end of a run.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+KEY_MAX_AUTH_FAILURES = int(os.getenv('FMP_KEY_MAX_AUTH_FAILURES', '3'))  # 401/403s in a row before a key is dropped
+KEY_MAX_CONSECUTIVE_429 = int(os.getenv('FMP_KEY_MAX_429', '5'))  # 429s in a row before a key is rested
+KEY_COOLDOWN = float(os.getenv('FMP_KEY_COOLDOWN', '60'))  # How long a rested key stays out of rotation (seconds)
+
+
+def parse_keys(value, default_quota):
+    """
+    Parse 'key1,key2:600' into [(key, calls_per_minute)], skipping blanks and duplicates.
+    Raises ValueError if a quota is not a positive integer.
+    """
+    keys = {}
+    for item in (value or '').split(','):
+        key, _, quota = item.strip().partition(':')
+        key = key.strip()
+        if key and key not in keys:
+            quota = quota.strip()
+            if quota and not (quota.isdigit() and int(quota) > 0):
+                label = ApiKey(key, 0, None).label
+                raise ValueError(f"Invalid quota {quota!r} for API key {label} in FMP_API_KEYS: "
+                                 f"expected a positive number of calls per minute (key:600)")
+            keys[key] = int(quota) if quota else default_quota
+    return list(keys.items())
+
+
+def configured_keys():
+    """The FMP_API_KEYS setting, or the single FMP_API_KEY."""
+    return os.getenv('FMP_API_KEYS') or os.getenv('FMP_API_KEY')
+
+
+def configured_key_values():
+    """The configured API keys without their quotas, in order (empty if none is set)."""
+    return [key for key, _ in parse_keys(configured_keys(), 0)]
+
+
+class ApiKey:
+    """One API key, its token bucket and its usage for the end-of-run report."""
+
+    def __init__(self, value, quota, limiter):
+        self.value = value  # None when no key is configured (requests keep the caller's apikey param)
+        self.quota = quota
+        self.limiter = limiter
+        self.calls = 0
+        self.rate_limited = 0
+        self.auth_failures = 0
+        self.consecutive_429 = 0
+        self.consecutive_auth_failures = 0
+        self.cooldown_until = 0.0
+        self.due = 0.0  # When the last token taken from this key is due (monotonic), as the pool last saw it
+        self.disabled = None  # Reason, once the key is out of rotation for good
+
+    @property
+    def label(self):
+        if not self.value:
+            return '(no key)'
+        return f"{self.value[:4]}...{self.value[-2:]}" if len(self.value) > 8 else '****'
+
+
+class KeyPool:
+    """
+    Hands out API keys with a token taken from their bucket, and takes keys
+    out of rotation on auth failures or sustained 429s.
+    Keys are read from the environment on first use, after the scripts
+    have loaded their .env file; the setting is also parsed up front so a
+    malformed quota fails at startup rather than at the first request.
+    The key is chosen from what the pool itself last saw of each bucket
+    (ApiKey.due), so a shared bucket's file is only read and locked for the
+    chosen key, outside the pool lock.
+    """
+
+    def __init__(self, make_limiter, default_quota):
+        self.make_limiter = make_limiter  # make_limiter(calls_per_minute, api_key) -> TokenBucket
+        self.default_quota = default_quota
+        self.keys = None
+        self.lock = threading.Lock()
+        parse_keys(configured_keys(), default_quota)
+
+    def _ensure_keys(self):
+        if self.keys is None:
+            with self.lock:
+                if self.keys is None:
+                    parsed = parse_keys(configured_keys(), self.default_quota)
+                    keys = [ApiKey(key, quota, self.make_limiter(quota, key)) for key, quota in parsed]
+                    if not keys:
+                        keys = [ApiKey(None, self.default_quota, self.make_limiter(self.default_quota, None))]
+                    elif len(keys) > 1:
+                        logger.info(f"API key pool: {len(keys)} keys, "
+                                    f"{sum(key.quota for key in keys)} calls/minute in total")
+                    self.keys = keys
+        return self.keys
+
+    def _usable(self, now):
+        return [key for key in self.keys if key.disabled is None and key.cooldown_until <= now]
+
+    def _reserve(self, exclude=None):
+        """
+        Pick the key that can serve a request soonest and take a token from it,
+        avoiding exclude (a key that just failed) while another key is usable.
+        Returns (key, wait).
+        """
+        self._ensure_keys()
+        with self.lock:
+            now = time.monotonic()
+            usable = self._usable(now)
+            if exclude is not None and any(key is not exclude for key in usable):
+                usable = [key for key in usable if key is not exclude]
+            if usable:
+                # A zero (unlimited) quota counts as unused
+                key = min(usable, key=lambda k: (max(0.0, k.due - now), k.calls / k.quota if k.quota else 0))
+                cooldown = 0.0
+            else:
+                # Every remaining key is resting: use the one back soonest
+                key = min((k for k in self.keys if k.disabled is None), key=lambda k: k.cooldown_until)
+                cooldown = key.cooldown_until - now
+            key.calls += 1
+        wait = key.limiter.reserve()
+        with self.lock:
+            key.due = max(key.due, time.monotonic() + wait)
+        return key, max(wait, cooldown)
+
+    def api_keys(self):
+        """Every configured ApiKey, including those out of rotation."""
+        return list(self._ensure_keys())
+
+    def acquire(self, exclude=None, only=None):
+        """
+        Block until some key (other than exclude, if possible) has a token,
+        or until only has one if given. Returns that ApiKey.
+        """
+        if only is not None:
+            return self._acquire_only(only)
+        key, wait = self._reserve(exclude)
+        key.limiter.wait_for(wait)
+        return key
+
+    def _acquire_only(self, key):
+        wait = key.limiter.reserve()
+        with self.lock:
+            key.calls += 1
+            key.due = max(key.due, time.monotonic() + wait)
+        key.limiter.wait_for(wait)
+        return key
+
+    async def acquire_async(self, exclude=None):
+        """Asyncio version of acquire()."""
+        key, wait = self._reserve(exclude)
+        await key.limiter.wait_for_async(wait)
+        return key
+
+    def record_network_time(self, key, seconds):
+        key.limiter.record_network_time(seconds)
+
+    def on_response(self, key, status_code, retry_after=None):
+        """
+        Feed a response status back to the key's bucket and rotation state.
+        Returns True if a 401/403 should be retried with another key: the
+        key was rejected (401) or is out of rotation (possibly taken out by
+        a concurrent request), and another key is still usable.
+        """
+        pause = key.limiter.on_rate_limited(retry_after) if status_code == 429 else None
+        if pause is None:
+            key.limiter.on_success()
+        with self.lock:
+            if status_code == 429:
+                key.due = max(key.due, time.monotonic() + pause)
+                key.rate_limited += 1
+                key.consecutive_429 += 1
+                if key.consecutive_429 >= KEY_MAX_CONSECUTIVE_429 and self._others_usable(key):
+                    key.cooldown_until = time.monotonic() + KEY_COOLDOWN
+                    key.consecutive_429 = 0
+                    logger.warning(f"API key {key.label}: {KEY_MAX_CONSECUTIVE_429} rate-limited responses in a row, "
+                                   f"out of rotation for {KEY_COOLDOWN:.0f}s")
+                return False
+            key.consecutive_429 = 0
+            if status_code not in (401, 403):
+                key.consecutive_auth_failures = 0
+                return False
+            key.auth_failures += 1
+            key.consecutive_auth_failures += 1
+            if (key.disabled is None and key.consecutive_auth_failures >= KEY_MAX_AUTH_FAILURES
+                    and self._others_usable(key)):
+                key.disabled = f"HTTP {status_code}"
+                logger.error(f"API key {key.label} taken out of rotation after {key.consecutive_auth_failures} "
+                             f"HTTP {status_code} responses in a row")
+            # A 403 on a key still in rotation is more likely the endpoint (not in the plan) than the key
+            return self._others_usable(key) and (key.disabled is not None or status_code == 401)
+
+    def _others_usable(self, key):
+        # Called with self.lock held
+        return any(other is not key and other.disabled is None for other in self.keys)
+
+    @property
+    def calls_per_minute(self):
+        keys = [key for key in self._ensure_keys() if key.disabled is None]
+        return sum(key.limiter.calls_per_minute for key in keys)
+
+    def stats(self):
+        """Token bucket statistics summed over all keys."""
+        totals = {}
+        for key in self._ensure_keys():
+            for name, value in key.limiter.stats().items():
+                if name != 'calls_per_minute':
+                    totals[name] = totals.get(name, 0) + value
+        totals['calls_per_minute'] = self.calls_per_minute
+        return totals
+
+    def usage_lines(self):
+        """One line per key: calls, 429s, auth failures and rotation state."""
+        now = time.monotonic()
+        lines = []
+        for key in self._ensure_keys():
+            if key.disabled is not None:
+                state = f"out of rotation ({key.disabled})"
+            elif key.cooldown_until > now:
+                state = f"resting {key.cooldown_until - now:.0f}s"
+            else:
+                state = 'active'
+            lines.append(f"  {key.label:<12} {key.calls:7d} calls  {key.rate_limited:5d} x 429  "
+                         f"{key.auth_failures:4d} x 401/403  quota {key.quota}/min  {state}")
+        return lines
+
+    def summary(self):
+        """Rate limiter summary; with several keys, followed by one line per key."""
+        keys = self._ensure_keys()
+        if len(keys) == 1:
+            return keys[0].limiter.summary()
+        s = self.stats()
+        return "\n".join(
+            [f"Rate limiter: {s['calls']} calls over {len(keys)} API keys, {s['rate_limited']} rate-limited (429), "
+             f"{s['token_wait_time']:.1f}s waiting for tokens, {s['network_time']:.1f}s waiting on network "
+             f"(cumulative across workers), current rate {s['calls_per_minute']:.0f} calls/min", "API key usage:"]
+            + self.usage_lines())
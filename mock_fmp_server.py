@@ -0,0 +1,271 @@
+"""
+Local mock of the FMP v3 API used for benchmarks.
+Serves deterministic fake data for the endpoints the fetch scripts use, over
+HTTP/1.1 with keep-alive and optional gzip, so client-side changes can be
+measured without spending API quota.
+
+Usage:
+    python mock_fmp_server.py --port 8765 --symbols 5000 --latency 0.005
+    python mock_fmp_server.py --latency 0.05 --capacity 30  (latency builds up past 30 requests in flight)
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+API_PREFIX = '/api/v3'
+PROFILE_BULK_PART_SIZE = 1000
+BULK_PATHS = ('/stock/list', '/dcf-bulk', '/profile-bulk')
+
+SECTORS = ['Technology', 'Healthcare', 'Financial Services', 'Energy', 'Industrials',
+           'Consumer Cyclical', 'Consumer Defensive', 'Real Estate', 'Utilities',
+           'Basic Materials', 'Communication Services']
+EXCHANGES = ['NASDAQ', 'NYSE', 'XETRA', 'FSX', 'LSE', 'TSX']
+CURRENCIES = {'NASDAQ': 'USD', 'NYSE': 'USD', 'XETRA': 'EUR', 'FSX': 'EUR', 'LSE': 'GBP', 'TSX': 'CAD'}
+COUNTRIES = {'NASDAQ': 'US', 'NYSE': 'US', 'XETRA': 'DE', 'FSX': 'DE', 'LSE': 'GB', 'TSX': 'CA'}
+
+
+def _seed(symbol):
+    return int(hashlib.md5(symbol.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def make_symbols(count):
+    """Deterministic list of fake ticker symbols."""
+    return [f"S{i:05d}" for i in range(count)]
+
+
+def fake_profile(symbol):
+    seed = _seed(symbol)
+    exchange = EXCHANGES[seed % len(EXCHANGES)]
+    price = round(5 + (seed % 50000) / 100, 2)
+    return {
+        'symbol': symbol,
+        'price': price,
+        'mktCap': (seed % 5000) * 10_000_000,
+        'companyName': f"{symbol} Holdings Inc.",
+        'currency': CURRENCIES[exchange],
+        'exchange': exchange,
+        'exchangeShortName': exchange,
+        'industry': 'Software - Application',
+        'sector': SECTORS[seed % len(SECTORS)],
+        'country': COUNTRIES[exchange],
+        'city': 'Springfield',
+        'state': 'IL',
+        'address': '1 Main St',
+        'phone': '555-0100',
+        'website': f"https://{symbol.lower()}.example.com",
+    }
+
+
+def fake_quote(symbol):
+    profile = fake_profile(symbol)
+    shares = (_seed(symbol) % 900 + 100) * 1_000_000
+    return {
+        'symbol': symbol,
+        'name': profile['companyName'],
+        'price': profile['price'],
+        'marketCap': profile['price'] * shares,
+        'sharesOutstanding': shares,
+        'exchange': profile['exchangeShortName'],
+    }
+
+
+def has_data(symbol):
+    """About 1 in 12 symbols has no quote or DCF data at all."""
+    return _seed(symbol) % 12 != 0
+
+
+def in_bulk(symbol, coverage):
+    """Whether a symbol appears in the bulk endpoints for a given coverage fraction."""
+    return (_seed(symbol) // 7) % 100 < coverage * 100
+
+
+def fake_dcf(symbol):
+    seed = _seed(symbol)
+    price = fake_profile(symbol)['price']
+    # Spread DCF values from 50% below to 50% above the price
+    dcf = round(price * (0.5 + (seed % 1000) / 1000), 2)
+    return {'symbol': symbol, 'date': '2026-01-09', 'dcf': dcf, 'Stock Price': price}
+
+
+class MockFMPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive by default
+    disable_nagle_algorithm = True  # Headers and body are written separately
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        path = parsed.path[len(API_PREFIX):] if parsed.path.startswith(API_PREFIX) else parsed.path
+
+        apikey = params.get('apikey', [''])[0]
+        with server.stats_lock:
+            server.request_count += 1
+            server.key_counts[apikey] = server.key_counts.get(apikey, 0) + 1
+            limited = apikey not in server.invalid_keys and server.over_quota(apikey)
+        if apikey in server.invalid_keys:
+            self._send_json({'Error Message': 'Invalid API KEY. Please retry or visit our documentation.'}, status=401)
+            return
+        if limited:
+            body = json.dumps({'Error Message': 'Limit Reach'}).encode('utf-8')
+            self.send_response(429)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if server.latency:
+            if server.capacity:
+                # Requests beyond capacity queue for a worker, like an overloaded API
+                with server.workers:
+                    time.sleep(server.latency)
+            else:
+                time.sleep(server.latency)
+        if server.bulk_latency and path in BULK_PATHS:
+            time.sleep(server.bulk_latency)
+        elif server.slow_fraction and _seed(path) % 10000 < server.slow_fraction * 10000:
+            # Straggler: the same per-symbol paths are slow on every run
+            time.sleep(server.slow_latency)
+
+        symbols = server.symbols
+        bulk_symbols = [s for s in symbols if has_data(s) and in_bulk(s, server.bulk_coverage)]
+        if path == '/stock/list':
+            self._send_json([{'symbol': s, 'name': fake_profile(s)['companyName'],
+                              'exchangeShortName': fake_profile(s)['exchangeShortName']} for s in symbols])
+        elif path == '/dcf-bulk':
+            self._send_json([fake_dcf(s) for s in bulk_symbols])
+        elif path == '/profile-bulk':
+            part = int(params.get('part', ['0'])[0])
+            start = part * PROFILE_BULK_PART_SIZE
+            self._send_json([fake_profile(s) for s in bulk_symbols[start:start + PROFILE_BULK_PART_SIZE]])
+        elif path.startswith('/quote/'):
+            requested = path[len('/quote/'):].split(',')
+            self._send_json([fake_quote(s) for s in requested if s and has_data(s)])
+        elif path.startswith('/discounted-cash-flow/'):
+            symbol = path.rsplit('/', 1)[1]
+            self._send_json([fake_dcf(symbol)] if has_data(symbol) else [])
+        elif path.startswith('/profile/'):
+            self._send_json([fake_profile(path.rsplit('/', 1)[1])])
+        elif path.startswith('/key-metrics/'):
+            symbol = path.rsplit('/', 1)[1]
+            self._send_json([{'symbol': symbol, 'marketCap': fake_quote(symbol)['marketCap']}])
+        else:
+            self._send_json({'Error Message': f"Unknown endpoint {path}"}, status=404)
+
+
+class MockFMPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Async clients open hundreds of connections at once
+
+    def __init__(self, port=0, symbol_count=2000, latency=0.0, bulk_coverage=1.0, calls_per_minute=0, bulk_latency=0.0,
+                 slow_fraction=0.0, slow_latency=0.0, per_key_quota=False, invalid_keys=(), capacity=0):
+        super().__init__(('127.0.0.1', port), MockFMPHandler)
+        self.symbols = make_symbols(symbol_count)
+        self.latency = latency
+        self.bulk_latency = bulk_latency
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.bulk_coverage = bulk_coverage
+        self.calls_per_minute = calls_per_minute
+        self.per_key_quota = per_key_quota  # calls_per_minute applies to each apikey separately
+        self.invalid_keys = set(invalid_keys)  # apikeys answered with 401
+        self.capacity = capacity  # Requests served at once with latency (0 = unlimited)
+        self.workers = threading.BoundedSemaphore(capacity or 1)
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self.key_counts = {}  # apikey -> requests
+        self.windows = {}  # quota key -> [window start, requests in window]
+        self.stats_lock = threading.Lock()
+
+    def over_quota(self, apikey=''):
+        """
+        Enforce calls_per_minute as a per-second window (0 = unlimited),
+        for each apikey separately with per_key_quota.
+        Must be called with stats_lock held.
+        """
+        if not self.calls_per_minute:
+            return False
+        now = time.monotonic()
+        window = self.windows.setdefault(apikey if self.per_key_quota else '', [now, 0])
+        if now - window[0] >= 1.0:
+            window[0] = now
+            window[1] = 0
+        window[1] += 1
+        if window[1] > self.calls_per_minute / 60.0:
+            self.rate_limited_count += 1
+            return True
+        return False
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}{API_PREFIX}"
+
+
+def start_mock_server(port=0, symbol_count=2000, latency=0.0, bulk_coverage=1.0, calls_per_minute=0, bulk_latency=0.0,
+                      slow_fraction=0.0, slow_latency=0.0, per_key_quota=False, invalid_keys=(), capacity=0):
+    """
+    Start a mock server on a background thread.
+    Returns the server; call server.shutdown() when done.
+    """
+    server = MockFMPServer(port=port, symbol_count=symbol_count, latency=latency,
+                           bulk_coverage=bulk_coverage, calls_per_minute=calls_per_minute,
+                           bulk_latency=bulk_latency, slow_fraction=slow_fraction, slow_latency=slow_latency,
+                           per_key_quota=per_key_quota, invalid_keys=invalid_keys, capacity=capacity)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local mock FMP API server.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--symbols', type=int, default=2000, help='Size of the fake universe')
+    parser.add_argument('--latency', type=float, default=0.0, help='Artificial per-request latency (seconds)')
+    parser.add_argument('--bulk-coverage', type=float, default=1.0,
+                        help='Fraction of symbols present in dcf-bulk/profile-bulk (rest need per-symbol calls)')
+    parser.add_argument('--calls-per-minute', type=int, default=0,
+                        help='Quota to enforce with 429 + Retry-After (0 = unlimited)')
+    parser.add_argument('--bulk-latency', type=float, default=0.0,
+                        help='Extra latency for stock/list and bulk endpoints, which are large downloads (seconds)')
+    parser.add_argument('--slow-fraction', type=float, default=0.0,
+                        help='Fraction of per-symbol requests that are stragglers')
+    parser.add_argument('--slow-latency', type=float, default=0.0, help='Latency of a straggler request (seconds)')
+    parser.add_argument('--per-key-quota', action='store_true',
+                        help='Apply --calls-per-minute to each apikey separately (like several FMP plans)')
+    parser.add_argument('--invalid-keys', nargs='*', default=[], help='apikeys to answer with 401')
+    parser.add_argument('--capacity', type=int, default=0,
+                        help='Requests served at once; more queue and see higher latency (0 = unlimited)')
+    args = parser.parse_args()
+
+    server = MockFMPServer(port=args.port, symbol_count=args.symbols, latency=args.latency,
+                           bulk_coverage=args.bulk_coverage, calls_per_minute=args.calls_per_minute,
+                           bulk_latency=args.bulk_latency, slow_fraction=args.slow_fraction,
+                           slow_latency=args.slow_latency, per_key_quota=args.per_key_quota,
+                           invalid_keys=args.invalid_keys, capacity=args.capacity)
+    print(f"Mock FMP server listening on {server.base_url} ({args.symbols} symbols)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down mock server")
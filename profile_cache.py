@@ -0,0 +1,74 @@
+"""
+Read-only access to the company profiles fetch_undervalued_stocks.py
+cached (stock_cache.json and its journal, or the SQLite cache database),
+shared by fetch_stock_regions.py (region fields) and
+analyze_quarterly_undervalued.py (mktCap). Nothing is written back: the
+fetch script owns the cache.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from cache_journal import CacheJournal
+
+# Imported before the scripts load their .env, so load it here for the settings below
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+STOCK_CACHE_FILE = 'stock_cache.json'  # Snapshot + journal written by fetch_undervalued_stocks.py
+CACHE_BACKEND = os.getenv('FMP_CACHE_BACKEND', 'json')  # 'sqlite' reads the shared database instead
+PROFILE_TTL = int(os.getenv('FMP_PROFILE_TTL', str(14 * 24 * 3600)))  # 2 weeks (also the fetch script's profile TTL)
+
+
+def profile_age(entry):
+    """
+    Seconds since the entry's profile was fetched, or None if it has no
+    profile timestamp (cached before per-field timestamps) or it is malformed.
+    """
+    stamp = entry.get('profile_timestamp')
+    if not stamp:
+        return None
+    try:
+        return (datetime.now() - datetime.fromisoformat(stamp)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+def load_cached_profiles(symbols, max_age=None):
+    """
+    Load the cached profiles of symbols.
+    Returns {symbol: profile}; symbols without a profile are left out, and
+    with max_age (seconds) so are profiles older than that or without a
+    timestamp.
+    """
+    start_time = time.time()
+    profiles = {}
+    stale = 0
+    try:
+        if CACHE_BACKEND == 'sqlite':
+            from sqlite_cache import SQLiteCacheStore, CACHE_DB_FILE
+            store = SQLiteCacheStore(CACHE_DB_FILE)
+            entries = ((symbol, store.get(symbol)) for symbol in symbols)
+        else:
+            cache, _ = CacheJournal(STOCK_CACHE_FILE).load()
+            entries = ((symbol, cache.get(symbol)) for symbol in symbols)
+        for symbol, entry in entries:
+            if not isinstance(entry, dict) or not entry.get('profile'):
+                continue
+            if max_age is not None:
+                age = profile_age(entry)
+                if age is None or age > max_age:
+                    stale += 1
+                    continue
+            profiles[symbol] = entry['profile']
+    except Exception as e:
+        logger.warning(f"Error loading cached profiles: {e}. Falling back to the API.")
+        return {}
+    stale_desc = f" ({stale} older than {max_age / 3600:.0f}h skipped)" if stale else ""
+    logger.info(f"Loaded {len(profiles)}/{len(symbols)} cached profiles{stale_desc} in {time.time() - start_time:.1f}s")
+    return profiles
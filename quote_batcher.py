@@ -0,0 +1,122 @@
+"""
+Batched quote fetcher.
+FMP's /quote endpoint accepts a comma-separated list of symbols, so instead
+of one request per symbol, workers submit the symbols they need, a
+background flusher groups pending symbols into chunks and sends one request
+per chunk, and each worker gets its own quote back through a Future.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+QUOTE_BATCH_SIZE = 100  # Symbols per /quote request
+QUOTE_BATCH_MAX_WAIT = 0.05  # Max time a symbol waits for its chunk to fill (seconds)
+QUOTE_FETCH_WORKERS = 4  # Chunks fetched concurrently
+
+
+class QuoteBatcher:
+    """
+    Collects pending symbols and fetches their quotes in chunks.
+
+    fetch_chunk(symbols) must return a dict mapping symbol -> quote dict for
+    the symbols it found, or None if the request failed. Symbols missing
+    from the result resolve to None.
+    """
+
+    def __init__(self, fetch_chunk, batch_size=QUOTE_BATCH_SIZE, max_wait=QUOTE_BATCH_MAX_WAIT,
+                 fetch_workers=QUOTE_FETCH_WORKERS):
+        self.fetch_chunk = fetch_chunk
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.fetch_workers = fetch_workers
+
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.pending = []  # Symbols waiting to be sent, in submission order
+        self.futures = {}  # symbol -> Future for pending and in-flight symbols
+        self.oldest_pending = None
+        self.flusher = None
+        self.executor = None
+
+        # Statistics
+        self.symbols_requested = 0
+        self.chunk_calls = 0
+
+    def _ensure_started(self):
+        # Called with self.lock held
+        if self.flusher is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix='quote-batch')
+            self.flusher = threading.Thread(target=self._flush_loop, name='quote-flusher', daemon=True)
+            self.flusher.start()
+
+    def submit(self, symbol):
+        """Queue a symbol and return a Future that resolves to its quote (or None)."""
+        with self.condition:
+            future = self.futures.get(symbol)
+            if future is not None:
+                return future
+            self._ensure_started()
+            future = Future()
+            self.futures[symbol] = future
+            self.pending.append(symbol)
+            self.symbols_requested += 1
+            if self.oldest_pending is None:
+                self.oldest_pending = time.monotonic()
+            if len(self.pending) == 1 or len(self.pending) >= self.batch_size:
+                self.condition.notify()
+            return future
+
+    def prefetch(self, symbols):
+        """Queue many symbols at once so chunks go out full."""
+        for symbol in symbols:
+            self.submit(symbol)
+
+    def get(self, symbol, timeout=None):
+        """Blocking lookup of a single symbol's quote."""
+        return self.submit(symbol).result(timeout=timeout)
+
+    def _take_chunk(self):
+        # Called with self.lock held
+        chunk = self.pending[:self.batch_size]
+        del self.pending[:self.batch_size]
+        self.oldest_pending = time.monotonic() if self.pending else None
+        return chunk
+
+    def _flush_loop(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                if len(self.pending) < self.batch_size:
+                    remaining = self.max_wait - (time.monotonic() - self.oldest_pending)
+                    if remaining > 0:
+                        self.condition.wait(remaining)
+                        continue
+                chunk = self._take_chunk()
+                self.chunk_calls += 1
+            self.executor.submit(self._fetch_and_resolve, chunk)
+
+    def _fetch_and_resolve(self, chunk):
+        try:
+            quotes = self.fetch_chunk(chunk)
+        except Exception as e:
+            logger.warning(f"Quote batch of {len(chunk)} symbols failed: {e}")
+            quotes = None
+        if quotes is None:
+            quotes = {}
+        with self.lock:
+            futures = [(symbol, self.futures.pop(symbol, None)) for symbol in chunk]
+        for symbol, future in futures:
+            if future is not None:
+                future.set_result(quotes.get(symbol))
+
+    def summary(self):
+        """One-line human readable summary for end-of-run logging."""
+        with self.lock:
+            requested, calls = self.symbols_requested, self.chunk_calls
+        ratio = requested / calls if calls else 0
+        return f"Quote batcher: {requested} symbols fetched with {calls} requests ({ratio:.1f} symbols/request)"
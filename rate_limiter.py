@@ -0,0 +1,356 @@
+"""
+Token-bucket rate limiter shared by every worker making FMP API calls.
+Configured in calls per minute to match the FMP plan, adapts to HTTP 429
+responses (honouring Retry-After), and keeps track of how much time was
+spent waiting for tokens versus waiting on the network.
+SharedTokenBucket keeps the bucket in a locked file instead, so scripts
+running at the same time on one host draw from one per-minute allowance.
+"""
+
+import asyncio
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMIT_PAUSE = 1.0  # Pause after a 429 without a Retry-After header (seconds)
+MAX_RATE_LIMIT_PAUSE = 60.0  # Upper bound on any single pause (seconds)
+BACKOFF_FACTOR = 0.8  # Rate multiplier applied on each 429
+RECOVERY_STEP = 0.01  # Fraction of the configured rate regained per successful call
+MIN_RATE_FRACTION = 0.1  # Never slow down below this fraction of the configured rate
+SHARED_STATE_FORMAT = '<ddddd'  # tokens, last_refill, paused_until, rate (calls/s), total calls (wall-clock times)
+SHARED_IDLE_RESET = 60.0  # A shared bucket idle this long starts again at the configured rate (seconds)
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header (delta-seconds or HTTP-date) into seconds.
+    Returns None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    Tokens refill continuously at calls_per_minute / 60 per second up to
+    burst. A caller that finds the bucket empty reserves the next token
+    (the balance goes negative) and sleeps until it is due, so waiting
+    callers are served in arrival order without polling.
+    """
+
+    def __init__(self, calls_per_minute, burst=None):
+        self.configured_rate = calls_per_minute / 60.0
+        self.rate = self.configured_rate
+        self.capacity = burst if burst is not None else max(1.0, self.configured_rate)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.calls = 0
+        self.rate_limited = 0
+        self.token_wait_time = 0.0
+        self.network_time = 0.0
+
+    @property
+    def calls_per_minute(self):
+        return self.rate * 60.0
+
+    def _reserve(self):
+        """Take one token and return how long the caller must wait for it."""
+        with self.lock:
+            now = time.monotonic()
+            if self.rate > 0:
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1
+            self.calls += 1
+            wait = -self.tokens / self.rate if self.tokens < 0 and self.rate > 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def _pause_remaining(self):
+        with self.lock:
+            return self.paused_until - time.monotonic()
+
+    def _record_wait(self, wait):
+        with self.lock:
+            self.token_wait_time += wait
+
+    def reserve(self):
+        """Take one token now without sleeping; pass the result to wait_for() or wait_for_async()."""
+        return self._reserve()
+
+    def acquire(self):
+        """Block until a token is available. Returns the time waited (seconds)."""
+        return self.wait_for(self._reserve())
+
+    def wait_for(self, wait):
+        """Sleep until a token reserved with reserve() (wait seconds away) is due."""
+        waited = 0.0
+        while wait > 0:
+            time.sleep(wait)
+            waited += wait
+            # A 429 may have paused the bucket after this token was reserved
+            wait = self._pause_remaining()
+        if waited:
+            self._record_wait(waited)
+        return waited
+
+    async def acquire_async(self):
+        """Asyncio version of acquire()."""
+        return await self.wait_for_async(self._reserve())
+
+    async def wait_for_async(self, wait):
+        """Asyncio version of wait_for()."""
+        waited = 0.0
+        while wait > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+            wait = self._pause_remaining()
+        if waited:
+            self._record_wait(waited)
+        return waited
+
+    def record_network_time(self, seconds):
+        with self.lock:
+            self.network_time += seconds
+
+    def on_rate_limited(self, retry_after=None):
+        """
+        Feedback from a 429 response: stop issuing tokens until Retry-After
+        has passed and lower the sustained rate so we settle just under quota.
+        Requests already in flight when the first 429 arrives usually come
+        back 429 too, so the rate is only lowered once per pause.
+        """
+        pause = retry_after if retry_after is not None else DEFAULT_RATE_LIMIT_PAUSE
+        pause = min(pause, MAX_RATE_LIMIT_PAUSE)
+        with self.lock:
+            now = time.monotonic()
+            self.rate_limited += 1
+            if now >= self.paused_until:
+                self.rate = max(self.configured_rate * MIN_RATE_FRACTION, self.rate * BACKOFF_FACTOR)
+            self.paused_until = max(self.paused_until, now + pause)
+            self.tokens = min(self.tokens, 0.0)
+        return pause
+
+    def on_success(self):
+        """Feedback from a successful call: creep back toward the configured rate."""
+        if self.rate < self.configured_rate:
+            with self.lock:
+                self.rate = min(self.configured_rate, self.rate + self.configured_rate * RECOVERY_STEP)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'rate_limited': self.rate_limited,
+                'token_wait_time': self.token_wait_time,
+                'network_time': self.network_time,
+                'calls_per_minute': self.rate * 60.0,
+            }
+
+    def summary(self):
+        """One-line human readable summary for end-of-run logging."""
+        s = self.stats()
+        return (f"Rate limiter: {s['calls']} calls, {s['rate_limited']} rate-limited (429), "
+                f"{s['token_wait_time']:.1f}s waiting for tokens, {s['network_time']:.1f}s waiting on network "
+                f"(cumulative across workers), current rate {s['calls_per_minute']:.0f} calls/min")
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket whose balance, 429 pause and adapted rate live in a small
+    file, locked around every update, so all processes using the same file
+    (the fetch scripts running at the same time, e.g. overlapping cron jobs)
+    share one per-minute allowance and back off together on a 429.
+    Times in the file are wall-clock (time.time()) since monotonic clocks
+    are not comparable across processes.
+    The statistics (calls, waits) stay per process; summary() also reports
+    this process's share of all calls drawn from the file while it ran.
+    The file is created 0600 and not followed if it is a symlink; if it
+    cannot be opened (or belongs to another user) the bucket logs a warning
+    and works as a per-process TokenBucket instead.
+    """
+
+    def __init__(self, calls_per_minute, path, burst=None):
+        super().__init__(calls_per_minute, burst)
+        self.path = path
+        self.file = None  # Opened on first use
+        self.unavailable = False  # The file could not be used: behave as a plain TokenBucket
+        self.local_rate = self.rate  # Last rate seen in the file, so on_success only writes while it is lowered
+        self.total_at_start = 0.0
+
+    def _lock(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _open(self):
+        """Open the state file on first use. Returns False if it cannot be used. Called with self.lock held."""
+        if self.file is None and not self.unavailable:
+            flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0) | getattr(os, 'O_BINARY', 0)
+            try:
+                fd = os.open(self.path, flags, 0o600)
+                if hasattr(os, 'getuid') and os.fstat(fd).st_uid != os.getuid():
+                    os.close(fd)
+                    raise PermissionError(f"{self.path} belongs to another user")
+                self.file = os.fdopen(fd, 'r+b')
+            except OSError as e:
+                self.unavailable = True
+                logger.warning(f"Shared rate budget unavailable ({e}); using a per-process rate limit")
+            else:
+                # The file outlives runs: count shared calls from what it holds now
+                self.total_at_start = self._read_total()
+        return self.file is not None
+
+    def _read_total(self):
+        """Total calls recorded in the file (0 for a new file). Called with self.lock held."""
+        size = struct.calcsize(SHARED_STATE_FORMAT)
+        self._lock()
+        try:
+            self.file.seek(0)
+            data = self.file.read(size)
+        finally:
+            self._unlock()
+        return struct.unpack(SHARED_STATE_FORMAT, data)[4] if len(data) == size else 0.0
+
+    def _shared(self):
+        with self.lock:
+            return self._open()
+
+    def _update(self, func):
+        """
+        Call func(state, now) with the file locked, where state is the list
+        [tokens, last_refill, paused_until, rate, total_calls]; changes func
+        makes to state are written back. Returns func's result.
+        """
+        size = struct.calcsize(SHARED_STATE_FORMAT)
+        with self.lock:
+            self._open()
+            self._lock()
+            try:
+                now = time.time()
+                self.file.seek(0)
+                data = self.file.read(size)
+                if len(data) == size:
+                    state = list(struct.unpack(SHARED_STATE_FORMAT, data))
+                    if now - state[1] > SHARED_IDLE_RESET:
+                        state[3] = self.configured_rate
+                else:
+                    state = [self.capacity, now, 0.0, self.configured_rate, 0.0]
+                result = func(state, now)
+                self.file.seek(0)
+                self.file.write(struct.pack(SHARED_STATE_FORMAT, *state))
+                self.file.flush()
+                self.local_rate = state[3]
+                return result
+            finally:
+                self._unlock()
+
+    @property
+    def calls_per_minute(self):
+        if self.unavailable:
+            return super().calls_per_minute
+        return self.local_rate * 60.0
+
+    def _reserve(self):
+        if not self._shared():
+            return super()._reserve()
+
+        def reserve(state, now):
+            tokens, last_refill, paused_until, rate, _ = state
+            if rate > 0:
+                tokens = min(self.capacity, tokens + max(0.0, now - last_refill) * rate)
+            tokens -= 1
+            state[0], state[1], state[4] = tokens, now, state[4] + 1
+            wait = -tokens / rate if tokens < 0 and rate > 0 else 0.0
+            return max(wait, paused_until - now)
+
+        wait = self._update(reserve)
+        with self.lock:
+            self.calls += 1
+        return wait
+
+    def _pause_remaining(self):
+        if not self._shared():
+            return super()._pause_remaining()
+        return self._update(lambda state, now: state[2] - now)
+
+    def on_rate_limited(self, retry_after=None):
+        if not self._shared():
+            return super().on_rate_limited(retry_after)
+        pause = retry_after if retry_after is not None else DEFAULT_RATE_LIMIT_PAUSE
+        pause = min(pause, MAX_RATE_LIMIT_PAUSE)
+
+        def rate_limited(state, now):
+            if now >= state[2]:
+                state[3] = max(self.configured_rate * MIN_RATE_FRACTION, state[3] * BACKOFF_FACTOR)
+            state[2] = max(state[2], now + pause)
+            state[0] = min(state[0], 0.0)
+
+        self._update(rate_limited)
+        with self.lock:
+            self.rate_limited += 1
+        return pause
+
+    def on_success(self):
+        if not self._shared():
+            return super().on_success()
+        if self.local_rate < self.configured_rate:
+            def recover(state, now):
+                state[3] = min(self.configured_rate, state[3] + self.configured_rate * RECOVERY_STEP)
+            self._update(recover)
+
+    def shared_calls(self):
+        """Calls drawn from the shared file by all processes since this one started."""
+        return int(self._update(lambda state, now: state[4]) - self.total_at_start)
+
+    def stats(self):
+        stats = super().stats()
+        if not self._shared():
+            return stats
+        stats['calls_per_minute'] = self.local_rate * 60.0
+        stats['shared_calls'] = self.shared_calls()
+        return stats
+
+    def summary(self):
+        s = self.stats()
+        if 'shared_calls' not in s:
+            return super().summary() + f"; shared budget ({self.path}) unavailable, per-process limit used"
+        share = s['calls'] / s['shared_calls'] * 100 if s['shared_calls'] else 100.0
+        return (super().summary() + f"; shared budget ({self.path}): this process made {s['calls']} of "
+                f"{s['shared_calls']} calls by all processes during the run ({share:.0f}%)")
@@ -1,78 +1,90 @@
 """
-Script to remove duplicate rows from Excel file based on ticker (Symbol) name.
-Keeps the first occurrence of each ticker.
+Script to remove duplicate rows from the regions stage file based on ticker
+(Symbol) name. Keeps the first occurrence of each ticker.
 """
 
-import pandas as pd
-import os
+import stage_io
 
-# File paths
-INPUT_EXCEL_FILE = 'undervalued_stocks_with_regions.xlsx'
-OUTPUT_EXCEL_FILE = 'undervalued_stocks_with_regions_cleaned.xlsx'
+# Stage files (stage_io adds the extension)
+INPUT_FILE = 'undervalued_stocks_with_regions'
+OUTPUT_FILE = 'undervalued_stocks_with_regions_cleaned'
+
+def drop_duplicate_symbols(df):
+    """
+    Remove duplicate rows based on the Symbol (ticker) column, keeping the
+    first occurrence. Returns the cleaned DataFrame (df itself if there were
+    no duplicates), or None if there is no Symbol column.
+    """
+    print(f"Original file contains {len(df)} rows")
+    print(f"Columns: {list(df.columns)}")
+    
+    # Check if 'Symbol' column exists
+    if 'Symbol' not in df.columns:
+        print("Error: 'Symbol' column not found in the input file.")
+        print(f"Available columns: {list(df.columns)}")
+        return None
+    
+    # Count duplicates before removal
+    duplicate_count = df.duplicated(subset=['Symbol']).sum()
+    unique_count = df['Symbol'].nunique()
+    
+    print(f"\nDuplicate Analysis:")
+    print(f"  Total rows: {len(df)}")
+    print(f"  Unique tickers: {unique_count}")
+    print(f"  Duplicate rows to remove: {duplicate_count}")
+    
+    if duplicate_count == 0:
+        print("\nNo duplicates found. File is already clean!")
+        return df
+    
+    # Remove duplicates based on Symbol column, keeping the first occurrence
+    print("\nRemoving duplicates (keeping first occurrence of each ticker)...")
+    df_cleaned = df.drop_duplicates(subset=['Symbol'], keep='first')
+    
+    # Show what was removed
+    removed_count = len(df) - len(df_cleaned)
+    print(f"\nRemoved {removed_count} duplicate row(s)")
+    print(f"Cleaned file contains {len(df_cleaned)} rows")
+    
+    # Show which symbols had duplicates
+    duplicates = df[df.duplicated(subset=['Symbol'], keep=False)]['Symbol'].unique()
+    print(f"\nSymbols that had duplicates ({len(duplicates)}):")
+    for symbol in sorted(duplicates)[:20]:  # Show first 20
+        count = len(df[df['Symbol'] == symbol])
+        print(f"  {symbol}: {count} occurrences (kept 1, removed {count-1})")
+    if len(duplicates) > 20:
+        print(f"  ... and {len(duplicates) - 20} more")
+    
+    return df_cleaned
 
 def remove_duplicates():
     """
-    Remove duplicate rows from Excel file based on Symbol (ticker) column.
+    Remove duplicate rows from the input stage file based on Symbol (ticker) column.
     """
     print("=" * 80)
-    print("Removing Duplicate Rows from Excel File")
+    print("Removing Duplicate Rows")
     print("=" * 80)
     
     # Check if input file exists
-    if not os.path.exists(INPUT_EXCEL_FILE):
-        print(f"Error: Input file not found: {INPUT_EXCEL_FILE}")
+    input_file = stage_io.find_stage(INPUT_FILE)
+    if input_file is None:
+        print(f"Error: Input file not found: {stage_io.stage_path(INPUT_FILE)}")
         return None
     
-    print(f"Reading Excel file: {INPUT_EXCEL_FILE}")
+    print(f"Reading file: {input_file}")
     
     try:
-        # Read the Excel file
-        df = pd.read_excel(INPUT_EXCEL_FILE, engine='openpyxl')
-        
-        print(f"Original file contains {len(df)} rows")
-        print(f"Columns: {list(df.columns)}")
-        
-        # Check if 'Symbol' column exists
-        if 'Symbol' not in df.columns:
-            print("Error: 'Symbol' column not found in the Excel file.")
-            print(f"Available columns: {list(df.columns)}")
-            return None
-        
-        # Count duplicates before removal
-        duplicate_count = df.duplicated(subset=['Symbol']).sum()
-        unique_count = df['Symbol'].nunique()
+        df = stage_io.read_stage(input_file)
         
-        print(f"\nDuplicate Analysis:")
-        print(f"  Total rows: {len(df)}")
-        print(f"  Unique tickers: {unique_count}")
-        print(f"  Duplicate rows to remove: {duplicate_count}")
-        
-        if duplicate_count == 0:
-            print("\nNo duplicates found. File is already clean!")
-            return df
-        
-        # Remove duplicates based on Symbol column, keeping the first occurrence
-        print("\nRemoving duplicates (keeping first occurrence of each ticker)...")
-        df_cleaned = df.drop_duplicates(subset=['Symbol'], keep='first')
-        
-        # Show what was removed
+        df_cleaned = drop_duplicate_symbols(df)
+        if df_cleaned is None or df_cleaned is df:
+            # Unusable, or already clean: nothing to save
+            return df_cleaned
         removed_count = len(df) - len(df_cleaned)
-        print(f"\nRemoved {removed_count} duplicate row(s)")
-        print(f"Cleaned file contains {len(df_cleaned)} rows")
-        
-        # Show which symbols had duplicates (if any)
-        if duplicate_count > 0:
-            duplicates = df[df.duplicated(subset=['Symbol'], keep=False)]['Symbol'].unique()
-            print(f"\nSymbols that had duplicates ({len(duplicates)}):")
-            for symbol in sorted(duplicates)[:20]:  # Show first 20
-                count = len(df[df['Symbol'] == symbol])
-                print(f"  {symbol}: {count} occurrences (kept 1, removed {count-1})")
-            if len(duplicates) > 20:
-                print(f"  ... and {len(duplicates) - 20} more")
         
         # Save cleaned file
-        print(f"\nSaving cleaned file: {OUTPUT_EXCEL_FILE}")
-        df_cleaned.to_excel(OUTPUT_EXCEL_FILE, index=False, engine='openpyxl')
+        print(f"\nSaving cleaned file: {stage_io.stage_path(OUTPUT_FILE)}")
+        output_file = stage_io.write_stage(df_cleaned, OUTPUT_FILE)
         print("Cleaned file saved successfully!")
         
         # Summary
@@ -82,13 +94,13 @@ def remove_duplicates():
         print(f"  Duplicate rows removed: {removed_count}")
         print(f"  Final rows: {len(df_cleaned)}")
         print(f"  Unique tickers: {df_cleaned['Symbol'].nunique()}")
-        print(f"  Cleaned file: {OUTPUT_EXCEL_FILE}")
+        print(f"  Cleaned file: {output_file}")
         print("=" * 80)
         
         return df_cleaned
         
     except FileNotFoundError:
-        print(f"Error: File not found: {INPUT_EXCEL_FILE}")
+        print(f"Error: File not found: {input_file}")
         return None
     except Exception as e:
         print(f"Error processing file: {e}")
@@ -104,12 +116,13 @@ def remove_duplicates_in_place():
     print("Removing Duplicate Rows (Overwriting Original File)")
     print("=" * 80)
     
-    if not os.path.exists(INPUT_EXCEL_FILE):
-        print(f"Error: Input file not found: {INPUT_EXCEL_FILE}")
+    input_file = stage_io.find_stage(INPUT_FILE)
+    if input_file is None:
+        print(f"Error: Input file not found: {stage_io.stage_path(INPUT_FILE)}")
         return None
     
     try:
-        df = pd.read_excel(INPUT_EXCEL_FILE, engine='openpyxl')
+        df = stage_io.read_stage(input_file)
         original_count = len(df)
         
         print(f"Original file contains {original_count} rows")
@@ -124,10 +137,10 @@ def remove_duplicates_in_place():
         
         # Overwrite original file
         print(f"Removing {removed_count} duplicate row(s)...")
-        df_cleaned.to_excel(INPUT_EXCEL_FILE, index=False, engine='openpyxl')
+        output_file = stage_io.write_stage(df_cleaned, INPUT_FILE)
         
         print(f"\nSuccess! Removed {removed_count} duplicate(s).")
-        print(f"Original file updated: {INPUT_EXCEL_FILE}")
+        print(f"Original file updated: {output_file}")
         print("=" * 80)
         
         return df_cleaned
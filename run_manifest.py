@@ -0,0 +1,165 @@
+"""
+Run manifest for fetch_undervalued_stocks.py, so an interrupted universe
+scan can be resumed (--resume) instead of starting over.
+Each run gets a run ID and an append-only JSON Lines file in
+run_manifests/<run_id>.jsonl:
+
+    {"run_id": ..., "started": ..., "options": {...}}      header
+    {"done": [symbols], "rows": [stock_valuations rows]}   one line per checkpoint
+    {"complete": true, "finished": ...}                    written at the end of the run
+
+A resumed run appends to the same file, skips the symbols already done and
+merges the stored rows into its stock_valuations.csv. Starting a run
+deletes all but the MANIFEST_KEEP most recent manifests. As with the cache
+journal, a half-written line (crash mid-append) is skipped, and the first
+append after load() cuts a torn tail off so records written after a crash
+are read back.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+MANIFEST_DIR = 'run_manifests'
+MANIFEST_SUFFIX = '.jsonl'
+MANIFEST_KEEP = int(os.getenv('FMP_MANIFEST_KEEP', '10'))  # Most recent manifests kept when a run starts
+
+
+def new_run_id():
+    """Run IDs sort by start time (same timestamp format as the log files)."""
+    return datetime.now().strftime('%Y%m%d_%H%M%S')
+
+
+def run_ids(directory=MANIFEST_DIR):
+    """Run IDs with a manifest in directory, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-len(MANIFEST_SUFFIX)] for name in os.listdir(directory)
+                  if name.endswith(MANIFEST_SUFFIX))
+
+
+def prune(directory=MANIFEST_DIR, keep=MANIFEST_KEEP):
+    """Delete all but the keep most recent manifests, so the directory does not grow run after run."""
+    if keep <= 0:
+        return  # 0 keeps every manifest
+    for run_id in run_ids(directory)[:-keep]:
+        try:
+            os.remove(os.path.join(directory, run_id + MANIFEST_SUFFIX))
+        except OSError:
+            pass  # Removed by another run starting at the same time
+
+
+class RunManifest:
+    """
+    Symbols completed by a run and the result rows they produced.
+    mark_done() only buffers; flush() appends the buffer as one line and
+    fsyncs it, so checkpoints cost one write however many symbols finished.
+    """
+
+    def __init__(self, run_id, directory=MANIFEST_DIR):
+        self.run_id = run_id
+        self.path = os.path.join(directory, run_id + MANIFEST_SUFFIX)
+        self.lock = threading.Lock()
+        self.options = {}
+        self.started = None
+        self.completed = False
+        self.done = set()  # Symbols finished by this run (all sessions)
+        self.rows = []  # stock_valuations rows stored by earlier sessions
+        self.pending_done = []
+        self.pending_rows = []
+        self.good_length = None  # File bytes up to the end of the last good record, as of load()
+        self.tail_checked = False  # Whether _append has repaired a torn tail yet
+
+    @classmethod
+    def create(cls, options, directory=MANIFEST_DIR, run_id=None):
+        """Start a new run and write its header."""
+        os.makedirs(directory, exist_ok=True)
+        base_id = run_id or new_run_id()
+        run_id, n = base_id, 1
+        while os.path.exists(os.path.join(directory, run_id + MANIFEST_SUFFIX)):
+            # Two runs started within the same second
+            run_id = f"{base_id}_{n}"
+            n += 1
+        manifest = cls(run_id, directory)
+        manifest.options = options
+        manifest.started = datetime.now().isoformat()
+        manifest._append({'run_id': manifest.run_id, 'started': manifest.started, 'options': options})
+        prune(directory)
+        return manifest
+
+    @classmethod
+    def load(cls, run_id, directory=MANIFEST_DIR):
+        """Load a run's manifest. Raises FileNotFoundError if there is none."""
+        manifest = cls(run_id, directory)
+        offset = good_length = 0
+        with open(manifest.path, 'rb') as f:
+            for line in f:
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write from a crash: skip it, the records around it are intact
+                    continue
+                good_length = offset
+                if 'run_id' in record:
+                    manifest.options = record.get('options', {})
+                    manifest.started = record.get('started')
+                elif record.get('complete'):
+                    manifest.completed = True
+                else:
+                    manifest.done.update(record.get('done', []))
+                    manifest.rows.extend(record.get('rows', []))
+        manifest.good_length = good_length
+        return manifest
+
+    @staticmethod
+    def latest_incomplete(directory=MANIFEST_DIR):
+        """Run ID of the most recent run that did not finish, or None."""
+        for run_id in reversed(run_ids(directory)):
+            if not RunManifest.load(run_id, directory).completed:
+                return run_id
+        return None
+
+    def _append(self, record):
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        with open(self.path, 'a+b') as f:
+            if not self.tail_checked:
+                # Cut off a torn tail after the last good record and end an
+                # unterminated last line, so this record is not glued onto it
+                size = f.seek(0, os.SEEK_END)
+                if self.good_length is not None and size > self.good_length:
+                    f.truncate(self.good_length)
+                    size = self.good_length
+                if size:
+                    f.seek(size - 1)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+                self.tail_checked = True
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def mark_done(self, symbols, rows=()):
+        """Record finished symbols and the result rows (if any) they produced."""
+        with self.lock:
+            self.done.update(symbols)
+            self.pending_done.extend(symbols)
+            self.pending_rows.extend(rows)
+
+    def flush(self):
+        """Append everything marked done since the last flush."""
+        with self.lock:
+            if not self.pending_done:
+                return
+            record = {'done': self.pending_done, 'rows': self.pending_rows}
+            self.pending_done = []
+            self.pending_rows = []
+            self._append(record)
+
+    def complete(self):
+        """Flush and mark the run finished, so --resume no longer picks it."""
+        self.flush()
+        with self.lock:
+            self.completed = True
+            self._append({'complete': True, 'finished': datetime.now().isoformat()})
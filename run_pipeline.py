@@ -0,0 +1,230 @@
+"""
+Run the post-processing stages in one process, passing DataFrames between
+them instead of stage files:
+
+    undervalued stocks cache -> regions (fetch_stock_regions)
+    -> duplicates removed (remove_duplicates) -> USD/US (filter_usd_stocks)
+    -> market cap >= 1B (analyze_quarterly_undervalued)
+    -> NYSE/NASDAQ (filter_exchange_stocks) -> one stage file per sector
+
+Only the final per-sector files (filter_exchange_stocks.OUTPUT_FOLDER) are
+written. With --save-intermediate every stage also writes its usual output,
+so the standalone scripts can pick up from any point. With --fetch the
+valuation scan (fetch_undervalued_stocks) runs first and its undervalued
+stocks are handed over in memory instead of going through the cache file.
+Each stage is timed; the timings go to the log and the _summary.txt file.
+Files are written in the stage_io format (Parquet unless --format says
+otherwise); --excel adds an .xlsx copy of each.
+
+Usage:
+    python run_pipeline.py [--fetch] [--save-intermediate] [--format parquet|arrow|xlsx] [--excel]
+"""
+
+import argparse
+import logging
+import os
+import time
+from datetime import datetime
+
+import analyze_quarterly_undervalued
+import fetch_stock_regions
+import filter_exchange_stocks
+import filter_usd_stocks
+import fmp_client
+import remove_duplicates
+import stage_io
+
+
+def setup_logging():
+    """
+    Configure logging to both file and console.
+    The stage modules log through the same handlers.
+    """
+    log_dir = 'logs'
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    log_file = os.path.join(log_dir, f'pipeline_{timestamp}.log')
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        handlers=[
+            logging.FileHandler(log_file, encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+    return logging.getLogger(__name__)
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Times pipeline stages and keeps (stage, seconds, rows in, rows out) for the summary."""
+
+    def __init__(self):
+        self.stages = []
+
+    def run(self, name, func, *args, rows_in=None, writes=False):
+        """
+        Call func(*args) and record its time. The rows out are counted from
+        the result (the first item if it is a tuple), except for writes=True
+        stages (file output), which pass their rows_in through.
+        """
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        frame = result[0] if isinstance(result, tuple) else result
+        if writes:
+            rows_out = rows_in
+        else:
+            rows_out = len(frame) if frame is not None else 0
+        self.stages.append((name, elapsed, rows_in, rows_out))
+        logger.info(f"Stage '{name}' took {elapsed:.2f}s ({rows_in if rows_in is not None else '-'} -> {rows_out} rows)")
+        return result
+
+    def lines(self):
+        lines = [f"  {name:<26} {elapsed:8.2f}s  {rows_in if rows_in is not None else '-':>7} -> {rows_out} rows"
+                 for name, elapsed, rows_in, rows_out in self.stages]
+        lines.append(f"  {'total':<26} {sum(stage[1] for stage in self.stages):8.2f}s")
+        return lines
+
+
+def fetch_undervalued():
+    """Run the valuation scan and return its undervalued stocks as cache-style rows, or None."""
+    import fetch_undervalued_stocks
+    df = fetch_undervalued_stocks.find_undervalued_stocks()
+    if df is None:
+        return None
+    return df[df['Valuation Status'] == 'UNDERVALUED'].to_dict('records')
+
+
+def save_stage(df, base):
+    path = stage_io.write_stage(df, base)
+    logger.info(f"Saved {len(df)} rows to {path}")
+    return df
+
+
+def write_pipeline_summary(df, sectors, timer, output_folder):
+    """Write _summary.txt with the sector breakdown and the stage timings."""
+    summary_file = os.path.join(output_folder, '_summary.txt')
+    with open(summary_file, 'w') as f:
+        f.write("Pipeline Summary (NYSE/NASDAQ, USD/US, Market Cap >= 1B)\n")
+        f.write("=" * 80 + "\n\n")
+        f.write(f"Run Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"Final Stocks: {len(df)}\n\n")
+        f.write("Stage Timings:\n")
+        f.write("-" * 80 + "\n")
+        for line in timer.lines():
+            f.write(line + "\n")
+        f.write("\nSector Breakdown:\n")
+        f.write("-" * 80 + "\n")
+        for sector in sectors:
+            f.write(f"  {sector}: {int((df['Sector'] == sector).sum())} stocks\n")
+    print(f"\nSummary saved to: {summary_file}")
+
+
+def run_pipeline(fetch=False, save_intermediate=False):
+    """
+    Run every stage in memory and write the per-sector stage files.
+    Returns the final DataFrame, or None if a stage left no stocks.
+    """
+    logger.info("=" * 80)
+    logger.info("Starting in-process pipeline")
+    logger.info("=" * 80)
+    timer = StageTimer()
+
+    def export(name, func, *args):
+        # File output, timed separately from the stage that produced it
+        timer.run(f"{name} (write)", func, *args, rows_in=len(args[0]), writes=True)
+
+    if fetch:
+        stocks = timer.run('valuation scan', fetch_undervalued)
+    else:
+        stocks = timer.run('load cache', fetch_stock_regions.load_undervalued_stocks)
+    if not stocks:
+        logger.error("No undervalued stocks to process. Exiting.")
+        return None
+
+    df = timer.run('regions', fetch_stock_regions.fetch_regions, stocks, rows_in=len(stocks))
+    if df is None:
+        logger.error("Region stage returned no stocks. Exiting.")
+        return None
+    if save_intermediate:
+        export('regions', save_stage, df, fetch_stock_regions.OUTPUT_FILE)
+
+    rows_in = len(df)
+    df = timer.run('remove duplicates', remove_duplicates.drop_duplicate_symbols, df, rows_in=rows_in)
+    if df is None:
+        return None
+    if save_intermediate:
+        export('remove duplicates', save_stage, df, remove_duplicates.OUTPUT_FILE)
+
+    rows_in = len(df)
+    df, _ = timer.run('USD/US filter', filter_usd_stocks.filter_usd_frame, df, rows_in=rows_in)
+    if df is None:
+        return None
+    if save_intermediate:
+        export('USD/US filter', save_stage, df, filter_usd_stocks.OUTPUT_FILE)
+
+    rows_in = len(df)
+    df, stats = timer.run('market cap', analyze_quarterly_undervalued.add_market_caps, df, rows_in=rows_in)
+    if df is None:
+        return None
+    if save_intermediate:
+        sectors = timer.run('market cap (write)', analyze_quarterly_undervalued.save_by_sector, df,
+                            rows_in=len(df), writes=True)
+        analyze_quarterly_undervalued.write_summary(df, sectors, stats)
+
+    rows_in = len(df)
+    df = timer.run('exchange filter', filter_exchange_stocks.filter_by_exchange, df, rows_in=rows_in)
+    if df is None or len(df) == 0:
+        logger.error("No NYSE/NASDAQ stocks left. Exiting.")
+        return None
+
+    output_folder = filter_exchange_stocks.OUTPUT_FOLDER
+    sectors = timer.run('sector files (write)', analyze_quarterly_undervalued.save_by_sector, df, output_folder,
+                        rows_in=len(df), writes=True)
+    write_pipeline_summary(df, sectors, timer, output_folder)
+
+    logger.info(fmp_client.rate_limiter.summary())
+    logger.info(fmp_client.concurrency.summary())
+    logger.info("Stage timings:")
+    for line in timer.lines():
+        logger.info(line)
+    print("\n" + "=" * 80)
+    print("Pipeline complete! Stage timings:")
+    for line in timer.lines():
+        print(line)
+    print(f"Results saved in folder: {output_folder}")
+    print("=" * 80)
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the post-processing stages in one process.')
+    parser.add_argument('--fetch', action='store_true',
+                        help='Run the valuation scan first instead of reading the undervalued stocks cache')
+    parser.add_argument('--save-intermediate', action='store_true',
+                        help="Also write every stage's usual output file")
+    parser.add_argument('--format', choices=sorted(stage_io.EXTENSIONS), default=stage_io.STAGE_FORMAT,
+                        help='File format for the stage outputs (default: PIPELINE_FORMAT or parquet)')
+    parser.add_argument('--excel', action='store_true',
+                        help='Also write an .xlsx copy of every output file')
+    args = parser.parse_args()
+    stage_io.STAGE_FORMAT = args.format
+    stage_io.EXCEL_EXPORT = stage_io.EXCEL_EXPORT or args.excel
+
+    setup_logging()
+    if not fetch_stock_regions.API_KEYS:
+        logger.error("FMP_API_KEY (or FMP_API_KEYS) not found in .env file")
+        print("Error: FMP_API_KEY (or FMP_API_KEYS) not found in .env file")
+    elif fetch_stock_regions.validate_api_key():
+        try:
+            run_pipeline(fetch=args.fetch, save_intermediate=args.save_intermediate)
+        except KeyboardInterrupt:
+            logger.warning("Pipeline interrupted by user")
+            print("\n\nPipeline interrupted by user.")
@@ -0,0 +1,255 @@
+"""
+SQLite cache backend (enabled with FMP_CACHE_BACKEND=sqlite).
+Stores the per-symbol price/DCF/profile cache and the undervalued/fair
+valuation lists in one WAL-mode database. Lookups hit the database by
+primary key instead of loading the whole cache into memory, and several
+scripts or processes can read and write the same file at once.
+Writes are buffered and committed in batches, one transaction per batch.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+CACHE_DB_FILE = os.getenv('FMP_CACHE_DB', 'stock_cache.db')
+WRITE_BATCH_SIZE = 500  # Buffered writes per transaction
+BUSY_TIMEOUT = 30  # Seconds to wait for another process's write lock
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stocks (
+    symbol TEXT PRIMARY KEY,
+    price REAL,
+    dcf REAL,
+    profile TEXT,
+    sector TEXT,
+    timestamp TEXT,
+    price_timestamp TEXT,
+    dcf_timestamp TEXT,
+    profile_timestamp TEXT,
+    negative TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_stocks_sector ON stocks(sector);
+CREATE INDEX IF NOT EXISTS idx_stocks_timestamp ON stocks(timestamp);
+
+CREATE TABLE IF NOT EXISTS valuations (
+    symbol TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    sector TEXT,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_valuations_status ON valuations(status);
+CREATE INDEX IF NOT EXISTS idx_valuations_sector ON valuations(sector);
+CREATE INDEX IF NOT EXISTS idx_valuations_timestamp ON valuations(timestamp);
+"""
+
+# Columns added after the first release of the schema
+ADDED_COLUMNS = ['price_timestamp', 'dcf_timestamp', 'profile_timestamp', 'negative']
+
+UPSERT_STOCK = """
+INSERT INTO stocks (symbol, price, dcf, profile, sector, timestamp, price_timestamp, dcf_timestamp, profile_timestamp, negative)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(symbol) DO UPDATE SET
+    price = COALESCE(excluded.price, price),
+    dcf = COALESCE(excluded.dcf, dcf),
+    profile = COALESCE(excluded.profile, profile),
+    sector = COALESCE(excluded.sector, sector),
+    timestamp = COALESCE(excluded.timestamp, timestamp),
+    price_timestamp = COALESCE(excluded.price_timestamp, price_timestamp),
+    dcf_timestamp = COALESCE(excluded.dcf_timestamp, dcf_timestamp),
+    profile_timestamp = COALESCE(excluded.profile_timestamp, profile_timestamp),
+    negative = CASE WHEN excluded.negative IS NULL THEN negative
+                    WHEN excluded.negative = '' THEN NULL
+                    ELSE excluded.negative END
+"""
+
+UPSERT_VALUATION = """
+INSERT INTO valuations (symbol, status, sector, timestamp, data) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(symbol) DO UPDATE SET
+    status = excluded.status,
+    sector = excluded.sector,
+    timestamp = excluded.timestamp,
+    data = excluded.data
+"""
+
+
+class SQLiteCacheStore:
+    """
+    Per-symbol cache in SQLite with the same entry shape as the JSON cache:
+    {'price': float, 'dcf': float, 'profile': dict, 'timestamp': str}.
+    Each thread gets its own connection. Pending writes are visible to
+    get() before they are committed.
+    """
+
+    def __init__(self, path=CACHE_DB_FILE, batch_size=WRITE_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.pending_stocks = {}  # symbol -> partial entry not yet committed
+        self.pending_valuations = {}  # symbol -> stock_data not yet committed
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+
+    @staticmethod
+    def _migrate(conn):
+        """Add columns missing from databases created by older versions."""
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(stocks)')}
+        for column in ADDED_COLUMNS:
+            if column not in columns:
+                conn.execute(f'ALTER TABLE stocks ADD COLUMN {column} TEXT')
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, symbol):
+        """Return the cached entry for symbol, or None."""
+        # Read pending first: if a flush commits it before the SELECT below, the SELECT sees it
+        with self.lock:
+            pending = self.pending_stocks.get(symbol)
+            pending = dict(pending) if pending is not None else None
+
+        row = self._connect().execute(
+            'SELECT price, dcf, profile, timestamp, price_timestamp, dcf_timestamp, profile_timestamp, negative '
+            'FROM stocks WHERE symbol = ?', (symbol,)).fetchone()
+        entry = None
+        if row is not None:
+            entry = {'timestamp': row[3]}
+            if row[0] is not None:
+                entry['price'] = row[0]
+                entry['price_timestamp'] = row[4]
+            if row[1] is not None:
+                entry['dcf'] = row[1]
+                entry['dcf_timestamp'] = row[5]
+            if row[2] is not None:
+                entry['profile'] = json.loads(row[2])
+                entry['profile_timestamp'] = row[6]
+            if row[7] is not None:
+                entry['negative'] = json.loads(row[7])
+        if pending is not None:
+            entry = dict(entry or {}, **pending)
+        return entry
+
+    def put(self, symbol, price=None, dcf=None, profile=None, timestamp=None):
+        """Buffer an update; fields left as None keep their stored value and timestamp."""
+        timestamp = timestamp or datetime.now().isoformat()
+        with self.lock:
+            entry = self.pending_stocks.setdefault(symbol, {})
+            if price is not None:
+                entry['price'] = price
+                entry['price_timestamp'] = timestamp
+            if dcf is not None:
+                entry['dcf'] = dcf
+                entry['dcf_timestamp'] = timestamp
+            if profile is not None:
+                entry['profile'] = profile
+                entry['profile_timestamp'] = timestamp
+            entry['timestamp'] = timestamp
+            if len(self.pending_stocks) + len(self.pending_valuations) >= self.batch_size:
+                self._flush_locked()
+
+    def put_negative(self, symbol, negative):
+        """Buffer a negative-cache entry for symbol (a dict), or clear it with None."""
+        with self.lock:
+            self.pending_stocks.setdefault(symbol, {})['negative'] = negative
+            if len(self.pending_stocks) + len(self.pending_valuations) >= self.batch_size:
+                self._flush_locked()
+
+    def put_valuation(self, stock_data):
+        """Buffer an upsert of an undervalued/fair result row (keyed by 'Symbol')."""
+        with self.lock:
+            self.pending_valuations[stock_data['Symbol']] = stock_data
+            if len(self.pending_stocks) + len(self.pending_valuations) >= self.batch_size:
+                self._flush_locked()
+
+    def get_valuations(self, status):
+        """Return all stored result rows with the given 'Valuation Status'."""
+        self.flush()
+        rows = self._connect().execute(
+            'SELECT data FROM valuations WHERE status = ? ORDER BY symbol', (status,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def valuation_inputs(self):
+        """Return {symbol: (price, dcf)} for every cached stock."""
+        self.flush()
+        rows = self._connect().execute('SELECT symbol, price, dcf FROM stocks').fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def delete_valuations(self, symbols):
+        """Remove the stored result rows of symbols (no longer undervalued or fair)."""
+        with self.lock:
+            for symbol in symbols:
+                self.pending_valuations.pop(symbol, None)
+            self._flush_locked()
+            self._connect().executemany('DELETE FROM valuations WHERE symbol = ?', [(symbol,) for symbol in symbols])
+
+    def counts(self):
+        """Return (stocks, undervalued, fair) row counts."""
+        self.flush()
+        conn = self._connect()
+        stocks = conn.execute('SELECT COUNT(*) FROM stocks').fetchone()[0]
+        status_counts = dict(conn.execute('SELECT status, COUNT(*) FROM valuations GROUP BY status').fetchall())
+        return stocks, status_counts.get('UNDERVALUED', 0), status_counts.get('FAIR', 0)
+
+    def flush(self):
+        """Commit all buffered writes in one transaction."""
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending_stocks and not self.pending_valuations:
+            return
+        stock_rows = [
+            (symbol,
+             entry.get('price'),
+             entry.get('dcf'),
+             json.dumps(entry['profile']) if 'profile' in entry else None,
+             entry['profile'].get('sector') if 'profile' in entry else None,
+             entry.get('timestamp'),
+             entry.get('price_timestamp'),
+             entry.get('dcf_timestamp'),
+             entry.get('profile_timestamp'),
+             self._negative_column(entry))
+            for symbol, entry in self.pending_stocks.items()
+        ]
+        valuation_rows = [
+            (symbol, data.get('Valuation Status'), data.get('Sector'), data.get('Timestamp'), json.dumps(data))
+            for symbol, data in self.pending_valuations.items()
+        ]
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(UPSERT_STOCK, stock_rows)
+            conn.executemany(UPSERT_VALUATION, valuation_rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self.pending_stocks.clear()
+        self.pending_valuations.clear()
+
+    @staticmethod
+    def _negative_column(entry):
+        # NULL leaves the stored value alone, '' clears it
+        if 'negative' not in entry:
+            return None
+        if entry['negative'] is None:
+            return ''
+        return json.dumps(entry['negative'])
+
+    def close(self):
+        self.flush()
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
@@ -0,0 +1,84 @@
+"""
+File format for the post-processing stage outputs (regions, cleaned, USD
+filtered, per-sector files). Stages read and write Parquet by default, or
+Arrow IPC (read back memory-mapped), instead of going through openpyxl;
+Excel is an optional export for people who open the files by hand.
+
+Stage files are named by a base path without extension; the extension
+comes from the format:
+
+    PIPELINE_FORMAT=parquet (default) | arrow | xlsx
+    PIPELINE_EXCEL=1  also write an .xlsx copy next to every stage file
+
+Readers accept any of the formats, so files written before the switch
+(or with a different PIPELINE_FORMAT) still load.
+See benchmark_stage_formats.py for read/write times and file sizes.
+"""
+
+import os
+
+import pandas as pd
+
+STAGE_FORMAT = os.getenv('PIPELINE_FORMAT', 'parquet')
+EXCEL_EXPORT = os.getenv('PIPELINE_EXCEL', '0') == '1'
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow', 'xlsx': '.xlsx'}
+
+
+def stage_path(base, fmt=None):
+    return base + EXTENSIONS[fmt or STAGE_FORMAT]
+
+
+def write_stage(df, base, fmt=None):
+    """
+    Write df to base + the format's extension (and base.xlsx with
+    EXCEL_EXPORT). Returns the path written.
+    """
+    fmt = fmt or STAGE_FORMAT
+    path = stage_path(base, fmt)
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    elif fmt == 'arrow':
+        # Uncompressed so read_stage can memory-map it instead of copying it in
+        df.reset_index(drop=True).to_feather(path, compression='uncompressed')
+    else:
+        df.to_excel(path, index=False, engine='openpyxl')
+    if EXCEL_EXPORT and fmt != 'xlsx':
+        df.to_excel(stage_path(base, 'xlsx'), index=False, engine='openpyxl')
+    return path
+
+
+def find_stage(base):
+    """
+    Existing stage file for base: the configured format first, then the
+    others (e.g. an .xlsx left from before). None if there is none.
+    """
+    for fmt in [STAGE_FORMAT] + [other for other in EXTENSIONS if other != STAGE_FORMAT]:
+        path = stage_path(base, fmt)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_stage(path):
+    """Read a stage file written in any of the formats."""
+    extension = os.path.splitext(path)[1]
+    if extension == '.parquet':
+        return pd.read_parquet(path)
+    if extension == '.arrow':
+        import pyarrow.feather as feather
+        return feather.read_table(path, memory_map=True).to_pandas()
+    return pd.read_excel(path, engine='openpyxl')
+
+
+def list_stage_files(folder):
+    """
+    Stage files in folder (one per sector), skipping '_' files such as
+    _summary.txt. Where a name exists in several formats only one is
+    listed, chosen as in find_stage.
+    """
+    bases = set()
+    for name in os.listdir(folder):
+        stem, extension = os.path.splitext(name)
+        if extension in EXTENSIONS.values() and not name.startswith('_'):
+            bases.add(os.path.join(folder, stem))
+    return [find_stage(base) for base in sorted(bases)]
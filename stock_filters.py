@@ -0,0 +1,112 @@
+"""
+Universe filters shared by every stage of the pipeline.
+The final output only keeps USD-quoted, US-based stocks listed on NYSE or
+NASDAQ with a market cap of at least 1 billion. These predicates are
+declared once here and used both by the downstream filtering scripts
+(on DataFrames) and by fetch_undervalued_stocks to drop symbols before
+any per-symbol API calls are made.
+"""
+
+import pandas as pd
+
+# Currency filter (USD)
+USD_VARIATIONS = ['USD', 'usd', 'Usd', 'US Dollar', 'US$', '$']
+USD_SUBSTRINGS = ['USD', 'US Dollar']
+
+# Country filter (US)
+US_VARIATIONS = ['US', 'us', 'Us', 'USA', 'usa', 'U.S.', 'U.S.A.', 'United States', 'United States of America']
+US_SUBSTRINGS = ['United States', 'USA', 'US']
+
+# Exchange filter (NYSE / NASDAQ)
+ALLOWED_EXCHANGES = ['NYSE', 'NASDAQ', 'Nasdaq', 'nasdaq', 'nyse', 'NYS', 'NSDQ']
+EXCHANGE_PATTERN = 'NYSE|NASDAQ|NYS|NSDQ'
+
+# Market cap filter
+MIN_MARKET_CAP = 1_000_000_000  # 1 billion USD
+
+
+def _contains_any(value, substrings):
+    value = str(value).lower()
+    return any(sub.lower() in value for sub in substrings)
+
+
+def is_usd(currency):
+    """True if a currency value counts as USD."""
+    if currency is None:
+        return False
+    return currency in USD_VARIATIONS or _contains_any(currency, USD_SUBSTRINGS)
+
+
+def is_us(country):
+    """True if a country value counts as the United States."""
+    if country is None:
+        return False
+    return country in US_VARIATIONS or _contains_any(country, US_SUBSTRINGS)
+
+
+def is_allowed_exchange(exchange):
+    """True if an exchange value is NYSE or NASDAQ."""
+    if exchange is None:
+        return False
+    return _contains_any(exchange, EXCHANGE_PATTERN.split('|'))
+
+
+def meets_market_cap(market_cap):
+    """True if a market cap value is at least MIN_MARKET_CAP."""
+    try:
+        return float(market_cap) >= MIN_MARKET_CAP
+    except (TypeError, ValueError):
+        return False
+
+
+def usd_mask(currency_series):
+    """Vectorized is_usd for a DataFrame column."""
+    mask = currency_series.isin(USD_VARIATIONS)
+    for sub in USD_SUBSTRINGS:
+        mask |= currency_series.str.contains(sub, case=False, na=False, regex=False)
+    return mask
+
+
+def us_mask(country_series):
+    """Vectorized is_us for a DataFrame column."""
+    mask = country_series.isin(US_VARIATIONS)
+    for sub in US_SUBSTRINGS:
+        mask |= country_series.str.contains(sub, case=False, na=False, regex=False)
+    return mask
+
+
+def exchange_mask(exchange_series):
+    """Vectorized is_allowed_exchange for a DataFrame column."""
+    return exchange_series.astype(str).str.upper().str.contains(EXCHANGE_PATTERN, case=False, na=False, regex=True)
+
+
+def market_cap_mask(market_cap_series):
+    """Vectorized meets_market_cap for a DataFrame column."""
+    return pd.to_numeric(market_cap_series, errors='coerce') >= MIN_MARKET_CAP
+
+
+def _known(value):
+    return value not in (None, '', 'N/A')
+
+
+def rejection_reason(listing, profile):
+    """
+    Apply the final pipeline filters to one symbol using the data we already
+    hold before any per-symbol calls: the stock/list entry (exchange) and the
+    profile-bulk entry (currency, country, market cap, exchange).
+    Returns the name of the first failing filter, or None if the symbol
+    passes. Fields we do not have yet are not held against the symbol; the
+    downstream filters still check them.
+    """
+    profile = profile or {}
+    exchange = listing.get('exchangeShortName') or profile.get('exchangeShortName')
+    if _known(exchange) and not is_allowed_exchange(exchange):
+        return 'exchange'
+    if _known(profile.get('currency')) and not is_usd(profile.get('currency')):
+        return 'currency'
+    if _known(profile.get('country')) and not is_us(profile.get('country')):
+        return 'country'
+    # A zero market cap in bulk data usually means "not reported", so only reject real values
+    if _known(profile.get('mktCap')) and profile.get('mktCap') and not meets_market_cap(profile.get('mktCap')):
+        return 'market_cap'
+    return None
@@ -0,0 +1,76 @@
+"""
+Tests for cache_journal.CacheJournal: replay after a crash mid-append.
+Run with: python -m pytest -q test_cache_journal.py
+"""
+
+import os
+import tempfile
+import unittest
+
+from cache_journal import CacheJournal
+
+
+class TornJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'cache.json')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write_records(self, journal, records):
+        for key, value in records:
+            journal.set(key, value)
+        journal.close()
+
+    def tear_last_line(self):
+        # Simulate a crash mid-append: a record without its end
+        with open(self.path + '.journal', 'a') as f:
+            f.write('{"k":"torn","v":{"pri')
+
+    def test_records_after_torn_line_are_replayed(self):
+        journal = CacheJournal(self.path)
+        journal.load()
+        self.write_records(journal, [('a', 1), ('b', 2)])
+        self.tear_last_line()
+
+        journal = CacheJournal(self.path)
+        data, replayed = journal.load()
+        self.assertEqual(data, {'a': 1, 'b': 2})
+        self.assertEqual(replayed, 2)
+        self.write_records(journal, [('c', 3), ('a', 4)])
+
+        data, replayed = CacheJournal(self.path).load()
+        self.assertEqual(data, {'a': 4, 'b': 2, 'c': 3})
+        self.assertEqual(replayed, 4)
+        with open(self.path + '.journal') as f:
+            self.assertNotIn('torn', f.read())
+
+    def test_append_without_load_starts_a_new_line(self):
+        journal = CacheJournal(self.path)
+        self.write_records(journal, [('a', 1)])
+        self.tear_last_line()
+
+        self.write_records(CacheJournal(self.path), [('b', 2)])
+        data, replayed = CacheJournal(self.path).load()
+        self.assertEqual(data, {'a': 1, 'b': 2})
+        self.assertEqual(replayed, 2)
+
+    def test_compaction_after_torn_line(self):
+        journal = CacheJournal(self.path)
+        journal.load()
+        self.write_records(journal, [('a', 1)])
+        self.tear_last_line()
+
+        journal = CacheJournal(self.path)
+        data, _ = journal.load()
+        journal.compact(data)
+        self.write_records(journal, [('b', 2)])
+        data, replayed = CacheJournal(self.path).load()
+        self.assertEqual(data, {'a': 1, 'b': 2})
+        self.assertEqual(replayed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Tests for rate_limiter.SharedTokenBucket: call accounting across runs.
+Run with: python -m pytest -q test_rate_limiter.py
+"""
+
+import os
+import tempfile
+import unittest
+
+from rate_limiter import SharedTokenBucket
+
+
+class SharedCallsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'budget.bin')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def take(self, bucket, n):
+        for _ in range(n):
+            bucket.reserve()
+
+    def test_later_run_counts_only_its_own_calls(self):
+        first = SharedTokenBucket(6000, self.path)
+        self.take(first, 5)
+        self.assertEqual(first.shared_calls(), 5)
+        first.file.close()
+
+        second = SharedTokenBucket(6000, self.path)
+        self.take(second, 2)
+        self.assertEqual(second.stats()['shared_calls'], 2)
+        self.assertIn("made 2 of 2 calls", second.summary())
+        second.file.close()
+
+    def test_overlapping_runs_share_the_count(self):
+        first = SharedTokenBucket(6000, self.path)
+        second = SharedTokenBucket(6000, self.path)
+        self.take(first, 3)
+        self.take(second, 4)
+        self.assertEqual(first.shared_calls(), 7)
+        self.assertEqual(second.shared_calls(), 4)
+        first.file.close()
+        second.file.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
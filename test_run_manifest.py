@@ -0,0 +1,60 @@
+"""
+Tests for run_manifest.RunManifest: resuming after a crash mid-append.
+Run with: python -m pytest -q test_run_manifest.py
+"""
+
+import tempfile
+import unittest
+
+import run_manifest
+from run_manifest import RunManifest
+
+
+class TornManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_records_after_torn_line_are_read_back(self):
+        manifest = RunManifest.create({'limit': 10}, self.dir.name, run_id='run')
+        manifest.mark_done(['A'], [{'Symbol': 'A'}])
+        manifest.flush()
+        with open(manifest.path, 'a') as f:
+            f.write('{"done":["B"],"ro')  # Crash mid-append
+
+        manifest = RunManifest.load('run', self.dir.name)
+        self.assertEqual(manifest.done, {'A'})
+        self.assertEqual(RunManifest.latest_incomplete(self.dir.name), 'run')
+        manifest.mark_done(['C'], [{'Symbol': 'C'}])
+        manifest.complete()
+
+        manifest = RunManifest.load('run', self.dir.name)
+        self.assertEqual(manifest.done, {'A', 'C'})
+        self.assertEqual(manifest.rows, [{'Symbol': 'A'}, {'Symbol': 'C'}])
+        self.assertTrue(manifest.completed)
+        self.assertIsNone(RunManifest.latest_incomplete(self.dir.name))
+        self.assertEqual(manifest.options, {'limit': 10})
+
+
+class PruneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_starting_a_run_keeps_only_the_most_recent_manifests(self):
+        for n in range(run_manifest.MANIFEST_KEEP + 3):
+            RunManifest.create({}, self.dir.name, run_id=f"20260101_{n:06d}")
+        kept = run_manifest.run_ids(self.dir.name)
+        self.assertEqual(len(kept), run_manifest.MANIFEST_KEEP)
+        self.assertEqual(kept[-1], f"20260101_{run_manifest.MANIFEST_KEEP + 2:06d}")
+        self.assertEqual(RunManifest.latest_incomplete(self.dir.name), kept[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
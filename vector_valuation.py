@@ -0,0 +1,113 @@
+"""
+Columnar valuation for symbols whose DCF, price and profile are all known up
+front (dcf-bulk, batched quotes and profile-bulk). A whole chunk is
+classified with pandas/NumPy in one pass instead of one process_stock call
+(dicts, log lines and lock round-trips) per symbol.
+The thresholds and rounding match classify_stock and record_valuation in
+fetch_undervalued_stocks.py, and result_rows gives the same columns as the
+stock_valuations.csv rows built there.
+"""
+
+import numpy as np
+import pandas as pd
+
+RESULT_COLUMNS = ['Symbol', 'Company Name', 'Current Price', 'DCF Price', 'Discount %', 'Premium %',
+                  'Valuation Status', 'Sector', 'Industry', 'Timestamp']
+SELECTED_STATUSES = ('UNDERVALUED', 'FAIR')
+
+
+def build_frame(symbols, dcf_values, prices, profiles):
+    """
+    One row per symbol. dcf_values and prices may contain None (missing);
+    profiles are profile dicts as cached by fetch_undervalued_stocks.
+    """
+    return pd.DataFrame({
+        'symbol': symbols,
+        'dcf': pd.to_numeric(pd.Series(dcf_values, dtype=object), errors='coerce').to_numpy(dtype=float),
+        'price': pd.to_numeric(pd.Series(prices, dtype=object), errors='coerce').to_numpy(dtype=float),
+        'company_name': [profile.get('companyName', 'N/A') for profile in profiles],
+        'sector': [profile.get('sector', 'N/A') for profile in profiles],
+        'industry': [profile.get('industry', 'N/A') for profile in profiles],
+    })
+
+
+def classify_frame(frame, overvalued_buffer):
+    """
+    Add 'status', 'has_data', 'discount_pct' and 'premium_pct' columns.
+    Statuses are the ones classify_stock returns: DATA_UNAVAILABLE,
+    NO_DCF_DATA, NO_PRICE_DATA, UNDERVALUED, FAIR or OVERVALUED (>20%).
+    """
+    dcf = frame['dcf'].to_numpy()
+    price = frame['price'].to_numpy()
+    # NaN compares False, so missing values count as "not > 0"
+    has_dcf = dcf > 0
+    has_price = price > 0
+    has_data = has_dcf & has_price
+
+    undervalued = has_data & (price < dcf)
+    overvalued = has_data & (price > dcf * (1 + overvalued_buffer))
+    status = np.select(
+        [~has_dcf & ~has_price, ~has_dcf, ~has_price, undervalued, overvalued],
+        ['DATA_UNAVAILABLE', 'NO_DCF_DATA', 'NO_PRICE_DATA', 'UNDERVALUED', 'OVERVALUED (>20%)'],
+        default='FAIR'
+    )
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        discount_pct = np.where(undervalued, np.round((dcf - price) / dcf * 100, 2), 0.0)
+        premium_pct = np.where(has_data & (price > dcf), np.round((price - dcf) / dcf * 100, 2), 0.0)
+
+    return frame.assign(status=status, has_data=has_data, discount_pct=discount_pct, premium_pct=premium_pct)
+
+
+def result_rows(classified, timestamp):
+    """
+    stock_valuations.csv rows (RESULT_COLUMNS) for the UNDERVALUED and FAIR
+    symbols of a classified frame.
+    """
+    selected = classified[classified['status'].isin(SELECTED_STATUSES)]
+    return pd.DataFrame({
+        'Symbol': selected['symbol'],
+        'Company Name': selected['company_name'],
+        'Current Price': selected['price'].round(2),
+        'DCF Price': selected['dcf'].round(2),
+        'Discount %': selected['discount_pct'],
+        'Premium %': selected['premium_pct'],
+        'Valuation Status': selected['status'],
+        'Sector': selected['sector'],
+        'Industry': selected['industry'],
+        'Timestamp': timestamp,
+    }, columns=RESULT_COLUMNS).reset_index(drop=True)
+
+
+CHANGE_COLUMNS = ['Symbol', 'Change', 'Old Status', 'New Status', 'Old Price', 'New Price', 'Old DCF', 'New DCF']
+
+
+def diff_results(previous, current):
+    """
+    Changeset between two stock_valuations tables: symbols that entered the
+    results (NEWLY_UNDERVALUED, NEWLY_FAIR), left them (DROPPED_OUT) or moved
+    between UNDERVALUED and FAIR (STATUS_FLIP). Returns CHANGE_COLUMNS rows.
+    """
+    columns = ['Symbol', 'Valuation Status', 'Current Price', 'DCF Price']
+    merged = previous[columns].merge(current[columns], on='Symbol', how='outer', suffixes=(' Old', ' New'))
+    old_status = merged['Valuation Status Old']
+    new_status = merged['Valuation Status New']
+    change = np.select(
+        [old_status.isna() & (new_status == 'UNDERVALUED'),
+         old_status.isna() & (new_status == 'FAIR'),
+         new_status.isna(),
+         old_status != new_status],
+        ['NEWLY_UNDERVALUED', 'NEWLY_FAIR', 'DROPPED_OUT', 'STATUS_FLIP'],
+        default=''
+    )
+    changes = pd.DataFrame({
+        'Symbol': merged['Symbol'],
+        'Change': change,
+        'Old Status': old_status,
+        'New Status': new_status,
+        'Old Price': merged['Current Price Old'],
+        'New Price': merged['Current Price New'],
+        'Old DCF': merged['DCF Price Old'],
+        'New DCF': merged['DCF Price New'],
+    }, columns=CHANGE_COLUMNS)
+    return changes[changes['Change'] != ''].sort_values(['Change', 'Symbol']).reset_index(drop=True)